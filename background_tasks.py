@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Coroutine, Dict, Optional
+
+from cachetools import TTLCache
+
+from tracing import Span, current_span
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundTasks:
+    def __init__(self, default_timeout: float = 60, dedup_ttl: float = 600):
+        """
+        Фоновые задачи обработчиков с таймаутом и схлопыванием повторов
+        default_timeout: время на выполнение задачи, секунды
+        dedup_ttl: сколько помнить завершенные ключи, чтобы отбрасывать повторные доставки
+        """
+        self.default_timeout = default_timeout
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.recent = TTLCache(maxsize=10000, ttl=dedup_ttl)
+
+    def seen(self, key: str) -> bool:
+        """Задача с таким ключом выполняется или недавно завершилась"""
+        return key in self.tasks or key in self.recent
+
+    def spawn(self, key: str, coro: Coroutine, timeout: float = None,
+              on_timeout: Callable[[], Awaitable[None]] = None) -> bool:
+        """
+        Запуск задачи, если задача с таким ключом еще не запускалась
+        Возвращает False для повторной доставки (корутина закрывается без выполнения)
+        """
+        if self.seen(key):
+            coro.close()
+            return False
+
+        # Span открывается сразу, чтобы трасса обработчика не завершилась раньше фоновой задачи
+        task_span = Span(f"background.{key.split(':')[0]}", current_span.get(), {"task": key})
+        self.tasks[key] = asyncio.create_task(
+            self.run(key, coro, timeout or self.default_timeout, on_timeout, task_span)
+        )
+        return True
+
+    async def run(self, key: str, coro: Coroutine, timeout: float,
+                  on_timeout: Optional[Callable[[], Awaitable[None]]], task_span: Span):
+        """Выполнение задачи с таймаутом и логированием ошибок"""
+        try:
+            with task_span:
+                await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            logger.error("Фоновая задача %s не уложилась в %s с", key, timeout)
+            if on_timeout:
+                try:
+                    await on_timeout()
+                except Exception as e:
+                    logger.error("Ошибка обработки таймаута задачи %s: %s", key, e)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Ошибка фоновой задачи %s: %s", key, e)
+        finally:
+            self.tasks.pop(key, None)
+            self.recent[key] = True
+
+    def active(self) -> int:
+        """Количество выполняющихся задач"""
+        return len(self.tasks)
+
+    async def shutdown(self, timeout: float = 10):
+        """Ожидание завершения задач при остановке бота, оставшиеся отменяются"""
+        if not self.tasks:
+            return
+        done, pending = await asyncio.wait(list(self.tasks.values()), timeout=timeout)
+        for task in pending:
+            task.cancel()
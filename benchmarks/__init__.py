@@ -0,0 +1,13 @@
+"""
+Бенчмарки бота на локальных заменах внешних сервисов
+
+Запуск: python -m benchmarks [сценарии] --users 500 --output result.json
+Нагрузочный тест бронирования по всем шагам анкеты: python -m benchmarks.load_test --users 2000
+Холодный импорт бота и webhook-сервера: python -m benchmarks.startup
+Микробенчмарки: python -m benchmarks.signing, python -m benchmarks.booking_records,
+python -m benchmarks.conversation_memory, python -m benchmarks.metrics,
+python -m benchmarks.log_config
+Telegram, YandexGPT, Tinkoff и Google Sheets заменяются aiohttp-серверами
+с настраиваемой задержкой и долей ошибок (fake_services), обновления подаются
+в настоящий Dispatcher из main.py (telegram_feeder).
+"""
@@ -0,0 +1,60 @@
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime
+
+from benchmarks.environment import add_service_arguments, current_commit, environment_from_args
+from benchmarks.scenarios import SCENARIOS
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарки бота на локальных заменах сервисов")
+    parser.add_argument("scenarios", nargs="*", help=f"сценарии: {', '.join(SCENARIOS)} (по умолчанию все)")
+    parser.add_argument("--users", type=int, default=200, help="виртуальных пользователей / уведомлений")
+    add_service_arguments(parser)
+    parser.add_argument("--output", help="файл для JSON-результата (по умолчанию stdout)")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+    return args
+
+
+async def run(args) -> dict:
+    env = environment_from_args(args)
+    await env.start()
+
+    results = {}
+    try:
+        for name in args.scenarios or list(SCENARIOS):
+            print(f"▶ {name}...", file=sys.stderr)
+            scenario = SCENARIOS[name]
+            if name == "webhook_burst":
+                results[name] = await scenario(env, notifications=args.users)
+            else:
+                results[name] = await scenario(env, users=args.users)
+    finally:
+        await env.close()
+
+    return {
+        "commit": current_commit(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "params": vars(args),
+        "scenarios": results,
+        "services": env.service_counters(),
+    }
+
+
+def main():
+    args = parse_args()
+    report = json.dumps(asyncio.run(run(args)), ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Выгрузка бронирований: потоковая запись из локальной копии против чтения всего листа
+
+Запуск: python -m benchmarks.booking_export [--rows 1000000] [--legacy-rows 100000]
+Локальная копия заполняется синтетическими бронированиями, затем замеряются время и пиковая
+память процесса (ru_maxrss) выгрузки в CSV и XLSX (если установлен openpyxl) - целиком и с фильтрами.
+Каждый замер - отдельный процесс, чтобы пик памяти относился только к нему; "idle" - процесс,
+который только открыл базу. Для сравнения - прежний путь: get_all_records() по листу
+из --legacy-rows строк и запись CSV.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from typing import Dict, Iterator, List
+
+from booking_export import export_bookings
+from booking_records import FIELDS, HEADERS
+from booking_store import CHUNK_SIZE, INSERT, BookingFilter, BookingStore, booked_on
+from benchmarks.booking_records import EVENTS, STATUSES, legacy_records, synthetic_sheet
+from benchmarks.environment import current_commit
+
+
+def synthetic_rows(rows: int, users: int = 50000) -> Iterator[List]:
+    """Бронирования в порядке FIELDS, по одному - без списка всех строк в памяти"""
+    random.seed(42)
+    for i in range(rows):
+        telegram_id = 100000000 + random.randrange(users)
+        yield [
+            f"{random.randint(1, 28):02d}.{random.randint(5, 9):02d}.{random.choice((2023, 2024, 2025))} "
+            f"{random.randint(0, 23):02d}:{i % 60:02d}",
+            telegram_id, f"user{telegram_id}", f"Иванов Иван Иванович {i}",
+            f"+7927{i % 10_000_000:07d}", f"{random.randint(1000, 9999)}", f"{random.randint(100000, 999999)}",
+            f"{random.randint(1, 28):02d}.{random.randint(1, 12):02d}.19{random.randint(60, 99)}",
+            random.choice(EVENTS), random.choice((18500, 19500, 25000)), random.choice(STATUSES),
+            "Бронирование через Telegram бота",
+        ]
+
+
+def fill(store: BookingStore, rows: int):
+    chunk = []
+    with store.lock:
+        store.conn.execute("BEGIN")
+        for row in synthetic_rows(rows):
+            chunk.append([booked_on(row[0])] + row)
+            if len(chunk) >= CHUNK_SIZE:
+                store.conn.executemany(INSERT, chunk)
+                chunk = []
+        store.conn.executemany(INSERT, chunk)
+        store.conn.execute("COMMIT")
+
+
+SEASON = BookingFilter(event="юрюзань", date_from=date(2024, 5, 1), date_to=date(2024, 9, 30), status="Оплачено")
+
+# Замер: (формат, фильтр)
+CASES = {
+    "csv_all": ("csv", None),
+    "csv_season_filter": ("csv", SEASON),
+    "xlsx_all": ("xlsx", None),
+    "xlsx_season_filter": ("xlsx", SEASON),
+}
+
+
+def run_case(case: str, workdir: str, legacy_rows: int) -> Dict:
+    """Один замер в текущем процессе"""
+    store = BookingStore(os.path.join(workdir, "bench.db"))
+    path = os.path.join(workdir, case)
+    started = time.perf_counter()
+    if case == "idle":
+        rows = 0
+    elif case == "legacy_sheet_records":
+        values = synthetic_sheet(legacy_rows)
+        started = time.perf_counter()
+        rows = legacy_export(values, path + ".csv")
+    else:
+        export_format, filters = CASES[case]
+        path += f".{export_format}"
+        rows = export_bookings(store, path, export_format, filters)
+    result = {
+        "rows": rows,
+        "seconds": round(time.perf_counter() - started, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if os.path.exists(path):
+        result["file_mb"] = round(os.path.getsize(path) / 2 ** 20, 1)
+    return result
+
+
+def measure(case: str, workdir: str, legacy_rows: int) -> Dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.booking_export", "--case", case, "--workdir", workdir,
+         "--legacy-rows", str(legacy_rows)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output)
+
+
+def legacy_export(values: List[List[str]], path: str) -> int:
+    """Прежний путь: все записи листа словарями, затем запись в файл"""
+    records = legacy_records(values)
+    with open(path, "w", newline="", encoding="utf-8-sig") as file:
+        writer = csv.DictWriter(file, fieldnames=HEADERS, delimiter=";")
+        writer.writeheader()
+        writer.writerows(records)
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка бронирований в CSV/XLSX")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--legacy-rows", type=int, default=100_000, help="0 - без сравнения с листом")
+    parser.add_argument("--skip-xlsx", action="store_true")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.workdir, args.legacy_rows)))
+        return
+
+    workdir = tempfile.mkdtemp(prefix="chebextreme-export-")
+    store = BookingStore(os.path.join(workdir, "bench.db"))
+    started = time.perf_counter()
+    fill(store, args.rows)
+    results = {"fill_seconds": round(time.perf_counter() - started, 1)}
+
+    try:
+        import openpyxl  # noqa: F401
+        has_openpyxl = True
+    except ImportError:
+        has_openpyxl = False
+
+    cases = ["idle", "csv_all", "csv_season_filter"]
+    if has_openpyxl and not args.skip_xlsx:
+        cases += ["xlsx_all", "xlsx_season_filter"]
+    if args.legacy_rows:
+        cases.append("legacy_sheet_records")
+    for case in cases:
+        results[case] = measure(case, workdir, args.legacy_rows)
+        print(case, results[case], file=sys.stderr)
+
+    print(json.dumps({"commit": current_commit(), "rows": args.rows, "fields": len(FIELDS),
+                      "legacy_rows": args.legacy_rows, "results": results}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Память и время разбора листа бронирований: словари get_all_records() против BookingTable
+
+Запуск: python -m benchmarks.booking_records [--rows 100000] [--repeat 3]
+Лист синтетический, в формате get_all_values(). Время - лучшее из повторов,
+память - объем, который остается занятым результатом разбора (tracemalloc).
+"""
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from gspread.utils import numericise_all, to_records
+
+from booking_records import HEADERS, BookingTable
+from benchmarks.environment import current_commit
+
+EVENTS = ["Сплав по реке Юрюзань", "Сплав по реке Ай", "Поход на Таганай", "SUP-прогулка по Волге"]
+STATUSES = ["Не оплачено", "Оплачено", "Ошибка оплаты", "Отменено"]
+
+
+def synthetic_sheet(rows: int, users: int = 20000) -> List[List[str]]:
+    """Лист бронирований: заголовок и rows строк, как их возвращает get_all_values()"""
+    random.seed(42)
+    values = [list(HEADERS)]
+    for i in range(rows):
+        telegram_id = 100000000 + random.randrange(users)
+        values.append([
+            f"{random.randint(1, 28):02d}.{random.randint(1, 12):02d}.2024 {random.randint(0, 23):02d}:{i % 60:02d}",
+            str(telegram_id), f"user{telegram_id}", f"Иванов Иван Иванович {i}",
+            f"+7927{i:07d}", f"{random.randint(1000, 9999)}", f"{random.randint(100000, 999999)}",
+            f"{random.randint(1, 28):02d}.{random.randint(1, 12):02d}.19{random.randint(60, 99)}",
+            random.choice(EVENTS), str(random.choice((18500, 19500, 25000))), random.choice(STATUSES), "",
+        ])
+    return values
+
+
+def legacy_records(values: List[List[str]]) -> List[Dict]:
+    """То, что делал get_all_records(): словарь на строку с числовыми значениями"""
+    return to_records(values[0], [numericise_all(row) for row in values[1:]])
+
+
+def measure(func: Callable, repeat: int) -> Dict:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+        del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"parse_ms": round(best * 1000, 1), "memory_mb": round(retained / 2 ** 20, 1)}
+
+
+def lookup_ms(func: Callable, users: List[int]) -> float:
+    """Среднее время выборки бронирований одного пользователя"""
+    started = time.perf_counter()
+    for telegram_id in users:
+        func(telegram_id)
+    return round((time.perf_counter() - started) * 1000 / len(users), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Разбор листа бронирований: словари против колонок")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    values = synthetic_sheet(args.rows)
+    users = [int(row[1]) for row in random.sample(values[1:], 20)]
+
+    results = {
+        "dict_records": measure(lambda: legacy_records(values), args.repeat),
+        "booking_table": measure(lambda: BookingTable.from_values(values), args.repeat),
+        "booking_records_all": measure(lambda: BookingTable.from_values(values).records(), args.repeat),
+    }
+
+    # Выборка пользователя: прежний путь - разбор листа и фильтр по словарям на каждый запрос
+    results["dict_records"]["user_lookup_ms"] = lookup_ms(
+        lambda telegram_id: [r for r in legacy_records(values) if str(r.get("Telegram ID")) == str(telegram_id)],
+        users[:3]
+    )
+    results["booking_table"]["user_lookup_ms"] = lookup_ms(
+        lambda telegram_id: BookingTable.from_values(values).user_bookings(telegram_id), users[:3]
+    )
+    table = BookingTable.from_values(values)
+    table.index_users()
+    results["booking_table"]["indexed_lookup_ms"] = lookup_ms(table.user_bookings, users)
+
+    print(json.dumps({"commit": current_commit(), "rows": args.rows, "results": results},
+                     ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
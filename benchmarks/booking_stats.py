@@ -0,0 +1,112 @@
+"""
+Статистика /stats: инкрементальные счетчики против полного пересчета по платежам
+
+Запуск: python -m benchmarks.booking_stats [--payments 200000] [--incremental 2000]
+Сначала через PaymentStore проводится --incremental платежей (бронирование и смена статусов),
+и проверяется, что счетчики совпадают с пересчетом. Затем база дополняется до --payments
+платежей и замеряется пересчет на NumPy (если установлен) и на чистом Python - целиком
+и только группировка, - а также ответ /stats.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from booking_stats import NUMPY_AVAILABLE, BookingStats, aggregate_numpy, aggregate_python
+from benchmarks.booking_records import EVENTS
+from benchmarks.environment import current_commit
+from payment_store import PaymentStore
+
+# Последовательности статусов платежа и их доли
+FLOWS = [
+    ((), 0.3),
+    (("AUTHORIZED", "CONFIRMED"), 0.5),
+    (("REJECTED",), 0.1),
+    (("CONFIRMED", "REFUNDED"), 0.05),
+    (("DEADLINE_EXPIRED",), 0.05),
+]
+
+
+def snapshot(stats: BookingStats):
+    rows = stats.conn.execute(
+        "SELECT day, event_name, bookings, paid, revenue, refunds FROM stats_daily ORDER BY day, event_name"
+    ).fetchall()
+    return [tuple(row) for row in rows]
+
+
+def timed(func) -> float:
+    started = time.perf_counter()
+    func()
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Счетчики /stats и пересчет по платежам")
+    parser.add_argument("--payments", type=int, default=200_000)
+    parser.add_argument("--incremental", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(42)
+    db_path = os.path.join(tempfile.mkdtemp(prefix="chebextreme-stats-"), "bench.db")
+    store = PaymentStore(db_path)
+    stats = BookingStats(db_path)
+    flows, weights = zip(*FLOWS)
+
+    started = time.perf_counter()
+    for i in range(args.incremental):
+        order_id = f"inc-{i}"
+        store.save_payment(order_id, 1000 + i, random.choice((18500, 19500, 25000)), random.choice(EVENTS))
+        for status in random.choices(flows, weights)[0]:
+            store.apply_status(order_id, f"p{i}", status)
+    incremental_ms = (time.perf_counter() - started) * 1000 / args.incremental
+
+    incremental = snapshot(stats)
+    stats.rebuild(use_numpy=False)
+    consistent = snapshot(stats) == incremental
+
+    # Остальные платежи - сразу строками таблицы, как накопленная за сезоны история
+    today = datetime.now()
+    rows = []
+    for i in range(args.payments - args.incremental):
+        created_at = (today - timedelta(days=random.randrange(365))).isoformat()
+        status = (random.choices(flows, weights)[0] or ("NEW",))[-1]
+        rows.append((f"hist-{i}", random.choice((18500, 19500, 25000)), random.choice(EVENTS),
+                     status, created_at, created_at))
+    with store.lock:
+        store.conn.execute("BEGIN")
+        store.conn.executemany(
+            "INSERT INTO payments (order_id, amount, event_name, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows
+        )
+        store.conn.execute("COMMIT")
+
+    results = {
+        "incremental_ms_per_payment": round(incremental_ms, 3),
+        "incremental_matches_rebuild": consistent,
+        "rebuild_python_ms": timed(lambda: stats.rebuild(use_numpy=False)),
+    }
+    python_result = snapshot(stats)
+
+    # Отдельно - сама группировка, без чтения таблицы платежей и записи счетчиков
+    cursor = store.conn.cursor()
+    cursor.row_factory = None
+    columns = [list(column) for column in zip(*cursor.execute(
+        "SELECT substr(created_at, 1, 10), COALESCE(event_name, ''), status, COALESCE(amount, 0) FROM payments"
+    ))]
+    results["aggregate_python_ms"] = timed(lambda: aggregate_python(*columns))
+
+    if NUMPY_AVAILABLE:
+        results["rebuild_numpy_ms"] = timed(lambda: stats.rebuild(use_numpy=True))
+        results["numpy_matches_python"] = snapshot(stats) == python_result
+        results["aggregate_numpy_ms"] = timed(lambda: aggregate_numpy(*columns))
+    results["stats_render_ms"] = timed(lambda: stats.render(30))
+
+    print(json.dumps({"commit": current_commit(), "payments": args.payments, "results": results},
+                     ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Память диалогов: расход памяти и скорость добавления реплик
+
+Запуск: python -m benchmarks.conversation_memory [--users 100000]
+Каждому пользователю добавляется полная история (CHAT_MEMORY_TURNS пар вопрос-ответ),
+память замеряется tracemalloc.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from benchmarks.environment import current_commit
+from conversation_memory import ConversationMemory
+
+QUESTION = "Сколько стоит прокат электросамоката на {} часа в выходные?"
+ANSWER = (
+    "Прокат электросамоката на {} часа стоит 700 рублей. В выходные цена та же. "
+    "Залог - документ, удостоверяющий личность, либо 20 000 рублей. "
+    "Забрать самокат можно по адресу ул. Ленинградская, 14 с 10:00 до 21:00, "
+    "перед выдачей мы проверим заряд и выдадим шлем. Бронь: @chebextreme"
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Память диалогов на много пользователей")
+    parser.add_argument("--users", type=int, default=100_000)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    memory = ConversationMemory(memory_cap=1024 ** 3)
+    started = time.perf_counter()
+    for user_id in range(args.users):
+        for turn in range(memory.max_turns):
+            memory.add(user_id, QUESTION.format(user_id % 7 + turn), ANSWER.format(user_id % 5 + turn))
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+
+    print(json.dumps({
+        "commit": current_commit(),
+        "users": len(memory.histories),
+        "turns_per_user": memory.max_turns * 2,
+        "text_mb": round(memory.total_size / 2 ** 20, 1),
+        "memory_mb": round(current / 2 ** 20, 1),
+        "peak_mb": round(peak / 2 ** 20, 1),
+        "bytes_per_user": round(current / args.users),
+        "add_us_per_turn": round(elapsed / (args.users * memory.max_turns) * 1e6, 1),
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import subprocess
+import tempfile
+from typing import Dict
+
+from aiogram.client.telegram import TelegramAPIServer
+
+from benchmarks.fake_services import (
+    Behaviour, FakeSheets, FakeTelegram, FakeTinkoff, FakeWorksheet, FakeYandexGPT, ServiceThread
+)
+from benchmarks.telegram_feeder import UpdateFeeder
+
+BENCH_TOKEN = "123456789:AAbenchmarkTokenForLocalFakeServer00"
+
+BENCH_EVENTS = {
+    "yuryuzan_june": {
+        "name": "Сплав по реке Юрюзань",
+        "dates": "11-15 июня",
+        "start_date": "2099-06-11",
+        "location": "Урал",
+        "capacity": 1000000,
+        "price": 19500,
+        "description": "Включено: трансфер, питание, прокат группового снаряжения, походная баня, инструктор"
+    }
+}
+
+
+def add_service_arguments(parser: argparse.ArgumentParser):
+    """Задержки и ошибки замен сервисов в аргументах командной строки"""
+    parser.add_argument("--telegram-latency-ms", type=float, default=30)
+    parser.add_argument("--yandex-latency-ms", type=float, default=800)
+    parser.add_argument("--tinkoff-latency-ms", type=float, default=300)
+    parser.add_argument("--sheets-latency-ms", type=float, default=400)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500 у всех сервисов")
+    parser.add_argument("--telegram-limits", action="store_true", help="не снимать лимиты отправки Telegram")
+
+
+def environment_from_args(args) -> "BenchEnvironment":
+    behaviours = {
+        "telegram": Behaviour(args.telegram_latency_ms, error_rate=args.error_rate),
+        "yandex_gpt": Behaviour(args.yandex_latency_ms, error_rate=args.error_rate),
+        "tinkoff": Behaviour(args.tinkoff_latency_ms, error_rate=args.error_rate),
+        "sheets": Behaviour(args.sheets_latency_ms, error_rate=args.error_rate),
+    }
+    return BenchEnvironment(behaviours, telegram_limits=args.telegram_limits)
+
+
+def current_commit() -> str:
+    """Коммит, на котором запущен бенчмарк (для сравнения результатов между коммитами)"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+class BenchEnvironment:
+    def __init__(self, behaviours: Dict[str, Behaviour] = None, telegram_limits: bool = False):
+        """
+        Бот из main.py, подключенный к локальным заменам сервисов
+        behaviours: задержки и ошибки по именам сервисов (telegram, yandex_gpt, tinkoff, sheets)
+        telegram_limits: оставить лимиты отправки Telegram (по умолчанию сняты, чтобы мерить сам бот)
+        Окружение настраивается до импорта main, поэтому в процессе создается один раз.
+        """
+        behaviours = behaviours or {}
+        self.telegram = FakeTelegram(behaviours.get("telegram"))
+        self.yandex_gpt = FakeYandexGPT(behaviours.get("yandex_gpt"))
+        self.tinkoff = FakeTinkoff(behaviours.get("tinkoff"))
+        self.sheets = FakeSheets(behaviours.get("sheets"))
+        self.services = ServiceThread(self.telegram, self.yandex_gpt, self.tinkoff, self.sheets)
+        self.telegram_limits = telegram_limits
+
+        self.workdir = tempfile.mkdtemp(prefix="chebextreme-bench-")
+        self.main = None
+        self.webhook = None
+        self.feeder = None
+
+    def configure(self, urls: Dict[str, str]):
+        """Переменные окружения для модулей бота: ключи, адреса замен, локальная база во временном каталоге"""
+        events_file = os.path.join(self.workdir, "events.json")
+        with open(events_file, "w", encoding="utf-8") as f:
+            json.dump(BENCH_EVENTS, f, ensure_ascii=False)
+
+        os.environ.update({
+            "TELEGRAM_TOKEN": BENCH_TOKEN,
+            "YANDEX_API_KEY": "bench-yandex-key",
+            "YANDEX_FOLDER_ID": "bench-folder",
+            "YANDEX_GPT_API_URL": f"{urls['yandex_gpt']}/foundationModels/v1",
+            "TINKOFF_TERMINAL_KEY": "BenchTerminal",
+            "TINKOFF_SECRET_KEY": "bench-secret",
+            "TINKOFF_API_URL": f"{urls['tinkoff']}/v2",
+            "GOOGLE_SPREADSHEET_ID": "bench-spreadsheet",
+            "LOCAL_DB_PATH": os.path.join(self.workdir, "bench.db"),
+            "EVENTS_FILE": events_file,
+            "KNOWLEDGE_FILE": os.path.join(self.workdir, "knowledge_base.txt"),
+            "METRICS_PORT": "0",
+            "TRACE_SAMPLE_RATE": "0",
+        })
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        if not self.telegram_limits:
+            os.environ["TELEGRAM_GLOBAL_RATE"] = "1000000"
+            os.environ["TELEGRAM_CHAT_INTERVAL"] = "0"
+
+    async def start(self):
+        urls = self.services.start()
+        self.configure(urls)
+
+        self.main = importlib.import_module("main")
+        self.main.bot.session.api = TelegramAPIServer.from_base(urls["telegram"])
+        self.main.sheets_client.sheet = FakeWorksheet(urls["sheets"])
+        await self.main.yandex_gpt.initialize()
+        self.feeder = UpdateFeeder(self.main.dp, self.main.bot)
+
+    def load_webhook(self):
+        """Webhook-сервер Tinkoff (Flask) с ботом, отправляющим в замену Telegram"""
+        if not self.webhook:
+            self.webhook = importlib.import_module("tinkoff_webhook")
+            self.webhook.get_bot().session.api = TelegramAPIServer.from_base(self.telegram.url)
+        return self.webhook
+
+    def service_counters(self) -> Dict[str, Dict[str, int]]:
+        """Число запросов и инъецированных ошибок по сервисам"""
+        return {
+            service.name: {"requests": service.requests, "errors": service.errors}
+            for service in self.services.services
+        }
+
+    async def close(self):
+        if self.main:
+            await self.main.background_tasks.shutdown()
+            await self.main.yandex_gpt.close()
+            await self.main.bot.session.close()
+            if self.main.send_limiter.task:
+                self.main.send_limiter.task.cancel()
+        if self.webhook and self.webhook.bot:
+            await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(self.webhook.bot.session.close(), self.webhook.loop)
+            )
+            if self.webhook.send_limiter.task:
+                self.webhook.loop.call_soon_threadsafe(self.webhook.send_limiter.task.cancel)
+        self.services.stop()
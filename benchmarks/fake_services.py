@@ -0,0 +1,365 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import requests
+from aiohttp import web
+from gspread import Cell
+from gspread.utils import a1_to_rowcol
+
+
+class Behaviour:
+    def __init__(self, latency_ms: float = 0, jitter: float = 0.2, error_rate: float = 0):
+        """
+        Поведение замены сервиса
+        latency_ms: средняя задержка ответа
+        jitter: разброс задержки (доля от средней)
+        error_rate: доля ответов с ошибкой 500
+        """
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    async def delay(self):
+        if self.latency_ms:
+            spread = self.latency_ms * self.jitter
+            await asyncio.sleep(max(0.0, random.uniform(self.latency_ms - spread, self.latency_ms + spread)) / 1000)
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+class FakeServer:
+    name = "service"
+
+    def __init__(self, behaviour: Behaviour = None):
+        """Базовый aiohttp-сервер замены: задержка, инъекция ошибок и счетчик запросов"""
+        self.behaviour = behaviour or Behaviour()
+        self.requests = 0
+        self.errors = 0
+        self.runner = None
+        self.url = None
+
+    def routes(self, app: web.Application):
+        raise NotImplementedError
+
+    def handler(self, func):
+        """Обертка обработчика: задержка и ошибка 500 с заданной вероятностью"""
+        async def wrapped(request: web.Request):
+            self.requests += 1
+            await self.behaviour.delay()
+            if self.behaviour.should_fail():
+                self.errors += 1
+                return web.json_response({"error": "injected failure"}, status=500)
+            return await func(request)
+        return wrapped
+
+    async def start(self, host: str = "127.0.0.1") -> str:
+        app = web.Application(client_max_size=10 * 1024 * 1024)
+        self.routes(app)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+
+class FakeYandexGPT(FakeServer):
+    name = "yandex_gpt"
+
+    def __init__(self, behaviour: Behaviour = None, answer: str = None):
+        """Замена YandexGPT: completion с полем usage и tokenize"""
+        super().__init__(behaviour)
+        self.answer = answer or "Прокат электросамоката на 3 часа стоит 700 рублей. Ждем вас на ул. Ленинградская, 14!"
+
+    def routes(self, app: web.Application):
+        app.router.add_post("/foundationModels/v1/completion", self.handler(self.completion))
+        app.router.add_post("/foundationModels/v1/tokenize", self.handler(self.tokenize))
+
+    async def completion(self, request: web.Request):
+        payload = await request.json()
+        input_tokens = sum(len(message["text"]) // 4 for message in payload.get("messages", []))
+        completion_tokens = len(self.answer) // 4
+        return web.json_response({"result": {
+            "alternatives": [{"message": {"role": "assistant", "text": self.answer}, "status": "ALTERNATIVE_STATUS_FINAL"}],
+            "usage": {
+                "inputTextTokens": str(input_tokens),
+                "completionTokens": str(completion_tokens),
+                "totalTokens": str(input_tokens + completion_tokens)
+            },
+            "modelVersion": "fake"
+        }})
+
+    async def tokenize(self, request: web.Request):
+        payload = await request.json()
+        words = payload.get("text", "").split()
+        return web.json_response({"tokens": [{"id": str(i), "text": word} for i, word in enumerate(words)]})
+
+
+class FakeTinkoff(FakeServer):
+    name = "tinkoff"
+
+    def __init__(self, behaviour: Behaviour = None):
+        """Замена API Tinkoff: Init, GetState, Cancel; статусы платежей хранятся в памяти"""
+        super().__init__(behaviour)
+        self.payments: Dict[str, Dict] = {}
+        self.next_id = 1000000
+
+    def routes(self, app: web.Application):
+        app.router.add_post("/v2/Init", self.handler(self.init))
+        app.router.add_post("/v2/GetState", self.handler(self.get_state))
+        app.router.add_post("/v2/Cancel", self.handler(self.cancel))
+
+    async def init(self, request: web.Request):
+        payload = await request.json()
+        self.next_id += 1
+        payment_id = str(self.next_id)
+        self.payments[payment_id] = {"OrderId": payload["OrderId"], "Amount": payload["Amount"], "Status": "NEW"}
+        return web.json_response({
+            "Success": True, "ErrorCode": "0", "TerminalKey": payload.get("TerminalKey"),
+            "Status": "NEW", "PaymentId": payment_id, "OrderId": payload["OrderId"],
+            "Amount": payload["Amount"], "PaymentURL": f"{self.url}/pay/{payment_id}"
+        })
+
+    async def get_state(self, request: web.Request):
+        payload = await request.json()
+        payment = self.payments.get(str(payload.get("PaymentId")))
+        if not payment:
+            return web.json_response({"Success": False, "ErrorCode": "7", "Message": "Платеж не найден"})
+        return web.json_response({"Success": True, "ErrorCode": "0", "PaymentId": payload["PaymentId"], **payment})
+
+    async def cancel(self, request: web.Request):
+        payload = await request.json()
+        payment = self.payments.get(str(payload.get("PaymentId")))
+        if not payment:
+            return web.json_response({"Success": False, "ErrorCode": "7", "Message": "Платеж не найден"})
+        payment["Status"] = "CANCELED"
+        return web.json_response({"Success": True, "ErrorCode": "0", "Status": "CANCELED"})
+
+
+class FakeSheets(FakeServer):
+    name = "sheets"
+
+    def __init__(self, behaviour: Behaviour = None, header: List[str] = None):
+        """Замена листа Google Sheets: чтение всех значений, добавление строки, пакетная запись ячеек"""
+        super().__init__(behaviour)
+        self.rows: List[List[str]] = [header or [
+            "Дата бронирования", "Telegram ID", "Username", "ФИО",
+            "Телефон", "Серия паспорта", "Номер паспорта", "Дата рождения",
+            "Мероприятие", "Стоимость", "Статус оплаты", "Примечания"
+        ]]
+
+    def routes(self, app: web.Application):
+        app.router.add_get("/values", self.handler(self.get_values))
+        app.router.add_get("/values/column/{col}", self.handler(self.get_column))
+        app.router.add_post("/values:batchGet", self.handler(self.batch_get))
+        app.router.add_post("/values:append", self.handler(self.append))
+        app.router.add_post("/values:batchUpdate", self.handler(self.batch_update))
+
+    async def get_values(self, request: web.Request):
+        return web.json_response({"values": self.rows})
+
+    async def get_column(self, request: web.Request):
+        col = int(request.match_info["col"]) - 1
+        return web.json_response({"values": [row[col] if col < len(row) else "" for row in self.rows]})
+
+    async def batch_get(self, request: web.Request):
+        payload = await request.json()
+        return web.json_response({"valueRanges": [
+            [self.rows[row - 1]] if row <= len(self.rows) else [] for row in payload["rows"]
+        ]})
+
+    async def append(self, request: web.Request):
+        payload = await request.json()
+        for row in payload["values"]:
+            self.rows.append([str(value) for value in row])
+        return web.json_response({"updates": {"updatedRows": len(payload["values"])}})
+
+    async def batch_update(self, request: web.Request):
+        payload = await request.json()
+        for cell in payload["data"]:
+            row = self.rows[cell["row"] - 1]
+            row.extend([""] * (cell["col"] - len(row)))
+            row[cell["col"] - 1] = str(cell["value"])
+        return web.json_response({"totalUpdatedCells": len(payload["data"])})
+
+
+class FakeWorksheet:
+    def __init__(self, url: str):
+        """
+        Лист с интерфейсом gspread.Worksheet поверх FakeSheets
+        Синхронные HTTP-запросы, как у gspread, поэтому вызовы идут через asyncio.to_thread.
+        """
+        self.url = url
+        self.session = requests.Session()
+
+    def get_all_values(self) -> List[List[str]]:
+        response = self.session.get(f"{self.url}/values", timeout=30)
+        response.raise_for_status()
+        return response.json()["values"]
+
+    def get_all_records(self) -> List[Dict]:
+        rows = self.get_all_values()
+        header = rows[0]
+        return [dict(zip(header, row)) for row in rows[1:]]
+
+    def col_values(self, col: int) -> List[str]:
+        response = self.session.get(f"{self.url}/values/column/{col}", timeout=30)
+        response.raise_for_status()
+        return response.json()["values"]
+
+    def batch_get(self, ranges: List[str], **kwargs) -> List[List[List[str]]]:
+        """Диапазоны строк вида A5:L5"""
+        rows = [a1_to_rowcol(a1_range.split(":")[0])[0] for a1_range in ranges]
+        response = self.session.post(f"{self.url}/values:batchGet", json={"rows": rows}, timeout=30)
+        response.raise_for_status()
+        return response.json()["valueRanges"]
+
+    def append_row(self, values: List, **kwargs):
+        response = self.session.post(f"{self.url}/values:append", json={"values": [values]}, timeout=30)
+        response.raise_for_status()
+
+    def update_cell(self, row: int, col: int, value):
+        self.update_cells([Cell(row, col, value)])
+
+    def update_cells(self, cells: List, **kwargs):
+        data = [{"row": cell.row, "col": cell.col, "value": cell.value} for cell in cells]
+        response = self.session.post(f"{self.url}/values:batchUpdate", json={"data": data}, timeout=30)
+        response.raise_for_status()
+
+
+class FakeTelegram(FakeServer):
+    name = "telegram"
+
+    def __init__(self, behaviour: Behaviour = None):
+        """
+        Замена Bot API: отвечает на методы отправки и запоминает сообщения по чатам,
+        чтобы сценарии могли дождаться ответа бота
+        """
+        super().__init__(behaviour)
+        self.sent: Dict[int, List[Dict]] = defaultdict(list)
+        self.next_message_id = 1
+        self.methods: Dict[str, int] = defaultdict(int)
+        # Ожидающие ответа бота: chat_id -> [(маркеры, future из event loop сценария)]
+        self.waiters: Dict[int, List] = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def routes(self, app: web.Application):
+        app.router.add_post("/bot{token}/{method}", self.handler(self.call))
+
+    async def call(self, request: web.Request):
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        self.methods[method] += 1
+
+        chat_id = int(params.get("chat_id") or 0)
+        reply_markup = params.get("reply_markup")
+        if isinstance(reply_markup, str):
+            reply_markup = json.loads(reply_markup)
+
+        if method in ("sendMessage", "editMessageText"):
+            message_id = int(params.get("message_id") or 0)
+            if not message_id:
+                message_id = self.next_message_id
+                self.next_message_id += 1
+            self.record(chat_id, {
+                "method": method, "message_id": message_id, "text": params.get("text", ""),
+                "reply_markup": reply_markup, "at": time.monotonic()
+            })
+            result = {
+                "message_id": message_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", "")
+            }
+            if reply_markup:
+                result["reply_markup"] = reply_markup
+            return web.json_response({"ok": True, "result": result})
+
+        return web.json_response({"ok": True, "result": True})
+
+    def record(self, chat_id: int, message: Dict):
+        """Сохранение сообщения и пробуждение сценариев, которые его ждут"""
+        with self.lock:
+            self.sent[chat_id].append(message)
+            waiters = self.waiters.get(chat_id)
+            if not waiters:
+                return
+            for waiter in list(waiters):
+                markers, future = waiter
+                if any(marker in message["text"] for marker in markers):
+                    waiters.remove(waiter)
+                    future.get_loop().call_soon_threadsafe(self.resolve, future, message["text"])
+
+    @staticmethod
+    def resolve(future: asyncio.Future, text: str):
+        if not future.done():
+            future.set_result(text)
+
+    def last_text(self, chat_id: int) -> str:
+        messages = self.sent.get(chat_id)
+        return messages[-1]["text"] if messages else ""
+
+    def last_message_id(self, chat_id: int) -> int:
+        messages = self.sent.get(chat_id)
+        return messages[-1]["message_id"] if messages else 0
+
+    async def wait_text(self, chat_id: int, markers, timeout: float = 60) -> str:
+        """
+        Ожидание сообщения бота, содержащего один из маркеров
+        Без опроса: сервер сам будит ожидающих, поэтому тысячи пользователей не нагружают event loop.
+        """
+        future = asyncio.get_running_loop().create_future()
+        with self.lock:
+            text = self.last_text(chat_id)
+            if any(marker in text for marker in markers):
+                return text
+            waiter = (markers, future)
+            self.waiters[chat_id].append(waiter)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Нет ответа бота в чате {chat_id}") from None
+        finally:
+            with self.lock:
+                if waiter in self.waiters.get(chat_id, ()):
+                    self.waiters[chat_id].remove(waiter)
+
+
+class ServiceThread:
+    def __init__(self, *services: FakeServer):
+        """
+        Замены сервисов в отдельном потоке со своим event loop
+        Синхронные клиенты бота (gspread, requests) не блокируют сами себя,
+        а задержки сервисов не отнимают время у event loop бота.
+        """
+        self.services = services
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> Dict[str, str]:
+        """Запуск серверов; возвращает адреса по именам сервисов"""
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="fake-services", daemon=True)
+        self.thread.start()
+        urls = {}
+        for service in self.services:
+            urls[service.name] = asyncio.run_coroutine_threadsafe(service.start(), self.loop).result(10)
+        return urls
+
+    def stop(self):
+        for service in self.services:
+            asyncio.run_coroutine_threadsafe(service.stop(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
@@ -0,0 +1,244 @@
+"""
+Нагрузочный тест бронирования: виртуальные пользователи проходят все шаги BookingStates
+
+Запуск: python -m benchmarks.load_test --users 2000 --think-ms 1500 --invalid-rate 0.1 --ramp-s 60
+Каждый пользователь: /booking -> выбор мероприятия -> анкета (ФИО, телефон, серия и номер
+паспорта, дата рождения) -> подтверждение -> ссылка на оплату -> уведомление Tinkoff об оплате.
+Между шагами - случайная пауза "на размышление", часть ответов анкеты сначала вводится с ошибкой.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict
+
+from benchmarks.environment import (
+    BENCH_EVENTS, BenchEnvironment, add_service_arguments, current_commit, environment_from_args
+)
+from benchmarks.scenarios import CONFIRM_REPLIES, USER_BASE, booking_data, payment_notification
+from benchmarks.stats import LatencyStats
+
+# Шаги в порядке прохождения; для каждого - текст, по которому видно, что бот перешел дальше
+STEPS = {
+    "booking": "БРОНИРОВАНИЕ МЕРОПРИЯТИЙ",
+    "select": "",
+    "start_form": "Шаг 1/4",
+    "full_name": "Шаг 2/4",
+    "phone": "Паспорт (серия)",
+    "passport_series": "Паспорт (номер)",
+    "passport_number": "Шаг 4/4",
+    "birth_date": "ПОДТВЕРЖДЕНИЕ БРОНИРОВАНИЯ",
+    "confirm": "",
+    "payment_link": "ПРИНЯТО",
+    "payment": "ОПЛАТА ПРОШЛА УСПЕШНО",
+}
+
+FORM_FIELDS = ("full_name", "phone", "passport_series", "passport_number", "birth_date")
+
+# Типичные ошибки ввода: бот должен переспросить, не меняя состояния
+INVALID_INPUTS = {
+    "full_name": "Иван",
+    "phone": "8927123",
+    "passport_series": "97 00",
+    "passport_number": "12345",
+    "birth_date": "31.02.1990",
+}
+
+PAYMENT_LINK = re.compile(r"/pay/(\d+)")
+
+
+class StepFailed(Exception):
+    def __init__(self, step: str, reason: str):
+        super().__init__(f"{step}: {reason}")
+        self.step = step
+
+
+class BookingLoadTest:
+    def __init__(self, env: BenchEnvironment, users: int = 1000, think_ms: float = 1500,
+                 invalid_rate: float = 0.1, ramp_s: float = 10, reply_timeout: float = 120):
+        """
+        Нагрузка на сценарий бронирования
+        think_ms: средняя пауза пользователя между шагами (экспоненциальное распределение)
+        invalid_rate: вероятность ошибиться в поле анкеты перед правильным ответом
+        ramp_s: за сколько секунд подключаются все пользователи
+        """
+        self.env = env
+        self.users = users
+        self.think_ms = think_ms
+        self.invalid_rate = invalid_rate
+        self.ramp_s = ramp_s
+        self.reply_timeout = reply_timeout
+
+        self.steps: Dict[str, LatencyStats] = {step: LatencyStats() for step in STEPS}
+        self.bookings = LatencyStats()
+        self.failures = Counter()
+        self.invalid_inputs = 0
+        self.in_progress = 0
+        self.peak_in_progress = 0
+
+    async def think(self):
+        if self.think_ms:
+            await asyncio.sleep(min(random.expovariate(1000 / self.think_ms), self.think_ms * 5 / 1000))
+
+    def check_reply(self, step: str, user_id: int):
+        """Последнее сообщение бота должно соответствовать следующему шагу"""
+        marker = STEPS[step]
+        text = self.env.telegram.last_text(user_id)
+        if marker and marker not in text:
+            raise StepFailed(step, text.strip()[:80] or "нет ответа")
+
+    async def feed(self, step: str, update, user_id: int = None):
+        """Подача обновления с замером времени обработки шага"""
+        self.steps[step].add(await self.env.feeder.feed(update))
+        if user_id is not None:
+            self.check_reply(step, user_id)
+
+    async def message(self, step: str, user_id: int, text: str, check: bool = True):
+        await self.feed(step, self.env.feeder.message(user_id, text), user_id if check else None)
+
+    async def press(self, step: str, user_id: int, callback: str, check: bool = True):
+        """Нажатие кнопки под последним сообщением бота"""
+        message_id = self.env.telegram.last_message_id(user_id)
+        await self.feed(step, self.env.feeder.callback(user_id, callback, message_id), user_id if check else None)
+
+    async def wait(self, step: str, user_id: int, markers) -> str:
+        """Ожидание фонового ответа бота с замером времени от начала ожидания"""
+        started = time.perf_counter()
+        text = await self.env.telegram.wait_text(user_id, markers, self.reply_timeout)
+        self.steps[step].add(time.perf_counter() - started)
+        return text
+
+    async def pay(self, user_id: int, text: str):
+        """Оплата по ссылке: платеж в замене Tinkoff подтверждается, webhook получает уведомление"""
+        match = PAYMENT_LINK.search(text)
+        if not match:
+            raise StepFailed("payment", "нет ссылки на оплату")
+        payment_id = match.group(1)
+        payment = self.env.tinkoff.payments[payment_id]
+        payment["Status"] = "CONFIRMED"
+
+        webhook = self.env.webhook
+        payload = payment_notification(payment["OrderId"], payment_id, payment["Amount"], webhook.TINKOFF_SECRET_KEY)
+        started = time.perf_counter()
+        response = await asyncio.to_thread(webhook.app.test_client().post, "/tinkoff_webhook", json=payload)
+        if response.status_code != 200:
+            raise StepFailed("payment", f"webhook ответил {response.status_code}")
+        await self.env.telegram.wait_text(user_id, (STEPS["payment"],), self.reply_timeout)
+        self.steps["payment"].add(time.perf_counter() - started)
+
+    async def user(self, index: int):
+        """Один пользователь от /booking до уведомления об оплате"""
+        await asyncio.sleep(random.uniform(0, self.ramp_s))
+        user_id = USER_BASE["load_test"] + index
+        data = booking_data(user_id)
+        event_id = random.choice(list(BENCH_EVENTS))
+        main = self.env.main
+
+        self.in_progress += 1
+        self.peak_in_progress = max(self.peak_in_progress, self.in_progress)
+        started = time.perf_counter()
+        try:
+            await self.message("booking", user_id, "/booking")
+            await self.think()
+            await self.press("select", user_id, main.BookingCallback(action="select", event_id=event_id).pack())
+            await self.think()
+            await self.press("start_form", user_id, main.BookingCallback(action="start_form").pack())
+
+            for field in FORM_FIELDS:
+                await self.think()
+                if random.random() < self.invalid_rate:
+                    self.invalid_inputs += 1
+                    await self.message(field, user_id, INVALID_INPUTS[field], check=False)
+                    if "❌" not in self.env.telegram.last_text(user_id):
+                        raise StepFailed(field, "неверный ввод принят")
+                    await self.think()
+                await self.message(field, user_id, data[field])
+
+            await self.think()
+            await self.press("confirm", user_id, main.BookingCallback(action="confirm").pack(), check=False)
+            text = await self.wait("payment_link", user_id, CONFIRM_REPLIES)
+            if STEPS["payment_link"] not in text:
+                raise StepFailed("payment_link", text.strip()[:80])
+
+            await self.think()
+            await self.pay(user_id, text)
+            self.bookings.add(time.perf_counter() - started)
+        except StepFailed as e:
+            self.failures[e.step] += 1
+        except Exception as e:
+            self.failures[type(e).__name__] += 1
+        finally:
+            self.in_progress -= 1
+
+    async def run(self) -> Dict:
+        self.env.load_webhook()
+        started = time.perf_counter()
+        await asyncio.gather(*(self.user(i) for i in range(self.users)))
+        elapsed = time.perf_counter() - started
+
+        completed = len(self.bookings.latencies)
+        return {
+            "users": self.users,
+            "completed": completed,
+            "failed": sum(self.failures.values()),
+            "elapsed_s": round(elapsed, 3),
+            "bookings_per_s": round(completed / elapsed, 2) if elapsed else 0.0,
+            "peak_concurrent_users": self.peak_in_progress,
+            "invalid_inputs": self.invalid_inputs,
+            "failures_by_step": dict(self.failures),
+            "booking_total": self.bookings.summary(elapsed),
+            "steps": {
+                step: {key: value for key, value in stats.summary(elapsed).items() if key not in ("elapsed_s", "throughput_per_s")}
+                for step, stats in self.steps.items()
+            },
+        }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бронирования на локальных заменах сервисов")
+    parser.add_argument("--users", type=int, default=1000, help="виртуальных пользователей")
+    parser.add_argument("--think-ms", type=float, default=1500, help="средняя пауза между шагами")
+    parser.add_argument("--invalid-rate", type=float, default=0.1, help="доля полей анкеты с ошибочным вводом")
+    parser.add_argument("--ramp-s", type=float, default=10, help="время подключения всех пользователей")
+    add_service_arguments(parser)
+    parser.add_argument("--output", help="файл для JSON-результата (по умолчанию stdout)")
+    return parser.parse_args()
+
+
+async def run(args) -> Dict:
+    env = environment_from_args(args)
+    await env.start()
+    try:
+        print(f"▶ load_test: {args.users} пользователей...", file=sys.stderr)
+        result = await BookingLoadTest(
+            env, users=args.users, think_ms=args.think_ms, invalid_rate=args.invalid_rate, ramp_s=args.ramp_s
+        ).run()
+    finally:
+        await env.close()
+
+    return {
+        "commit": current_commit(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "params": vars(args),
+        "load_test": result,
+        "services": env.service_counters(),
+    }
+
+
+def main():
+    args = parse_args()
+    report = json.dumps(asyncio.run(run(args)), ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Логирование: маскирование секретов и стоимость отключенных отладочных сообщений
+
+Запуск: python -m benchmarks.log_config [--iterations 200000]
+Перед замером проверяется, что паспорт и телефон в тексте маскируются,
+а PaymentId, id чатов и номера заказов остаются в логе как есть; секреты
+в тексте исключения маскируются и в трассировке.
+"""
+import argparse
+import json
+import logging
+import queue
+import time
+
+from benchmarks.environment import current_commit
+from log_config import REDACTED, JsonFormatter, RedactingFilter, RedactingQueueHandler, redact_text, redact_value
+
+PAYLOAD = {"TerminalKey": "terminal", "Amount": 1950000, "OrderId": "order", "Description": "Сплав", "Token": "x"}
+
+
+def check_redaction():
+    """Секреты вырезаются, идентификаторы - нет"""
+    kept = (
+        "Платеж 3093639567 подтвержден",  # PaymentId Tinkoff - 10 цифр
+        "Статус оплаты обновлен для 5012345678",  # id пользователя Telegram
+        "Рассылка в чат -1001234567890",  # id группы
+        "Уведомление 81234567890: CONFIRMED",  # слитные 11 цифр неотличимы от идентификатора
+        "Заказ 1718191234-5012345678",
+    )
+    for text in kept:
+        assert redact_text(text) == text, text
+
+    masked = (
+        ("Паспорт: 97 12 345678", "Паспорт: " + REDACTED),
+        ("серия и номер 9712 345678", "серия и номер " + REDACTED),
+        ("Телефон +7 927 669-19-52", "Телефон " + REDACTED),
+        ("звоните 8 (927) 669-19-52", "звоните " + REDACTED),
+        ("+79276691952", REDACTED),
+        ("Authorization: Api-Key AQVN123", "Authorization: " + REDACTED),
+    )
+    for text, expected in masked:
+        assert redact_text(text) == expected, (text, redact_text(text))
+
+    data = redact_value({"PaymentId": 3093639567, "chat_id": 5012345678, "passport_number": "345678", "Phone": "x"})
+    assert data == {"PaymentId": 3093639567, "chat_id": 5012345678, "passport_number": REDACTED, "Phone": REDACTED}
+
+
+def check_exception_redaction():
+    """Токен бота и телефон из текста исключения не попадают в запись ни в JSON, ни в тексте"""
+    token = "123456789:" + "A" * 35
+    phone = "+7 927 669-19-52"
+    handler = RedactingQueueHandler(queue.SimpleQueue())
+    handler.addFilter(RedactingFilter())
+    exc_logger = logging.getLogger("bench.exc")
+    exc_logger.propagate = False
+    exc_logger.addHandler(handler)
+    try:
+        raise RuntimeError(f"https://api.telegram.org/bot{token}/sendMessage: клиент {phone}")
+    except RuntimeError:
+        exc_logger.exception("Ошибка отправки для %s", phone)
+    finally:
+        exc_logger.removeHandler(handler)
+
+    record = handler.queue.get_nowait()
+    entry = json.loads(JsonFormatter().format(record))
+    assert "RuntimeError" in entry["exc"], entry
+    text = logging.Formatter("%(levelname)s %(name)s: %(message)s").format(record)
+    for output in (json.dumps(entry, ensure_ascii=False), text):
+        assert token not in output and phone not in output, output
+        assert REDACTED in output, output
+
+
+def per_call_us(func, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return round((time.perf_counter() - started) / iterations * 1e6, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Маскирование и стоимость отладочных логов")
+    parser.add_argument("--iterations", type=int, default=200_000)
+    args = parser.parse_args()
+
+    check_redaction()
+    check_exception_redaction()
+
+    # Стоимость отключенного отладочного лога с payload'ом: f-строка против ленивого формата
+    logging.getLogger().setLevel(logging.INFO)
+    bench_logger = logging.getLogger("bench")
+    eager = per_call_us(lambda: bench_logger.debug(f"Payload: {PAYLOAD}"), args.iterations)
+    lazy = per_call_us(lambda: bench_logger.debug("Payload: %s", PAYLOAD), args.iterations)
+
+    record = logging.LogRecord("tinkoff_payment", logging.INFO, "", 0, "Payload: %s", (PAYLOAD,), None)
+    redact_filter = RedactingFilter()
+    formatter = JsonFormatter()
+
+    def redact_and_format():
+        item = logging.LogRecord("tinkoff_payment", logging.INFO, "", 0, "Payload: %s", (PAYLOAD,), None)
+        redact_filter.filter(item)
+        formatter.format(item)
+
+    redact_filter.filter(record)
+    print(json.dumps({
+        "commit": current_commit(),
+        "debug_disabled_us": {"fstring": eager, "lazy": lazy},
+        "redact_format_us": per_call_us(redact_and_format, args.iterations // 10),
+        "sample": json.loads(formatter.format(record)),
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Накладные расходы инструментирования горячего пути (metrics)
+
+Запуск: python -m benchmarks.metrics [--iterations 1000000]
+Сравниваются Counter.inc, Histogram.observe и блок track() с пустым вызовом,
+отдельно замеряется выдача всех метрик в текстовом формате Prometheus.
+"""
+import argparse
+import json
+import time
+from typing import Callable
+
+from benchmarks.environment import current_commit
+from metrics import CACHE_REQUESTS, EXTERNAL_DURATION, REGISTRY, track
+
+
+def per_call_us(func: Callable, iterations: int) -> float:
+    """Среднее время одного вызова, микросекунды"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return round((time.perf_counter() - started) / iterations * 1e6, 3)
+
+
+def timed_block():
+    with track("bench", "call"):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Накладные расходы метрик")
+    parser.add_argument("--iterations", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    cases = {
+        "counter_inc": lambda: CACHE_REQUESTS.inc("bench", "hit"),
+        "histogram_observe": lambda: EXTERNAL_DURATION.observe(0.042, "bench", "call"),
+        "track_block": timed_block,
+        "empty_call": lambda: None,
+    }
+    results = {name: per_call_us(func, args.iterations) for name, func in cases.items()}
+
+    started = time.perf_counter()
+    text = REGISTRY.render()
+    render_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    print(json.dumps({
+        "commit": current_commit(),
+        "iterations": args.iterations,
+        "us_per_call": results,
+        "render_ms": render_ms,
+        "render_bytes": len(text),
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
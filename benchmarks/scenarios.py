@@ -0,0 +1,203 @@
+import asyncio
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+
+import tinkoff_signing
+from benchmarks.environment import BENCH_EVENTS, BenchEnvironment
+from benchmarks.stats import LatencyStats
+
+QUESTIONS = [
+    "Сколько стоит прокат велосипеда на 3 часа?",
+    "Какой залог за электросамокат?",
+    "Во сколько вы открываетесь?",
+    "Есть ли детские велосипеды?",
+    "Сколько стоит SUP на выходные?",
+    "Где вы находитесь?",
+    "А на сутки сколько?",
+    "Когда следующий сплав?",
+]
+
+# Первый пользователь сценария; у каждого сценария свой диапазон, чтобы истории и состояния не пересекались
+USER_BASE = {
+    "faq_storm": 1_000_000, "booking_rush": 2_000_000, "webhook_burst": 3_000_000,
+    "load_test": 4_000_000, "mybookings_browse": 5_000_000,
+}
+
+# Ответы бота на подтверждение бронирования: ссылка на оплату или одна из ошибок
+CONFIRM_REPLIES = ("ПРИНЯТО", "ОШИБКА", "Ошибка", "не осталось", "слишком долго")
+
+
+async def faq_storm(env: BenchEnvironment, users: int = 200, questions: int = 3, concurrency: int = 100) -> Dict:
+    """Одновременные вопросы консультанту: обработчик -> база знаний -> YandexGPT -> ответ"""
+    stats = LatencyStats()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def user_session(user_id: int):
+        for i in range(questions):
+            async with semaphore:
+                try:
+                    stats.add(await env.feeder.feed(env.feeder.message(user_id, random.choice(QUESTIONS))))
+                except Exception:
+                    stats.error()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user_session(USER_BASE["faq_storm"] + i) for i in range(users)))
+    return stats.summary(time.perf_counter() - started)
+
+
+def booking_data(user_id: int) -> Dict:
+    """Заполненная форма бронирования"""
+    event = BENCH_EVENTS["yuryuzan_june"]
+    return {
+        "selected_event": "yuryuzan_june",
+        "event_name": event["name"],
+        "price": event["price"],
+        "full_name": f"Иванов Иван {user_id}",
+        "phone": f"+7927{user_id % 10_000_000:07d}",
+        "passport_series": "9700",
+        "passport_number": f"{user_id % 1_000_000:06d}",
+        "birth_date": "01.01.1990",
+    }
+
+
+async def booking_rush(env: BenchEnvironment, users: int = 200) -> Dict:
+    """
+    Одновременные подтверждения бронирований: резерв места, запись в таблицу, Init в Tinkoff
+    Задержка - от нажатия "Подтвердить" до сообщения со ссылкой на оплату.
+    """
+    main = env.main
+    stats = LatencyStats()
+
+    async def confirm(user_id: int):
+        state = FSMContext(
+            storage=main.dp.storage,
+            key=StorageKey(bot_id=main.bot.id, chat_id=user_id, user_id=user_id)
+        )
+        await state.set_state(main.BookingStates.confirming_booking)
+        await state.set_data(booking_data(user_id))
+
+        callback = main.BookingCallback(action="confirm").pack()
+        started = time.perf_counter()
+        try:
+            await env.feeder.feed(env.feeder.callback(user_id, callback, message_id=user_id))
+            text = await env.telegram.wait_text(user_id, CONFIRM_REPLIES)
+            if "ПРИНЯТО" in text:
+                stats.add(time.perf_counter() - started)
+            else:
+                stats.error()
+        except Exception:
+            stats.error()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(confirm(USER_BASE["booking_rush"] + i) for i in range(users)))
+    return stats.summary(time.perf_counter() - started)
+
+
+def payment_notification(order_id: str, payment_id: str, amount: int, secret_key: str,
+                         status: str = "CONFIRMED") -> Dict:
+    """Подписанное уведомление Tinkoff о смене статуса платежа (сумма в копейках)"""
+    payload = {
+        "TerminalKey": "BenchTerminal", "OrderId": order_id, "Status": status,
+        "PaymentId": payment_id, "ErrorCode": "0", "Amount": amount,
+    }
+    payload["Token"] = tinkoff_signing.sign(payload, secret_key)
+    return payload
+
+
+async def webhook_burst(env: BenchEnvironment, notifications: int = 500, threads: int = 8) -> Dict:
+    """
+    Поток уведомлений Tinkoff на Flask webhook: подпись, дедупликация статуса, места, уведомление в Telegram
+    Запросы идут через тестовый клиент Flask из нескольких потоков, как у многопоточного сервера.
+    """
+    webhook = env.load_webhook()
+    secret_key = webhook.TINKOFF_SECRET_KEY
+    store = webhook.payment_store
+
+    payloads = []
+    for i in range(notifications):
+        chat_id = USER_BASE["webhook_burst"] + i
+        order_id = str(uuid.uuid4())
+        payment_id = str(9_000_000 + i)
+        store.save_payment(order_id, chat_id, 19500, BENCH_EVENTS["yuryuzan_june"]["name"])
+        store.set_payment_id(order_id, payment_id)
+
+        payloads.append(payment_notification(order_id, payment_id, 1950000, secret_key))
+
+    stats = LatencyStats()
+
+    def post(payload: Dict):
+        client = webhook.app.test_client()
+        started = time.perf_counter()
+        response = client.post("/tinkoff_webhook", json=payload)
+        if response.status_code == 200:
+            stats.add(time.perf_counter() - started)
+        else:
+            stats.error()
+
+    def run():
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(post, payloads))
+
+    started = time.perf_counter()
+    await asyncio.to_thread(run)
+    return stats.summary(time.perf_counter() - started)
+
+
+async def mybookings_browse(env: BenchEnvironment, users: int = 200, bookings: int = 40,
+                            other_rows: int = 50_000, pages: int = 4) -> Dict:
+    """
+    /mybookings у пользователей с длинной историей на большом листе:
+    первая страница, затем листание вперед и назад. Задержка - на одно действие.
+    """
+    main = env.main
+    event = BENCH_EVENTS["yuryuzan_june"]
+    header_width = len(env.sheets.rows[0])
+    filler = [["01.01.2024 10:00", "1", "", "", "", "", "", "", event["name"], "19500", "Оплачено", ""]] * other_rows
+    env.sheets.rows.extend(row[:header_width] for row in filler)
+    for i in range(users):
+        user_id = USER_BASE["mybookings_browse"] + i
+        for n in range(bookings):
+            env.sheets.rows.append([
+                f"{n % 28 + 1:02d}.06.2024 12:00", str(user_id), f"user{user_id}", f"Иванов Иван {user_id}",
+                "+79270000000", "9700", "000000", "01.01.1990", event["name"], "19500", "Не оплачено", ""
+            ])
+    main.sheets_client.user_index = None
+
+    stats = LatencyStats()
+    too_long = 0
+
+    async def browse(user_id: int):
+        nonlocal too_long
+        actions = [None] + [p for p in range(1, pages)] + [pages - 2]
+        for page in actions:
+            if page is None:
+                update = env.feeder.message(user_id, "/mybookings")
+            else:
+                callback = main.MyBookingsCallback(action="page", page=page).pack()
+                update = env.feeder.callback(user_id, callback, env.telegram.last_message_id(user_id))
+            try:
+                stats.add(await env.feeder.feed(update))
+                if len(env.telegram.last_text(user_id)) > 4096:
+                    too_long += 1
+            except Exception:
+                stats.error()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(browse(USER_BASE["mybookings_browse"] + i) for i in range(users)))
+    result = stats.summary(time.perf_counter() - started)
+    result["messages_over_limit"] = too_long
+    return result
+
+
+SCENARIOS = {
+    "faq_storm": faq_storm,
+    "booking_rush": booking_rush,
+    "webhook_burst": webhook_burst,
+    "mybookings_browse": mybookings_browse,
+}
@@ -0,0 +1,141 @@
+"""
+Квоты Google Sheets API: прямые вызовы gspread против очереди SheetsScheduler
+
+Запуск: python -m benchmarks.sheets_quota [--bookings 50] [--reads 150] [--background 20] [--scale 10]
+Поддельный API считает запросы скользящим окном, как Google (--limit чтений и записей в минуту),
+и отвечает 429 сверх квоты. Одновременно приходят записи бронирований, чтения для /mybookings
+(часть - одинаковые) и фоновые перезагрузки каталога. Минута сжата в --scale раз.
+Прямые вызовы повторяют прежнее поведение: 429 сразу становится ошибкой бронирования.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List
+
+import sheets_quota
+from benchmarks.environment import current_commit
+from sheets_quota import PRIORITY_BACKGROUND, PRIORITY_READ, PRIORITY_WRITE, SheetsScheduler
+
+
+class QuotaExceeded(Exception):
+    code = 429
+
+
+class FakeSheetsAPI:
+    def __init__(self, limit: int, window: float, latency: float):
+        self.limit = limit
+        self.window = window
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.sent = {"read": deque(), "write": deque()}
+        self.requests = 0
+        self.rejected = 0
+
+    def request(self, kind: str):
+        with self.lock:
+            now = time.monotonic()
+            sent = self.sent[kind]
+            while sent and sent[0] <= now - self.window:
+                sent.popleft()
+            self.requests += 1
+            if len(sent) >= self.limit:
+                self.rejected += 1
+                raise QuotaExceeded(f"Quota exceeded for {kind} requests per minute")
+            sent.append(now)
+        time.sleep(self.latency * random.uniform(0.5, 1.5))
+        return kind
+
+
+def workload(bookings: int, reads: int, background: int) -> List[str]:
+    jobs = ["write"] * bookings + ["read"] * reads + ["background"] * background
+    random.shuffle(jobs)
+    return jobs
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 1)
+
+
+def run(mode: str, jobs: List[str], api: FakeSheetsAPI, users: int) -> Dict:
+    scheduler = SheetsScheduler(api.limit, api.limit)
+    latencies = {"write": [], "read": [], "background": []}
+    failed = {"write": 0, "read": 0, "background": 0}
+
+    def job(index: int, name: str, submitted: float):
+        kind = "write" if name == "write" else "read"
+        try:
+            if mode == "direct":
+                api.request(kind)
+            elif name == "write":
+                scheduler.write("append_row", api.request, kind)
+            elif name == "read":
+                # /mybookings: индекс пользователей - общий для всех, одинаковые чтения объединяются
+                scheduler.read("col_values", api.request, kind, key=("col_values", index % users))
+            else:
+                scheduler.read("get_all_records", api.request, kind, priority=PRIORITY_BACKGROUND)
+        except QuotaExceeded:
+            failed[name] += 1
+            return
+        latencies[name].append(time.perf_counter() - submitted)
+
+    # Как в боте: прямые вызовы - в общем пуле, через очередь - в пуле своего приоритета.
+    # Задержка считается от постановки в пул: запросы, ждущие квоты, занимают его потоки
+    direct_pool = ThreadPoolExecutor(max_workers=sheets_quota.SHEETS_THREADS)
+    lanes = {"write": PRIORITY_WRITE, "read": PRIORITY_READ, "background": PRIORITY_BACKGROUND}
+    started = time.perf_counter()
+    futures = []
+    for index, name in enumerate(jobs):
+        pool = direct_pool if mode == "direct" else scheduler.executors[lanes[name]]
+        futures.append(pool.submit(job, index, name, time.perf_counter()))
+        time.sleep(0.005)
+    wait(futures)
+    return {
+        "seconds": round(time.perf_counter() - started, 2),
+        "api_requests": api.requests,
+        "api_429": api.rejected,
+        "failed": failed,
+        "p50_ms": {name: percentile(values, 0.5) for name, values in latencies.items()},
+        "p95_ms": {name: percentile(values, 0.95) for name, values in latencies.items()},
+        "headroom": scheduler.headroom() if mode == "scheduler" else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Очередь запросов к Google Sheets с учетом квот")
+    parser.add_argument("--bookings", type=int, default=50)
+    parser.add_argument("--reads", type=int, default=150)
+    parser.add_argument("--background", type=int, default=20)
+    parser.add_argument("--users", type=int, default=10, help="разных чтений среди --reads")
+    parser.add_argument("--limit", type=int, default=60, help="квота API в минуту на чтение и на запись")
+    parser.add_argument("--scale", type=float, default=10, help="во сколько раз сжата минута")
+    parser.add_argument("--latency", type=float, default=0.2, help="время ответа API, с (несжатое)")
+    args = parser.parse_args()
+
+    random.seed(42)
+    jobs = workload(args.bookings, args.reads, args.background)
+    # Минута и задержки повторов сжаты одинаково, чтобы прогон занимал секунды
+    sheets_quota.WINDOW = 60 / args.scale
+    sheets_quota.SHEETS_RETRY_BASE /= args.scale
+    sheets_quota.SHEETS_RETRY_CAP /= args.scale
+    latency = args.latency / args.scale
+
+    results = {}
+    for mode in ("direct", "scheduler"):
+        api = FakeSheetsAPI(args.limit, sheets_quota.WINDOW, latency)
+        results[mode] = run(mode, jobs, api, args.users)
+
+    print(json.dumps({
+        "commit": current_commit(), "limit_per_minute": args.limit, "scale": args.scale,
+        "bookings": args.bookings, "reads": args.reads, "background": args.background, "results": results,
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
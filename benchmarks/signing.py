@@ -0,0 +1,132 @@
+"""
+Микробенчмарк подписи Tinkoff: прежние generate_token / verify_signature против tinkoff_signing
+
+Запуск: python -m benchmarks.signing [--seconds 1.0] [--min-ops 10000]
+Перед замером проверяется, что токены Init совпадают с прежней реализацией,
+а уведомления с булевыми полями подписываются так же, как их подписывает Tinkoff.
+"""
+import argparse
+import hashlib
+import json
+import sys
+import time
+import uuid
+from typing import Callable, Dict
+
+import tinkoff_signing
+
+SECRET_KEY = "bench-secret"
+
+
+def legacy_generate_token(data: dict, secret_key: str) -> str:
+    """tinkoff_payment.generate_token до выделения tinkoff_signing"""
+    data_for_token = {
+        k: v for k, v in data.items()
+        if k != "Token" and v is not None and k not in ["Receipt", "DATA"]
+    }
+    values = []
+    for key, value in sorted(data_for_token.items()):
+        if isinstance(value, bool):
+            values.append("true" if value else "false")
+        elif isinstance(value, (int, float)):
+            values.append(str(int(value)))
+        else:
+            values.append(str(value))
+    values.append(str(secret_key))
+    return hashlib.sha256("".join(values).encode("utf-8")).hexdigest()
+
+
+def legacy_verify_signature(data: Dict, secret_key: str) -> bool:
+    """tinkoff_webhook.verify_signature до выделения tinkoff_signing"""
+    if "Token" not in data:
+        return False
+    received_token = data.pop("Token")
+    token_str = "".join(str(value) for key, value in sorted(data.items()) if key != "Token")
+    token_str += secret_key
+    calculated_token = hashlib.sha256(token_str.encode("utf-8")).hexdigest()
+    data["Token"] = received_token
+    return calculated_token == received_token
+
+
+def init_payload() -> Dict:
+    return {
+        "TerminalKey": "BenchTerminal",
+        "Amount": 1950000,
+        "OrderId": str(uuid.uuid4()),
+        "Description": "Бронирование: Сплав по реке Юрюзань",
+        "DATA": {"Phone": "+79270000000"},
+    }
+
+
+def notification_payload() -> Dict:
+    payload = {
+        "TerminalKey": "BenchTerminal", "OrderId": str(uuid.uuid4()), "Success": True,
+        "Status": "CONFIRMED", "PaymentId": 9000001, "ErrorCode": "0", "Amount": 1950000,
+        "CardId": 123456, "Pan": "430000******0777", "ExpDate": "1230",
+    }
+    payload["Token"] = tinkoff_signing.sign(payload, SECRET_KEY)
+    return payload
+
+
+def ops_per_second(func: Callable, seconds: float) -> float:
+    """Число вызовов в секунду (вызовы пачками, чтобы не мерить сам цикл замера)"""
+    batch = 1000
+    calls = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(batch):
+            func()
+        calls += batch
+    return calls / (time.perf_counter() - started)
+
+
+def check_compatibility():
+    """Новая подпись совпадает с прежней для запросов и исправляет проверку уведомлений"""
+    init = init_payload()
+    assert tinkoff_signing.sign(init, SECRET_KEY) == legacy_generate_token(init, SECRET_KEY)
+    status = {"TerminalKey": "BenchTerminal", "PaymentId": "9000001"}
+    assert tinkoff_signing.sign(status, SECRET_KEY) == legacy_generate_token(status, SECRET_KEY)
+
+    notification = notification_payload()
+    snapshot = dict(notification)
+    assert tinkoff_signing.verify(notification, SECRET_KEY)
+    assert notification == snapshot and list(notification) == list(snapshot)
+    # Прежняя проверка превращала True в "True" и отвергала подписанные Tinkoff уведомления
+    assert not legacy_verify_signature(notification, SECRET_KEY)
+
+    tampered = dict(notification, Amount=100)
+    assert not tinkoff_signing.verify(tampered, SECRET_KEY)
+    assert not tinkoff_signing.verify({k: v for k, v in notification.items() if k != "Token"}, SECRET_KEY)
+
+
+def run(seconds: float) -> Dict:
+    init = init_payload()
+    notification = notification_payload()
+    cases = {
+        "init_sign_legacy": lambda: legacy_generate_token(init, SECRET_KEY),
+        "init_sign": lambda: tinkoff_signing.sign(init, SECRET_KEY),
+        "webhook_verify_legacy": lambda: legacy_verify_signature(notification, SECRET_KEY),
+        "webhook_verify": lambda: tinkoff_signing.verify(notification, SECRET_KEY),
+    }
+    return {name: round(ops_per_second(func, seconds)) for name, func in cases.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк подписи Tinkoff")
+    parser.add_argument("--seconds", type=float, default=1.0, help="длительность замера одного случая")
+    parser.add_argument("--min-ops", type=int, default=10_000, help="минимально допустимая скорость, оп/с")
+    args = parser.parse_args()
+
+    check_compatibility()
+    results = run(args.seconds)
+    print(json.dumps({"ops_per_s": results}, indent=2))
+
+    slow = [name for name, ops in results.items() if not name.endswith("_legacy") and ops < args.min_ops]
+    if slow:
+        print(f"Медленнее {args.min_ops} оп/с: {', '.join(slow)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
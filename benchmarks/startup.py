@@ -0,0 +1,65 @@
+"""
+Время холодного импорта процессов бота и webhook-сервера
+
+Запуск: python -m benchmarks.startup [--runs 5]
+Каждый замер - отдельный процесс Python, как после деплоя. Полная разбивка запуска бота
+(импорты, подключение к таблице, прогрев соединений) пишется в лог при старте main.py.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+from benchmarks.environment import BENCH_TOKEN, current_commit
+
+MODULES = ("main", "tinkoff_webhook")
+
+PROBE = (
+    "import time; started = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def import_times(module: str, runs: int, env: Dict[str, str]) -> List[float]:
+    times = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module)],
+            capture_output=True, text=True, env=env, check=True
+        )
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время холодного импорта бота и webhook-сервера")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="chebextreme-startup-")
+    env = dict(
+        os.environ,
+        TELEGRAM_TOKEN=BENCH_TOKEN,
+        LOCAL_DB_PATH=os.path.join(workdir, "bench.db"),
+        METRICS_PORT="0",
+        LOG_LEVEL="WARNING",
+    )
+
+    results = {}
+    for module in MODULES:
+        times = import_times(module, args.runs, env)
+        results[module] = {
+            "median_s": round(statistics.median(times), 3),
+            "min_s": round(min(times), 3),
+            "max_s": round(max(times), 3),
+        }
+
+    print(json.dumps({"commit": current_commit(), "runs": args.runs, "import": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+from typing import Dict, List
+
+
+class LatencyStats:
+    def __init__(self):
+        """Задержки операций сценария и число ошибок"""
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def add(self, seconds: float):
+        self.latencies.append(seconds)
+
+    def error(self):
+        self.errors += 1
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    def summary(self, elapsed: float) -> Dict:
+        """Пропускная способность и перцентили задержки (миллисекунды)"""
+        count = len(self.latencies)
+        return {
+            "count": count,
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_per_s": round(count / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(self.percentile(0.5) * 1000, 2),
+            "p95_ms": round(self.percentile(0.95) * 1000, 2),
+            "p99_ms": round(self.percentile(0.99) * 1000, 2),
+            "max_ms": round(max(self.latencies, default=0.0) * 1000, 2),
+        }
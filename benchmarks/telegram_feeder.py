@@ -0,0 +1,57 @@
+import itertools
+import time
+from typing import Dict
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+
+class UpdateFeeder:
+    def __init__(self, dp: Dispatcher, bot: Bot):
+        """Синтетические обновления Telegram, которые подаются прямо в Dispatcher"""
+        self.dp = dp
+        self.bot = bot
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+
+    @staticmethod
+    def user(user_id: int) -> Dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+    def message(self, user_id: int, text: str) -> Update:
+        """Текстовое сообщение пользователя в личном чате"""
+        return Update.model_validate({
+            "update_id": next(self.update_ids),
+            "message": {
+                "message_id": next(self.message_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": self.user(user_id),
+                "text": text
+            }
+        }, context={"bot": self.bot})
+
+    def callback(self, user_id: int, data: str, message_id: int = 1) -> Update:
+        """Нажатие inline-кнопки под сообщением бота"""
+        return Update.model_validate({
+            "update_id": next(self.update_ids),
+            "callback_query": {
+                "id": str(next(self.update_ids)),
+                "from": self.user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": self.bot.id, "is_bot": True, "first_name": "ChebEXTREME"},
+                    "text": "..."
+                }
+            }
+        }, context={"bot": self.bot})
+
+    async def feed(self, update: Update) -> float:
+        """Обработка обновления; возвращает время обработки в секундах"""
+        started = time.perf_counter()
+        await self.dp.feed_update(self.bot, update)
+        return time.perf_counter() - started
@@ -0,0 +1,147 @@
+"""
+Выгрузка бронирований в CSV/XLSX из локальной копии (см. booking_store)
+
+Из бота: /export [csv|xlsx] [event=название] [from=дата] [to=дата] [status=статус]
+Из консоли: python booking_export.py --format xlsx --event Юрюзань --from 2025-05-01 -o season.xlsx
+"""
+import csv
+import logging
+import re
+from datetime import date, datetime
+from typing import Iterator, List, Optional, Tuple
+
+from booking_records import HEADERS
+from booking_store import BookingFilter, BookingStore
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("csv", "xlsx")
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y")
+FILTER_KEYS = {"event": "event", "from": "date_from", "to": "date_to", "status": "status"}
+
+
+def parse_date(value: str) -> date:
+    """Дата фильтра: 2025-05-01 или 01.05.2025"""
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Не удалось разобрать дату \"{value}\" (нужно 2025-05-01 или 01.05.2025)")
+
+
+def parse_arguments(text: str) -> Tuple[str, BookingFilter]:
+    """
+    Аргументы /export: формат и фильтры вида key=значение
+    Значение продолжается до следующего key=, поэтому названия мероприятий пишутся без кавычек.
+    """
+    parts = re.split(r"(?:^|\s+)(event|from|to|status)=", text.strip())
+    head = parts[0].strip().lower()
+    if head and head not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат \"{head}\" (можно {', '.join(EXPORT_FORMATS)})")
+
+    values = {}
+    for key, value in zip(parts[1::2], parts[2::2]):
+        value = value.strip()
+        if value:
+            values[FILTER_KEYS[key]] = parse_date(value) if key in ("from", "to") else value
+    return head or "csv", BookingFilter(**values)
+
+
+def write_csv(chunks: Iterator[List[Tuple]], path: str) -> int:
+    """CSV с BOM, чтобы Excel сразу открывал кириллицу"""
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8-sig") as file:
+        writer = csv.writer(file, delimiter=";")
+        writer.writerow(HEADERS)
+        for chunk in chunks:
+            writer.writerows(chunk)
+            count += len(chunk)
+    return count
+
+
+def write_xlsx(chunks: Iterator[List[Tuple]], path: str) -> int:
+    """
+    XLSX в потоковом режиме openpyxl (write_only): строки сразу уходят во временный файл
+    openpyxl - необязательная зависимость, нужна только для этого формата.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError("Для выгрузки в XLSX нужен пакет openpyxl (pip install -r requirements-extra.txt)")
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Бронирования")
+    worksheet.append(HEADERS)
+    count = 0
+    for chunk in chunks:
+        for row in chunk:
+            worksheet.append(row)
+        count += len(chunk)
+    workbook.save(path)
+    return count
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx}
+
+
+def export_bookings(store: BookingStore, path: str, export_format: str = "csv",
+                    filters: BookingFilter = None) -> int:
+    """Выгрузка бронирований, подходящих под фильтры, в файл; возвращает число строк"""
+    count = WRITERS[export_format](store.iter_chunks(filters), path)
+    logger.info("📤 Выгружено бронирований: %d (%s, %s)", count, export_format,
+                (filters or BookingFilter()).describe())
+    return count
+
+
+def export_filename(export_format: str, filters: BookingFilter) -> str:
+    suffix = f"_{filters.date_from or ''}_{filters.date_to or ''}" if filters.date_from or filters.date_to else ""
+    return f"bookings_{datetime.now():%Y%m%d_%H%M}{suffix}.{export_format}"
+
+
+def sync_from_sheet(store: BookingStore, sheets_client) -> int:
+    """Заполнение локальной копии всем листом (первый запуск или после ручных правок таблицы)"""
+    table = sheets_client.load_table()
+    return store.replace_all(table.record(i) for i in range(len(table)))
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+    import os
+
+    try:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+    except ImportError:
+        pass
+
+    parser = argparse.ArgumentParser(description="Выгрузка бронирований в CSV/XLSX")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--event", help="часть названия мероприятия")
+    parser.add_argument("--from", dest="date_from", type=parse_date, help="с даты бронирования")
+    parser.add_argument("--to", dest="date_to", type=parse_date, help="по дату бронирования включительно")
+    parser.add_argument("--status", help="статус оплаты")
+    parser.add_argument("--output", "-o", help="файл выгрузки")
+    parser.add_argument("--db", help="путь к локальной базе (по умолчанию LOCAL_DB_PATH)")
+    parser.add_argument("--sync-sheet", action="store_true",
+                        help="перед выгрузкой перечитать лист \"Бронирования\" в локальную копию")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    store = BookingStore(args.db)
+    if args.sync_sheet:
+        from google_sheet_client import GoogleSheetsClient
+
+        sheets_client = GoogleSheetsClient(os.getenv("GOOGLE_CREDENTIALS_FILE"), os.getenv("GOOGLE_SPREADSHEET_ID"))
+        sheets_client.connect()
+        sync_from_sheet(store, sheets_client)
+
+    filters = BookingFilter(args.event, args.date_from, args.date_to, args.status)
+    path = args.output or export_filename(args.format, filters)
+    count = export_bookings(store, path, args.format, filters)
+    print(f"{path}: {count} бронирований")
+
+
+if __name__ == "__main__":
+    main()
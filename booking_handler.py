@@ -3,9 +3,14 @@ from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, C
 from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+import asyncio
 import re
 from datetime import datetime
 from tinkoff_payment import init_payment
+from event_catalog import EventCatalog
+from metrics import cache_hit
+from sheets_quota import PRIORITY_WRITE
+from tracing import span
 import logging
 
 
@@ -19,6 +24,13 @@ class BookingStates(StatesGroup):
     confirming_booking = State()
 
 
+# Каталог перезагружается на лету: пока пользователь заполняет анкету, мероприятие могут убрать или переименовать
+EVENT_GONE_TEXT = (
+    "⚠️ Это мероприятие больше недоступно: расписание обновилось.\n\n"
+    "Начните бронирование заново: /booking"
+)
+
+
 # Callback данные для кнопок
 class BookingCallback(CallbackData, prefix="book"):
     action: str
@@ -26,50 +38,80 @@ class BookingCallback(CallbackData, prefix="book"):
 
 
 class BookingHandler:
-    def __init__(self, sheets_client):
+    def __init__(self, sheets_client, seat_inventory=None, catalog: EventCatalog = None):
         self.sheets_client = sheets_client
+        self.seat_inventory = seat_inventory
 
         # Доступные мероприятия
-        self.events = {
-            "yuryuzan_june": {
-                "name": "Сплав по реке Юрюзань",
-                "dates": "11-15 июня",
-                "location": "Урал",
-                "price_early": 18500,
-                "price_regular": 19500,
-                "early_deadline": "2 июня",
-                "description": "Включено: трансфер, питание, прокат группового снаряжения, походная баня, инструктор"
-            }
-        }
+        self.catalog = catalog or EventCatalog(sheets_client)
+        self.keyboard_cache = (None, None)
+
+        # Статические клавиатуры собираются один раз
+        self.details_keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(
+                text="📝 Продолжить бронирование",
+                callback_data=BookingCallback(action="start_form").pack()
+            )],
+            [InlineKeyboardButton(
+                text="🔙 Назад",
+                callback_data=BookingCallback(action="back").pack()
+            )]
+        ])
+        self.confirmation_keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text="✅ Подтвердить и оплатить",
+                    callback_data=BookingCallback(action="confirm").pack()
+                ),
+                InlineKeyboardButton(
+                    text="❌ Отменить",
+                    callback_data=BookingCallback(action="cancel").pack()
+                )
+            ]
+        ])
+
+    @property
+    def events(self):
+        """Мероприятия текущей версии каталога"""
+        return self.catalog.snapshot.events
 
     def get_events_keyboard(self):
         """Клавиатура со списком мероприятий"""
+        snapshot = self.catalog.snapshot
+        seats = tuple(self.get_remaining_seats(event_id) for event_id in snapshot.compiled)
+
+        # Клавиатура перестраивается только при смене каталога или числа свободных мест
+        cache_key = (snapshot.version, seats)
+        hit = self.keyboard_cache[0] == cache_key
+        cache_hit("events_keyboard", hit)
+        if hit:
+            return self.keyboard_cache[1]
+
         keyboard = InlineKeyboardMarkup(inline_keyboard=[])
 
-        for event_id, event in self.events.items():
+        for (event_id, event), remaining in zip(snapshot.compiled.items(), seats):
+            seats_text = ""
+            if remaining is not None:
+                seats_text = f" • мест: {remaining}" if remaining > 0 else " • мест нет"
+
             button = InlineKeyboardButton(
-                text=f"🏕️ {event['name']} ({event['dates']})",
+                text=f"{event.button_text}{seats_text}",
                 callback_data=BookingCallback(action="select", event_id=event_id).pack()
             )
             keyboard.inline_keyboard.append([button])
 
+        self.keyboard_cache = (cache_key, keyboard)
         return keyboard
 
+    def get_remaining_seats(self, event_id: str):
+        """Количество свободных мест на мероприятии (None - без ограничения)"""
+        if not self.seat_inventory:
+            return None
+        return self.seat_inventory.remaining(event_id)
+
     def get_confirmation_keyboard(self):
         """Клавиатура подтверждения бронирования"""
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text="✅ Подтвердить и оплатить",
-                    callback_data=BookingCallback(action="confirm").pack()
-                ),
-                InlineKeyboardButton(
-                    text="❌ Отменить",
-                    callback_data=BookingCallback(action="cancel").pack()
-                )
-            ]
-        ])
-        return keyboard
+        return self.confirmation_keyboard
 
     async def start_booking(self, message: Message, state: FSMContext):
         """Начало процесса бронирования"""
@@ -84,57 +126,23 @@ class BookingHandler:
     async def handle_event_selection(self, callback: CallbackQuery, callback_data: BookingCallback, state: FSMContext):
         """Обработка выбора мероприятия"""
         event_id = callback_data.event_id
-        event = self.events.get(event_id)
+        event = self.catalog.snapshot.compiled.get(event_id)
 
         if not event:
             await callback.answer("❌ Мероприятие не найдено")
             return
 
+        if self.get_remaining_seats(event_id) == 0:
+            await callback.answer("😔 Свободных мест не осталось", show_alert=True)
+            return
+
         # Сохраняем выбранное мероприятие в состояние
         await state.update_data(selected_event=event_id)
 
-        # Определяем цену
-        current_date = datetime.now()
-        deadline = datetime.strptime("2024-06-02", "%Y-%m-%d")  # Условная дата для примера
-        price = event['price_early'] if current_date < deadline else event['price_regular']
-
-        text = f"""
-🏕️ **{event['name']}**
-📅 {event['dates']} • 📍 {event['location']}
-
-💰 **Стоимость:** {price:,} ₽
-{f"⏰ До {event['early_deadline']} — {event['price_early']:,} ₽" if current_date < deadline else ""}
-
-📋 **Включено:**
-{event['description']}
-
-📝 **С собой взять:**
-• Личное снаряжение
-• Спальник и коврик  
-• Личные вещи
-
----
-**Для бронирования мне потребуются ваши данные:**
-• ФИО
-• Телефон
-• Паспортные данные
-• Дата рождения
-
-Продолжаем? 👇
-"""
+        # Описание с действующей ценой подготовлено заранее
+        text = event.details_at()
 
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(
-                text="📝 Продолжить бронирование",
-                callback_data=BookingCallback(action="start_form").pack()
-            )],
-            [InlineKeyboardButton(
-                text="🔙 Назад",
-                callback_data=BookingCallback(action="back").pack()
-            )]
-        ])
-
-        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+        await callback.message.edit_text(text, reply_markup=self.details_keyboard, parse_mode="Markdown")
         await callback.answer()
 
     async def start_form(self, callback: CallbackQuery, state: FSMContext):
@@ -257,12 +265,15 @@ class BookingHandler:
     async def show_booking_summary(self, message: Message, state: FSMContext):
         """Показ сводки для подтверждения"""
         data = await state.get_data()
-        event = self.events[data['selected_event']]
+        compiled = self.catalog.snapshot.compiled.get(data.get('selected_event'))
+        if compiled is None:
+            await state.clear()
+            await message.answer(EVENT_GONE_TEXT)
+            return
+        event = compiled.data
 
         # Определяем цену
-        current_date = datetime.now()
-        deadline = datetime.strptime("2024-06-02", "%Y-%m-%d")
-        price = event['price_early'] if current_date < deadline else event['price_regular']
+        price = compiled.price_at()
 
         summary = f"""
 ✅ **ПОДТВЕРЖДЕНИЕ БРОНИРОВАНИЯ**
@@ -289,51 +300,70 @@ class BookingHandler:
         keyboard = self.get_confirmation_keyboard()
         await message.answer(summary, reply_markup=keyboard, parse_mode="Markdown")
 
-    async def confirm_booking(self, callback: CallbackQuery, state: FSMContext):
-        """Подтверждение и создание платежа"""
-        try:
-            data = await state.get_data()
-            user = callback.from_user
-
-            # Подготавливаем данные для Google Sheets
-            booking_data = {
-                'telegram_id': user.id,
-                'username': user.username or '',
-                'full_name': data['full_name'],
-                'phone': data['phone'],
-                'passport_series': data['passport_series'],
-                'passport_number': data['passport_number'],
-                'birth_date': data['birth_date'],
-                'event_name': data['event_name'],
-                'price': data['price'],
-                'payment_status': 'Ожидает оплаты',
-                'booking_date': datetime.now().strftime("%d.%m.%Y %H:%M"),
-                'notes': f"Бронирование через Telegram бота"
-            }
-
-            # Сохраняем в Google Sheets
-            success = self.sheets_client.add_booking(booking_data)
-
-            if not success:
-                await callback.message.edit_text(
-                    "❌ **Ошибка при сохранении бронирования**\n\n"
-                    "Пожалуйста, обратитесь к администратору:\n"
-                    "📱 @chebextreme или +7 927 669 19 52",
-                    parse_mode="Markdown"
-                )
-                await callback.answer()
-                return
-
-            # Создаем платеж в Тинькофф
+    async def confirm_booking(self, message: Message, user, data: dict, order_id: str) -> bool:
+        """
+        Сохранение бронирования и создание платежа
+        Выполняется в фоне после ответа на callback, результат выводится правкой сообщения.
+        order_id: OrderId платежа (он же идентификатор резерва места)
+        Возвращает True, если ссылка на оплату создана
+        """
+        with span("booking.confirm", order_id=order_id, event_id=data.get("selected_event")):
             try:
-                payment_url = init_payment(
-                    amount=data['price'],
-                    description=f"{data['event_name']} - {data['full_name']}",
-                    customer_id=str(user.id)
-                )
-
-                await callback.message.edit_text(
-                    f"""
+                if data.get('selected_event') not in self.catalog.snapshot.compiled:
+                    await message.edit_text(EVENT_GONE_TEXT)
+                    return False
+
+                # Резервируем место до оплаты (резерв снимется при отмене или истечении ссылки)
+                if self.seat_inventory and not self.seat_inventory.hold(data['selected_event'], order_id, user.id):
+                    await message.edit_text(
+                        "😔 К сожалению, свободных мест на это мероприятие не осталось.\n\n"
+                        "Посмотреть другие мероприятия: /booking"
+                    )
+                    return False
+
+                # Подготавливаем данные для Google Sheets
+                booking_data = {
+                    'telegram_id': user.id,
+                    'username': user.username or '',
+                    'full_name': data['full_name'],
+                    'phone': data['phone'],
+                    'passport_series': data['passport_series'],
+                    'passport_number': data['passport_number'],
+                    'birth_date': data['birth_date'],
+                    'event_name': data['event_name'],
+                    'price': data['price'],
+                    'payment_status': 'Ожидает оплаты',
+                    'booking_date': datetime.now().strftime("%d.%m.%Y %H:%M"),
+                    'notes': f"Бронирование через Telegram бота"
+                }
+
+                # Сохраняем в Google Sheets
+                success = await self.sheets_client.run(self.sheets_client.add_booking, booking_data, priority=PRIORITY_WRITE)
+
+                if not success:
+                    self.release_seat(order_id)
+                    await message.edit_text(
+                        "❌ **Ошибка при сохранении бронирования**\n\n"
+                        "Пожалуйста, обратитесь к администратору:\n"
+                        "📱 @chebextreme или +7 927 669 19 52",
+                        parse_mode="Markdown"
+                    )
+                    return False
+
+                # Создаем платеж в Тинькофф
+                try:
+                    payment_url = await asyncio.to_thread(
+                        init_payment,
+                        amount=data['price'],
+                        description=f"{data['event_name']} - {data['full_name']}",
+                        customer_id=str(user.id),
+                        chat_id=user.id,
+                        event_name=data['event_name'],
+                        order_id=order_id
+                    )
+
+                    await message.edit_text(
+                        f"""
 🎉 **БРОНИРОВАНИЕ ПРИНЯТО!**
 
 ✅ Ваша заявка сохранена
@@ -352,18 +382,23 @@ class BookingHandler:
 
 Спасибо за выбор ChebEXTREME! 🏕️
 """,
-                    parse_mode="Markdown",
-                    disable_web_page_preview=False
-                )
-
-            except Exception as payment_error:
-                logging.error(f"Ошибка создания платежа: {payment_error}")
-
-                # Обновляем статус в Google Sheets
-                self.sheets_client.update_booking_status(user.id, "Ошибка оплаты")
-
-                await callback.message.edit_text(
-                    f"""
+                        parse_mode="Markdown",
+                        disable_web_page_preview=False
+                    )
+                    return True
+
+                except Exception as payment_error:
+                    logging.error("Ошибка создания платежа: %s", payment_error)
+
+                    # Обновляем статус в Google Sheets
+                    await self.sheets_client.run(
+                        self.sheets_client.update_payment_status, user.id, data['event_name'], "Ошибка оплаты",
+                        priority=PRIORITY_WRITE
+                    )
+                    self.release_seat(order_id)
+
+                    await message.edit_text(
+                        f"""
 ❌ **ОШИБКА СОЗДАНИЯ ПЛАТЕЖА**
 
 Ваше бронирование сохранено, но возникла проблема с платежной системой.
@@ -376,20 +411,25 @@ class BookingHandler:
 
 Мы поможем завершить оплату другим способом.
 """,
+                        parse_mode="Markdown"
+                    )
+
+            except Exception as e:
+                logging.error("Ошибка при подтверждении бронирования: %s", e)
+                self.release_seat(order_id)
+                await message.edit_text(
+                    "❌ **Произошла ошибка**\n\n"
+                    "Пожалуйста, попробуйте позже или обратитесь к администратору:\n"
+                    "📱 @chebextreme или +7 927 669 19 52",
                     parse_mode="Markdown"
                 )
 
-        except Exception as e:
-            logging.error(f"Ошибка при подтверждении бронирования: {e}")
-            await callback.message.edit_text(
-                "❌ **Произошла ошибка**\n\n"
-                "Пожалуйста, попробуйте позже или обратитесь к администратору:\n"
-                "📱 @chebextreme или +7 927 669 19 52",
-                parse_mode="Markdown"
-            )
+            return False
 
-        await state.clear()
-        await callback.answer()
+    def release_seat(self, order_id: str):
+        """Снятие резерва места, если он был"""
+        if self.seat_inventory:
+            self.seat_inventory.release(order_id)
 
     async def cancel_booking(self, callback: CallbackQuery, state: FSMContext):
         """Отмена бронирования"""
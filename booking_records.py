@@ -0,0 +1,182 @@
+from operator import itemgetter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Колонки листа "Бронирования": поле записи -> заголовок колонки (порядок - как в новой таблице)
+COLUMNS = (
+    ("booked_at", "Дата бронирования"),
+    ("telegram_id", "Telegram ID"),
+    ("username", "Username"),
+    ("full_name", "ФИО"),
+    ("phone", "Телефон"),
+    ("passport_series", "Серия паспорта"),
+    ("passport_number", "Номер паспорта"),
+    ("birth_date", "Дата рождения"),
+    ("event_name", "Мероприятие"),
+    ("price", "Стоимость"),
+    ("payment_status", "Статус оплаты"),
+    ("notes", "Примечания"),
+)
+FIELDS = tuple(field for field, _ in COLUMNS)
+HEADERS = [header for _, header in COLUMNS]
+
+PAID_STATUS = "Оплачено"
+
+
+def parse_int(value) -> int:
+    """Число из ячейки ("19500", "19 500", 19500.0); пустое или нечисловое значение - 0"""
+    if value.__class__ is int:
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return int(float(str(value).replace(" ", "").replace("\u00a0", "").replace(",", ".")))
+    except ValueError:
+        return 0
+
+
+class BookingRecord:
+    __slots__ = ("row",) + FIELDS
+
+    row: int
+    booked_at: str
+    telegram_id: int
+    username: str
+    full_name: str
+    phone: str
+    passport_series: str
+    passport_number: str
+    birth_date: str
+    event_name: str
+    price: int
+    payment_status: str
+    notes: str
+
+    def __init__(self, row: int, values: Sequence[str]):
+        """
+        Бронирование из строки таблицы
+        row: номер строки листа (с 1, заголовок - строка 1)
+        values: значения в порядке FIELDS (см. ColumnMap.values)
+        """
+        self.row = row
+        (self.booked_at, telegram_id, self.username, self.full_name, self.phone,
+         self.passport_series, self.passport_number, self.birth_date, self.event_name,
+         price, self.payment_status, self.notes) = values
+        self.telegram_id = parse_int(telegram_id)
+        self.price = parse_int(price)
+
+    @property
+    def is_paid(self) -> bool:
+        return self.payment_status == PAID_STATUS
+
+    def to_row(self) -> List:
+        """Значения в порядке колонок по умолчанию (для записи в таблицу)"""
+        return [getattr(self, field) for field in FIELDS]
+
+    def __repr__(self) -> str:
+        return f"BookingRecord(row={self.row}, telegram_id={self.telegram_id}, event_name={self.event_name!r})"
+
+
+class ColumnMap:
+    __slots__ = ("indexes", "width")
+
+    def __init__(self, header: Sequence[str] = None):
+        """
+        Единственное место, где поля бронирования сопоставляются колонкам листа
+        Колонки ищутся по заголовку, поэтому перестановка колонок в таблице ничего не ломает.
+        Если ни одного известного заголовка нет (пустой лист), используются позиции по умолчанию;
+        поле без колонки читается как пустая строка.
+        """
+        positions = {str(name).strip(): i for i, name in enumerate(header or ())}
+        if not positions.keys() & set(HEADERS):
+            positions = {name: i for i, name in enumerate(HEADERS)}
+        self.indexes: Tuple[Optional[int], ...] = tuple(positions.get(name) for name in HEADERS)
+        self.width = max(index for index in self.indexes if index is not None) + 1
+
+    def index(self, field: str) -> int:
+        """Индекс колонки поля в строке значений (с 0)"""
+        index = self.indexes[FIELDS.index(field)]
+        if index is None:
+            raise KeyError(f"На листе нет колонки \"{HEADERS[FIELDS.index(field)]}\"")
+        return index
+
+    def column(self, field: str) -> int:
+        """Номер колонки поля на листе (с 1, для update_cell)"""
+        return self.index(field) + 1
+
+    def values(self, row: Sequence[str]) -> List[str]:
+        """Значения строки в порядке FIELDS; недостающие ячейки - пустые строки"""
+        size = len(row)
+        return [row[i] if i is not None and i < size else "" for i in self.indexes]
+
+    def record(self, row_number: int, row: Sequence[str]) -> BookingRecord:
+        return BookingRecord(row_number, self.values(row))
+
+    def row(self, values: Dict) -> List:
+        """Строка для добавления на лист: значения полей по их колонкам"""
+        cells = [""] * self.width
+        for field, index in zip(FIELDS, self.indexes):
+            if index is not None:
+                cells[index] = values.get(field, "")
+        return cells
+
+
+class BookingTable:
+    __slots__ = ("columns", "size", "by_user")
+
+    def __init__(self, columns: Dict[str, Tuple], size: int):
+        """
+        Весь лист бронирований по колонкам: кортеж значений на поле вместо объекта на строку
+        Записи BookingRecord создаются только для строк, которые действительно нужны.
+        """
+        self.columns = columns
+        self.size = size
+        self.by_user: Optional[Dict[str, List[int]]] = None
+
+    @classmethod
+    def from_values(cls, values: List[List[str]]) -> "BookingTable":
+        """Разбор результата get_all_values(): первая строка - заголовок"""
+        if not values:
+            return cls({field: () for field in FIELDS}, 0)
+        column_map = ColumnMap(values[0])
+        rows = values[1:]
+        # Короткие строки (пустые ячейки в конце) дополняются, чтобы колонки читались без проверок
+        width = column_map.width
+        if any(len(row) < width for row in rows):
+            rows = [row if len(row) >= width else list(row) + [""] * (width - len(row)) for row in rows]
+        empty = ("",) * len(rows)
+        columns = {
+            field: tuple(map(itemgetter(index), rows)) if index is not None else empty
+            for field, index in zip(FIELDS, column_map.indexes)
+        }
+        return cls(columns, len(rows))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def record(self, position: int) -> BookingRecord:
+        """Запись по позиции в таблице (0 - первая строка после заголовка)"""
+        return BookingRecord(position + 2, [self.columns[field][position] for field in FIELDS])
+
+    def records(self) -> List[BookingRecord]:
+        return [self.record(i) for i in range(self.size)]
+
+    def index_users(self) -> Dict[str, List[int]]:
+        """Индекс строк по Telegram ID - для таблицы, по которой будет много выборок"""
+        if self.by_user is None:
+            by_user: Dict[str, List[int]] = {}
+            for i, value in enumerate(self.columns["telegram_id"]):
+                by_user.setdefault(value, []).append(i)
+            self.by_user = by_user
+        return self.by_user
+
+    def user_positions(self, telegram_id) -> List[int]:
+        """Позиции строк пользователя: по индексу, если он построен, иначе проходом по одной колонке"""
+        key = str(telegram_id)
+        if self.by_user is not None:
+            return self.by_user.get(key, [])
+        return [i for i, value in enumerate(self.columns["telegram_id"]) if value == key]
+
+    def user_bookings(self, telegram_id) -> List[BookingRecord]:
+        return [self.record(i) for i in self.user_positions(telegram_id)]
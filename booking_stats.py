@@ -0,0 +1,255 @@
+import importlib.util
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from local_store import connect
+
+logger = logging.getLogger(__name__)
+
+# Счетчики по дню бронирования и мероприятию. Бронирования и оплаты относятся ко дню
+# создания платежа, поэтому конверсия дня - доля оплаченных бронирований этого дня.
+# Вопросы к нейросети не привязаны к мероприятию и считаются в строке с event_name = ''.
+STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stats_daily (
+    day TEXT NOT NULL,
+    event_name TEXT NOT NULL DEFAULT '',
+    bookings INTEGER NOT NULL DEFAULT 0,
+    paid INTEGER NOT NULL DEFAULT 0,
+    revenue INTEGER NOT NULL DEFAULT 0,
+    refunds INTEGER NOT NULL DEFAULT 0,
+    questions INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, event_name)
+);
+"""
+
+COUNTERS = ("bookings", "paid", "revenue", "refunds", "questions")
+
+# Статусы, в которых бронирование считается оплаченным (возврат бывает только после оплаты)
+PAID_STATUSES = {"CONFIRMED", "REFUNDING", "PARTIAL_REFUNDED", "REFUNDED"}
+# Статусы, в которых сумма платежа остается в выручке (сумма частичного возврата неизвестна)
+REVENUE_STATUSES = {"CONFIRMED", "REFUNDING", "PARTIAL_REFUNDED"}
+REFUND_STATUSES = {"PARTIAL_REFUNDED", "REFUNDED"}
+
+STATS_DAYS = 7
+
+# numpy нужен только для быстрого пересчета (requirements-extra.txt, не входит в зависимости бота):
+# без него пересчет идет на чистом Python, импорт откладывается до пересчета
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+
+def contribution(status: Optional[str], amount: Optional[int]) -> Tuple[int, int, int]:
+    """Вклад платежа в статусе status в счетчики (paid, revenue, refunds)"""
+    return (
+        int(status in PAID_STATUSES),
+        (amount or 0) if status in REVENUE_STATUSES else 0,
+        int(status in REFUND_STATUSES),
+    )
+
+
+def status_deltas(old_status: Optional[str], new_status: str, amount: Optional[int]) -> Dict[str, int]:
+    """
+    Изменение счетчиков при переходе платежа между статусами
+    Считается как разность вкладов, поэтому инкрементальные счетчики совпадают с пересчетом.
+    """
+    old = contribution(old_status, amount)
+    new = contribution(new_status, amount)
+    return {name: n - o for name, o, n in zip(("paid", "revenue", "refunds"), old, new) if n != o}
+
+
+def stats_day(created_at: Optional[str]) -> str:
+    """День для счетчиков: дата из ISO-времени создания платежа"""
+    return (created_at or datetime.now().isoformat())[:10]
+
+
+def bump(conn: sqlite3.Connection, day: str, event_name: Optional[str], **deltas: int):
+    """
+    Прибавление к счетчикам дня и мероприятия одним upsert'ом
+    Вызывается в той же транзакции, что и изменение платежа.
+    """
+    deltas = {name: value for name, value in deltas.items() if value}
+    if not deltas:
+        return
+    names = list(deltas)
+    conn.execute(
+        f"INSERT INTO stats_daily (day, event_name, {', '.join(names)}) "
+        f"VALUES (?, ?, {', '.join('?' * len(names))}) "
+        "ON CONFLICT(day, event_name) DO UPDATE SET "
+        + ", ".join(f"{name} = {name} + excluded.{name}" for name in names),
+        (day, event_name or "", *deltas.values())
+    )
+
+
+def aggregate_python(days: List[str], events: List[str], statuses: List[str],
+                     amounts: List[int]) -> Dict[Tuple[str, str], List[int]]:
+    """Пересчет счетчиков по колонкам платежей: словарь {(день, мероприятие): [bookings, paid, revenue, refunds]}"""
+    totals: Dict[Tuple[str, str], List[int]] = {}
+    for day, event_name, status, amount in zip(days, events, statuses, amounts):
+        row = totals.get((day, event_name))
+        if row is None:
+            row = totals[(day, event_name)] = [0, 0, 0, 0]
+        paid, revenue, refunds = contribution(status, amount)
+        row[0] += 1
+        row[1] += paid
+        row[2] += revenue
+        row[3] += refunds
+    return totals
+
+
+def factorize(values: List, size: int):
+    """Коды значений по порядку первого появления: (список значений, массив кодов)"""
+    import numpy as np
+
+    codes = {value: i for i, value in enumerate(dict.fromkeys(values))}
+    return list(codes), np.fromiter(map(codes.__getitem__, values), dtype=np.intp, count=size)
+
+
+def aggregate_numpy(days: List[str], events: List[str], statuses: List[str],
+                    amounts: List[int]) -> Dict[Tuple[str, str], List[int]]:
+    """
+    То же, что aggregate_python, но по колонкам NumPy
+    Строки кодируются словарем (сортировка строк в NumPy медленнее), признаки статусов
+    считаются один раз на статус, группы (день, мероприятие) - по целочисленному ключу,
+    суммы по группам - через bincount.
+    """
+    import numpy as np
+
+    size = len(days)
+    day_values, day = factorize(days, size)
+    event_values, event = factorize(events, size)
+    status_values, status = factorize(statuses, size)
+    amount = np.fromiter(amounts, dtype=np.int64, count=size)
+
+    keys, group = np.unique(day * len(event_values) + event, return_inverse=True)
+    paid = np.array([value in PAID_STATUSES for value in status_values])[status]
+    revenue = np.where(np.array([value in REVENUE_STATUSES for value in status_values])[status], amount, 0)
+    refunds = np.array([value in REFUND_STATUSES for value in status_values])[status]
+
+    length = len(keys)
+    columns = (
+        np.bincount(group, minlength=length),
+        np.bincount(group, weights=paid, minlength=length),
+        np.bincount(group, weights=revenue, minlength=length),
+        np.bincount(group, weights=refunds, minlength=length),
+    )
+    return {
+        (day_values[key // len(event_values)], event_values[key % len(event_values)]):
+            [int(column[i]) for column in columns]
+        for i, key in enumerate(keys.tolist())
+    }
+
+
+class BookingStats:
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Статистика для администраторов: бронирования, выручка, конверсия в оплату и вопросы по дням
+        Счетчики обновляются при каждом бронировании и смене статуса платежа (см. PaymentStore),
+        /stats читает только готовые строки stats_daily, а не таблицу бронирований.
+        """
+        self.conn = connect(db_path)
+        self.lock = threading.Lock()
+        self.conn.executescript(STATS_SCHEMA)
+
+    def record_question(self):
+        """Вопрос пользователя к консультанту"""
+        with self.lock:
+            bump(self.conn, datetime.now().date().isoformat(), "", questions=1)
+
+    def summary(self, days: int = STATS_DAYS) -> Dict:
+        """Счетчики за последние days дней: по дням, по мероприятиям и итог"""
+        since = (datetime.now().date() - timedelta(days=days - 1)).isoformat()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM stats_daily WHERE day >= ? ORDER BY day", (since,)
+            ).fetchall()
+
+        by_day: Dict[str, Dict[str, int]] = {}
+        by_event: Dict[str, Dict[str, int]] = {}
+        total = dict.fromkeys(COUNTERS, 0)
+        for row in rows:
+            targets = [by_day.setdefault(row["day"], dict.fromkeys(COUNTERS, 0)), total]
+            if row["event_name"]:
+                targets.append(by_event.setdefault(row["event_name"], dict.fromkeys(COUNTERS, 0)))
+            for target in targets:
+                for name in COUNTERS:
+                    target[name] += row[name]
+        return {"since": since, "days": by_day, "events": by_event, "total": total}
+
+    def render(self, days: int = STATS_DAYS) -> str:
+        """Текст ответа на /stats"""
+        summary = self.summary(days)
+        total = summary["total"]
+        lines = [
+            f"📊 Статистика за {days} дн. (с {summary['since']})\n",
+            f"Бронирований: {total['bookings']}, оплачено: {total['paid']} ({conversion(total)})",
+            f"Выручка: {total['revenue']} ₽, возвратов: {total['refunds']}",
+            f"Вопросов консультанту: {total['questions']}",
+        ]
+        if summary["days"]:
+            lines.append("\n📅 По дням:")
+            for day, counters in sorted(summary["days"].items(), reverse=True):
+                lines.append(
+                    f"{day}: {counters['bookings']} брон., {counters['paid']} опл. ({conversion(counters)}), "
+                    f"{counters['revenue']} ₽, {counters['questions']} вопр."
+                )
+        if summary["events"]:
+            lines.append("\n🎯 По мероприятиям:")
+            for event_name, counters in sorted(summary["events"].items(), key=lambda item: -item[1]["revenue"]):
+                lines.append(
+                    f"{event_name}: {counters['bookings']} брон., {counters['paid']} опл. "
+                    f"({conversion(counters)}), {counters['revenue']} ₽"
+                )
+        return "\n".join(lines)
+
+    def rebuild(self, use_numpy: bool = True) -> int:
+        """
+        Полный пересчет счетчиков бронирований и оплат по таблице payments
+        Нужен после ручной правки базы или расхождения счетчиков. Вопросы берутся
+        только из счетчиков, поэтому сохраняются как есть. Возвращает число платежей.
+        """
+        started = time.perf_counter()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Кортежи вместо sqlite3.Row: строк много, а нужны только колонки
+                cursor = self.conn.cursor()
+                cursor.row_factory = None
+                rows = cursor.execute(
+                    "SELECT substr(created_at, 1, 10), COALESCE(event_name, ''), status, COALESCE(amount, 0) "
+                    "FROM payments"
+                ).fetchall()
+                columns = [list(column) for column in zip(*rows)] if rows else [[], [], [], []]
+                aggregate = aggregate_numpy if use_numpy and NUMPY_AVAILABLE and rows else aggregate_python
+                totals = aggregate(*columns)
+
+                self.conn.execute(
+                    "UPDATE stats_daily SET bookings = 0, paid = 0, revenue = 0, refunds = 0"
+                )
+                self.conn.executemany(
+                    "INSERT INTO stats_daily (day, event_name, bookings, paid, revenue, refunds) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(day, event_name) DO UPDATE SET "
+                    "bookings = excluded.bookings, paid = excluded.paid, "
+                    "revenue = excluded.revenue, refunds = excluded.refunds",
+                    [(day, event_name, *counters) for (day, event_name), counters in totals.items()]
+                )
+                self.conn.execute("DELETE FROM stats_daily WHERE bookings = 0 AND questions = 0")
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+        logger.info(
+            "📊 Статистика пересчитана (%s): %d платежей за %.2f с",
+            aggregate.__name__, len(rows), time.perf_counter() - started
+        )
+        return len(rows)
+
+
+def conversion(counters: Dict[str, int]) -> str:
+    """Доля оплаченных бронирований"""
+    if not counters["bookings"]:
+        return "—"
+    return f"{counters['paid'] * 100 / counters['bookings']:.0f}%"
@@ -0,0 +1,244 @@
+import logging
+import threading
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from booking_records import FIELDS, PAID_STATUS, BookingRecord
+from local_store import connect, ensure_columns
+
+logger = logging.getLogger(__name__)
+
+# Локальная копия листа "Бронирования": пишется вместе с таблицей (см. GoogleSheetsClient),
+# чтобы выгрузки и поиск по старым бронированиям не читали лист целиком
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    booked_on TEXT,
+    {", ".join(f"{field} {'INTEGER' if field in ('telegram_id', 'price') else 'TEXT'}" for field in FIELDS)}
+);
+CREATE INDEX IF NOT EXISTS idx_bookings_booked_on ON bookings(booked_on);
+CREATE INDEX IF NOT EXISTS idx_bookings_user ON bookings(telegram_id, event_name);
+"""
+
+# Колонки, добавленные после первой версии схемы
+EXTRA_COLUMNS = {
+    # Лист архива, куда перенесено бронирование (NULL - бронирование на основном листе)
+    "sheet": "TEXT",
+}
+
+INSERT = (
+    f"INSERT INTO bookings (booked_on, {', '.join(FIELDS)}) "
+    f"VALUES ({', '.join('?' * (len(FIELDS) + 1))})"
+)
+
+# Сколько строк читать из базы за раз при выгрузке
+CHUNK_SIZE = 5000
+
+
+def booked_on(booked_at: str) -> Optional[str]:
+    """ISO-дата из "Дата бронирования" ("31.05.2025 14:30"); нераспознанная дата - None"""
+    text = str(booked_at).strip()
+    if len(text) >= 10 and text[2] == "." and text[5] == "." and text[:2].isdigit():
+        return f"{text[6:10]}-{text[3:5]}-{text[:2]}"
+    return None
+
+
+class BookingFilter:
+    __slots__ = ("event", "date_from", "date_to", "status")
+
+    def __init__(self, event: str = None, date_from: date = None, date_to: date = None, status: str = None):
+        """
+        Отбор бронирований для выгрузки
+        event: часть названия мероприятия (без учета регистра)
+        date_from, date_to: дата бронирования, обе границы включительно
+        status: значение "Статус оплаты" целиком
+        """
+        self.event = event
+        self.date_from = date_from
+        self.date_to = date_to
+        self.status = status
+
+    def where(self) -> Tuple[str, List]:
+        """Условие WHERE и его параметры"""
+        conditions, params = [], []
+        if self.event:
+            conditions.append("instr(casefold(event_name), ?) > 0")
+            params.append(self.event.casefold())
+        if self.date_from:
+            conditions.append("booked_on >= ?")
+            params.append(self.date_from.isoformat())
+        if self.date_to:
+            conditions.append("booked_on <= ?")
+            params.append(self.date_to.isoformat())
+        if self.status:
+            conditions.append("payment_status = ?")
+            params.append(self.status)
+        return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+    def describe(self) -> str:
+        parts = []
+        if self.event:
+            parts.append(f"мероприятие «{self.event}»")
+        if self.date_from or self.date_to:
+            parts.append(f"даты {self.date_from or '…'} – {self.date_to or '…'}")
+        if self.status:
+            parts.append(f"статус «{self.status}»")
+        return ", ".join(parts) or "все бронирования"
+
+
+class BookingStore:
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Локальная копия бронирований в SQLite
+        Лист остается основным местом работы сотрудников; копия нужна для выгрузок
+        и выборок, которые по таблице пришлось бы делать чтением всего листа.
+        """
+        self.conn = connect(db_path)
+        self.lock = threading.Lock()
+        self.conn.executescript(SCHEMA)
+        ensure_columns(self.conn, "bookings", EXTRA_COLUMNS)
+        # LIKE в SQLite не различает регистр только для латиницы, а мероприятия названы по-русски
+        self.conn.create_function("casefold", 1, lambda value: value.casefold() if value else "",
+                                  deterministic=True)
+
+    def add(self, values: Dict) -> int:
+        """Новое бронирование (значения по полям FIELDS, как для ColumnMap.row)"""
+        row = [values.get(field, "") for field in FIELDS]
+        with self.lock:
+            cursor = self.conn.execute(INSERT, [booked_on(row[0])] + row)
+        return cursor.lastrowid
+
+    def set_status(self, telegram_id: int, event_name: str, status: str) -> bool:
+        """Статус оплаты - той же строке, что и на листе: первой неоплаченной брони пользователя"""
+        return self.set_statuses([(telegram_id, event_name, status)]) > 0
+
+    def set_statuses(self, updates: Sequence[Tuple[int, str, str]]) -> int:
+        """updates: список (telegram_id, мероприятие, новый статус)"""
+        with self.lock:
+            cursor = self.conn.executemany(
+                "UPDATE bookings SET payment_status = ? WHERE id = ("
+                "SELECT id FROM bookings WHERE telegram_id = ? AND event_name = ? "
+                "AND payment_status != ? AND sheet IS NULL ORDER BY id LIMIT 1)",
+                [(status, int(telegram_id), event_name, PAID_STATUS) for telegram_id, event_name, status in updates]
+            )
+        return cursor.rowcount
+
+    def replace_all(self, records: Iterable[BookingRecord]) -> int:
+        """
+        Полная замена копии основного листа его содержимым (первое заполнение или после ручных правок)
+        Записи вставляются порциями в одной транзакции; архивные бронирования не затрагиваются.
+        Возвращает количество записей.
+        """
+        count = 0
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("DELETE FROM bookings WHERE sheet IS NULL")
+                chunk = []
+                for record in records:
+                    row = record.to_row()
+                    chunk.append([booked_on(row[0])] + row)
+                    if len(chunk) >= CHUNK_SIZE:
+                        self.conn.executemany(INSERT, chunk)
+                        count += len(chunk)
+                        chunk = []
+                self.conn.executemany(INSERT, chunk)
+                count += len(chunk)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        logger.info("📥 Локальная копия бронирований обновлена: %d строк", count)
+        return count
+
+    def mark_archived(self, records: Sequence[BookingRecord], sheet: str) -> int:
+        """
+        Отметка бронирований, перенесенных на лист архива sheet
+        Запись копии находится по пользователю, мероприятию и дате бронирования;
+        если копия неполная и записи нет, она добавляется сразу архивной.
+        """
+        inserted = 0
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for record in records:
+                    cursor = self.conn.execute(
+                        "UPDATE bookings SET sheet = ? WHERE id = ("
+                        "SELECT id FROM bookings WHERE telegram_id = ? AND event_name = ? AND booked_at = ? "
+                        "AND sheet IS NULL ORDER BY id LIMIT 1)",
+                        (sheet, record.telegram_id, record.event_name, record.booked_at)
+                    )
+                    if cursor.rowcount == 0:
+                        row = record.to_row()
+                        self.conn.execute(
+                            f"INSERT INTO bookings (sheet, booked_on, {', '.join(FIELDS)}) "
+                            f"VALUES ({', '.join('?' * (len(FIELDS) + 2))})",
+                            [sheet, booked_on(row[0])] + row
+                        )
+                        inserted += 1
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return inserted
+
+    def archived_ids(self, telegram_id: int) -> List[int]:
+        """Архивные бронирования пользователя (id записей копии, новые первыми)"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id FROM bookings WHERE telegram_id = ? AND sheet IS NOT NULL ORDER BY id DESC",
+                (int(telegram_id),)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_records(self, ids: Sequence[int]) -> List[BookingRecord]:
+        """Бронирования по id записей копии, в порядке ids"""
+        if not ids:
+            return []
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, {', '.join(FIELDS)} FROM bookings WHERE id IN ({', '.join('?' * len(ids))})",
+                list(ids)
+            ).fetchall()
+        by_id = {row[0]: BookingRecord(0, [value if value is not None else "" for value in tuple(row)[1:]])
+                 for row in rows}
+        return [by_id[booking_id] for booking_id in ids if booking_id in by_id]
+
+    def archive_summary(self) -> List[Tuple]:
+        """Сводка архива: (лист, мероприятие, бронирований, оплачено, выручка по оплаченным)"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT sheet, event_name, COUNT(*), SUM(payment_status = ?), "
+                "SUM(CASE WHEN payment_status = ? THEN price ELSE 0 END) "
+                "FROM bookings WHERE sheet IS NOT NULL GROUP BY sheet, event_name ORDER BY sheet DESC, event_name",
+                (PAID_STATUS, PAID_STATUS)
+            ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def count(self, filters: BookingFilter = None) -> int:
+        where, params = (filters or BookingFilter()).where()
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM bookings{where}", params).fetchone()[0]
+
+    def iter_chunks(self, filters: BookingFilter = None, chunk_size: int = CHUNK_SIZE) -> Iterator[List[Tuple]]:
+        """
+        Бронирования порциями по chunk_size строк: кортежи значений в порядке FIELDS
+        В памяти одновременно только одна порция, сколько бы строк ни было в выборке.
+        Порции читаются по возрастанию id с продолжением от последнего, поэтому
+        между порциями соединение свободно для записи новых бронирований.
+        """
+        where, params = (filters or BookingFilter()).where()
+        condition = f"{where} AND id > ?" if where else " WHERE id > ?"
+        query = f"SELECT id, {', '.join(FIELDS)} FROM bookings{condition} ORDER BY id LIMIT ?"
+        last_id = 0
+        while True:
+            with self.lock:
+                cursor = self.conn.cursor()
+                cursor.row_factory = None
+                rows = cursor.execute(query, params + [last_id, chunk_size]).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [row[1:] for row in rows]
+            if len(rows) < chunk_size:
+                return
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.types import Message, TelegramObject
+
+from local_store import connect
+from send_queue import PRIORITY_BROADCAST, send_priority
+from tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    chat_id INTEGER PRIMARY KEY,
+    first_seen TEXT NOT NULL,
+    blocked INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class ChatRegistry:
+    def __init__(self, db_path: Optional[str] = None):
+        """Список чатов, писавших боту (получатели рассылок)"""
+        self.conn = connect(db_path)
+        self.lock = threading.Lock()
+        self.conn.executescript(SCHEMA)
+        self.known = set()
+
+    def remember(self, chat_id: int):
+        """Регистрация чата; в базу пишем только впервые увиденные за время работы"""
+        if chat_id in self.known:
+            return
+        self.known.add(chat_id)
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO chats (chat_id, first_seen) VALUES (?, ?) "
+                "ON CONFLICT(chat_id) DO UPDATE SET blocked = 0",
+                (chat_id, datetime.now().isoformat())
+            )
+
+    def mark_blocked(self, chat_id: int):
+        """Пользователь заблокировал бота - исключаем из рассылок"""
+        self.known.discard(chat_id)
+        with self.lock:
+            self.conn.execute("UPDATE chats SET blocked = 1 WHERE chat_id = ?", (chat_id,))
+
+    def count(self) -> int:
+        """Количество активных получателей"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM chats WHERE blocked = 0").fetchone()[0]
+
+    def iter_chats(self, chunk_size: int = 1000) -> Iterator[List[int]]:
+        """Постраничный обход получателей без загрузки всего списка в память"""
+        last_id = None
+        while True:
+            with self.lock:
+                if last_id is None:
+                    rows = self.conn.execute(
+                        "SELECT chat_id FROM chats WHERE blocked = 0 ORDER BY chat_id LIMIT ?",
+                        (chunk_size,)
+                    ).fetchall()
+                else:
+                    rows = self.conn.execute(
+                        "SELECT chat_id FROM chats WHERE blocked = 0 AND chat_id > ? ORDER BY chat_id LIMIT ?",
+                        (last_id, chunk_size)
+                    ).fetchall()
+            if not rows:
+                return
+            chat_ids = [row["chat_id"] for row in rows]
+            last_id = chat_ids[-1]
+            yield chat_ids
+
+
+class ChatRegistryMiddleware(BaseMiddleware):
+    def __init__(self, registry: ChatRegistry):
+        """Middleware диспетчера: запоминает чаты входящих сообщений"""
+        self.registry = registry
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        if isinstance(event, Message) and event.chat.type == "private":
+            self.registry.remember(event.chat.id)
+        return await handler(event, data)
+
+
+async def broadcast(bot: Bot, registry: ChatRegistry, text: str,
+                    progress: Callable[[int, int, int], Awaitable[None]] = None,
+                    max_in_flight: int = 100) -> Dict[str, int]:
+    """
+    Рассылка сообщения всем получателям с максимальной разрешенной скоростью
+    Темп задает лимитер сессии бота; здесь ограничивается только число сообщений в полете.
+    progress: корутина (отправлено, ошибок, всего), вызывается раз в несколько секунд
+    """
+    # Отправки рассылки - отдельные трассы, а не одна огромная трасса команды /broadcast
+    current_span.set(None)
+
+    total = registry.count()
+    stats = {"sent": 0, "failed": 0, "blocked": 0, "total": total}
+    semaphore = asyncio.Semaphore(max_in_flight)
+    tasks = set()
+    last_report = time.monotonic()
+
+    async def send_one(chat_id: int):
+        try:
+            with send_priority(PRIORITY_BROADCAST):
+                await bot.send_message(chat_id=chat_id, text=text)
+            stats["sent"] += 1
+        except TelegramForbiddenError:
+            registry.mark_blocked(chat_id)
+            stats["blocked"] += 1
+        except Exception as e:
+            logger.warning("Рассылка: не удалось отправить в чат %s: %s", chat_id, e)
+            stats["failed"] += 1
+        finally:
+            semaphore.release()
+
+    for chunk in registry.iter_chats():
+        for chat_id in chunk:
+            await semaphore.acquire()
+            task = asyncio.create_task(send_one(chat_id))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+            if progress and time.monotonic() - last_report > 5:
+                last_report = time.monotonic()
+                await progress(stats["sent"], stats["failed"] + stats["blocked"], total)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+
+    logger.info("Рассылка завершена: %s", stats)
+    return stats
@@ -0,0 +1,118 @@
+import os
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List
+
+from token_budget import estimate_tokens
+
+
+# Реплики длиннее порога хранятся сжатыми (первый байт - признак сжатия)
+COMPRESS_THRESHOLD = 256
+
+
+def pack(text: str) -> bytes:
+    """Компактное представление реплики"""
+    raw = text.encode("utf-8")
+    if len(raw) > COMPRESS_THRESHOLD:
+        return b"z" + zlib.compress(raw, 1)
+    return b"t" + raw
+
+
+def unpack(data: bytes) -> str:
+    """Восстановление текста реплики"""
+    if data[:1] == b"z":
+        return zlib.decompress(data[1:]).decode("utf-8")
+    return data[1:].decode("utf-8")
+
+
+class History:
+    __slots__ = ("last_seen", "size", "tokens", "turns")
+
+    def __init__(self):
+        """История диалога одного пользователя: кортеж упакованных реплик, их размер и оценки токенов"""
+        self.last_seen = 0.0
+        self.size = 0
+        self.tokens = ()
+        self.turns = ()
+
+
+class ConversationMemory:
+    def __init__(self, max_turns: int = None, token_budget: int = None,
+                 idle_ttl: int = None, memory_cap: int = None):
+        """
+        Короткая память диалога для уточняющих вопросов
+        max_turns: сколько последних пар вопрос-ответ хранить на пользователя
+        token_budget: максимальная оценка токенов истории, передаваемой в модель
+        idle_ttl: через сколько секунд без сообщений история забывается
+        memory_cap: общий лимит байт текста по всем пользователям (вытесняются давно молчащие)
+        """
+        self.max_turns = max_turns or int(os.getenv("CHAT_MEMORY_TURNS", 3))
+        self.token_budget = token_budget or int(os.getenv("CHAT_MEMORY_TOKENS", 600))
+        self.idle_ttl = idle_ttl or int(os.getenv("CHAT_MEMORY_TTL", 1800))
+        self.memory_cap = memory_cap or int(os.getenv("CHAT_MEMORY_CAP_MB", 64)) * 1024 * 1024
+
+        # Порядок словаря - порядок последней активности (LRU)
+        self.histories: "OrderedDict[int, History]" = OrderedDict()
+        self.total_size = 0
+
+    def get(self, user_id: int) -> List[Dict[str, str]]:
+        """История пользователя в формате messages YandexGPT (от старых к новым)"""
+        history = self.histories.get(user_id)
+        if not history:
+            return []
+
+        if time.monotonic() - history.last_seen > self.idle_ttl:
+            self.drop(user_id)
+            return []
+
+        messages = []
+        for i, turn in enumerate(history.turns):
+            messages.append({"role": "user" if i % 2 == 0 else "assistant", "text": unpack(turn)})
+        return messages
+
+    def tokens(self, user_id: int) -> int:
+        """Оценка токенов истории пользователя (0, если истории нет)"""
+        history = self.histories.get(user_id)
+        return sum(history.tokens) if history else 0
+
+    def add(self, user_id: int, question: str, answer: str):
+        """Добавление пары вопрос-ответ с обрезкой по количеству реплик и бюджету токенов"""
+        history = self.histories.get(user_id)
+        if history is None:
+            history = self.histories[user_id] = History()
+        else:
+            self.histories.move_to_end(user_id)
+
+        turns = (history.turns + (pack(question), pack(answer)))[-self.max_turns * 2:]
+        tokens = (history.tokens + (estimate_tokens(question), estimate_tokens(answer)))[-self.max_turns * 2:]
+
+        # Убираем старые пары, пока история не влезет в бюджет токенов
+        while len(turns) > 2 and sum(tokens) > self.token_budget:
+            turns = turns[2:]
+            tokens = tokens[2:]
+
+        size = sum(len(turn) for turn in turns)
+        self.total_size += size - history.size
+        history.size = size
+        history.tokens = tokens
+        history.turns = turns
+        history.last_seen = time.monotonic()
+
+        self.evict()
+
+    def drop(self, user_id: int):
+        """Удаление истории пользователя"""
+        history = self.histories.pop(user_id, None)
+        if history:
+            self.total_size -= history.size
+
+    def evict(self):
+        """Удаление устаревших историй и вытеснение самых старых при превышении лимита памяти"""
+        now = time.monotonic()
+        while self.histories:
+            user_id, history = next(iter(self.histories.items()))
+            if now - history.last_seen <= self.idle_ttl and self.total_size <= self.memory_cap:
+                break
+            self.drop(user_id)
+
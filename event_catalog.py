@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from bisect import bisect_right
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sheets_quota import PRIORITY_BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+# Мероприятия по умолчанию, если файл и лист "Мероприятия" недоступны
+DEFAULT_EVENTS = {
+    "yuryuzan_june": {
+        "name": "Сплав по реке Юрюзань",
+        "dates": "11-15 июня",
+        "start_date": "2024-06-11",
+        "location": "Урал",
+        "capacity": 20,
+        "price": 19500,
+        "price_tiers": [
+            {"until": "2024-06-02", "price": 18500, "label": "2 июня"}
+        ],
+        "description": "Включено: трансфер, питание, прокат группового снаряжения, походная баня, инструктор"
+    }
+}
+
+DETAILS_TEMPLATE = """
+🏕️ **{name}**
+📅 {dates} • 📍 {location}
+
+💰 **Стоимость:** {price:,} ₽
+{early_line}
+
+📋 **Включено:**
+{description}
+
+📝 **С собой взять:**
+• Личное снаряжение
+• Спальник и коврик
+• Личные вещи
+
+---
+**Для бронирования мне потребуются ваши данные:**
+• ФИО
+• Телефон
+• Паспортные данные
+• Дата рождения
+
+Продолжаем? 👇
+"""
+
+
+class CompiledEvent:
+    __slots__ = ("event_id", "data", "deadlines", "prices", "details", "button_text")
+
+    def __init__(self, event_id: str, data: Dict):
+        """
+        Мероприятие с заранее подготовленными ценами и текстами
+        Ценовые периоды сортируются по дедлайну: цена на момент времени - бинарный поиск.
+        """
+        self.event_id = event_id
+        self.data = data
+
+        tiers = sorted(data.get("price_tiers", []), key=lambda tier: tier["until"])
+        self.deadlines = [datetime.strptime(tier["until"], "%Y-%m-%d").timestamp() for tier in tiers]
+        self.prices = [int(tier["price"]) for tier in tiers] + [int(data["price"])]
+
+        # Текст описания для каждого ценового периода
+        self.details = []
+        for i, price in enumerate(self.prices):
+            early_line = ""
+            if i < len(tiers):
+                label = tiers[i].get("label") or datetime.strptime(tiers[i]["until"], "%Y-%m-%d").strftime("%d.%m")
+                early_line = f"⏰ До {label} — {price:,} ₽"
+            self.details.append(DETAILS_TEMPLATE.format(
+                name=data["name"], dates=data["dates"], location=data["location"],
+                price=price, early_line=early_line, description=data.get("description", "")
+            ))
+
+        self.button_text = f"🏕️ {data['name']} ({data['dates']})"
+
+    def tier(self, now: float = None) -> int:
+        """Номер действующего ценового периода"""
+        return bisect_right(self.deadlines, time.time() if now is None else now)
+
+    def price_at(self, now: float = None) -> int:
+        """Цена на момент времени"""
+        return self.prices[self.tier(now)]
+
+    def details_at(self, now: float = None) -> str:
+        """Описание мероприятия с ценой на момент времени"""
+        return self.details[self.tier(now)]
+
+
+class CatalogSnapshot:
+    __slots__ = ("version", "events", "compiled")
+
+    def __init__(self, events: Dict[str, Dict]):
+        """Неизменяемая версия каталога; обработчики работают с одной версией целиком"""
+        self.events = events
+        self.compiled = {event_id: CompiledEvent(event_id, data) for event_id, data in events.items()}
+        raw = json.dumps(events, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        self.version = hashlib.sha256(raw).hexdigest()[:12]
+
+
+def parse_price_tiers(value: str) -> List[Dict]:
+    """
+    Разбор колонки "Цены" листа: "18500 до 2024-06-02; 19500"
+    Последнее значение без даты - базовая цена, оно в ценовые периоды не попадает
+    """
+    tiers = []
+    for part in str(value).split(";"):
+        price, _, until = part.strip().partition(" до ")
+        if until:
+            tiers.append({"until": until.strip(), "price": int(price)})
+    return tiers
+
+
+class EventCatalog:
+    def __init__(self, sheets_client=None, events_file: str = None):
+        """
+        Каталог мероприятий с фоновой перезагрузкой
+        sheets_client: клиент Google Sheets для чтения листа "Мероприятия"
+        events_file: путь к JSON-файлу с мероприятиями (EVENTS_FILE)
+        """
+        self.sheets_client = sheets_client
+        self.events_file = events_file or os.getenv("EVENTS_FILE", "events.json")
+        self.source = os.getenv("EVENTS_SOURCE", "file")  # file или sheet
+        self.reload_interval = int(os.getenv("EVENTS_RELOAD_INTERVAL", 60))
+
+        self.file_mtime = None
+        self.listeners: List[Callable[[CatalogSnapshot], None]] = []
+        self.task = None
+
+        self.snapshot = CatalogSnapshot(self.load_file() or DEFAULT_EVENTS)
+
+    def on_reload(self, listener: Callable[[CatalogSnapshot], None]):
+        """Подписка на смену версии каталога"""
+        self.listeners.append(listener)
+        listener(self.snapshot)
+
+    def load_file(self) -> Optional[Dict[str, Dict]]:
+        """Чтение мероприятий из JSON-файла (None, если файл не изменился или отсутствует)"""
+        try:
+            mtime = os.stat(self.events_file).st_mtime
+        except OSError:
+            return None
+
+        if mtime == self.file_mtime:
+            return None
+
+        with open(self.events_file, encoding="utf-8") as f:
+            events = json.load(f)
+        self.file_mtime = mtime
+        return events
+
+    def load_sheet(self) -> Optional[Dict[str, Dict]]:
+        """Чтение мероприятий с листа "Мероприятия" Google Таблицы"""
+        if not self.sheets_client or not self.sheets_client.spreadsheet:
+            return None
+
+        worksheet = self.sheets_client.worksheet("Мероприятия")
+        events = {}
+        for record in self.sheets_client.quota.read("get_all_records", worksheet.get_all_records):
+            event_id = str(record.get("ID", "")).strip()
+            if not event_id:
+                continue
+
+            prices = str(record.get("Цены", ""))
+            events[event_id] = {
+                "name": record.get("Название", ""),
+                "dates": record.get("Даты", ""),
+                "start_date": record.get("Дата начала", ""),
+                "location": record.get("Место", ""),
+                "capacity": int(record["Мест"]) if record.get("Мест") else None,
+                "price": int(prices.split(";")[-1].strip()),
+                "price_tiers": parse_price_tiers(prices),
+                "description": record.get("Описание", "")
+            }
+            if events[event_id]["capacity"] is None:
+                del events[event_id]["capacity"]
+        return events
+
+    def swap(self, events: Dict[str, Dict]) -> bool:
+        """Компиляция новой версии и атомарная замена текущей"""
+        snapshot = CatalogSnapshot(events)
+        if snapshot.version == self.snapshot.version:
+            return False
+
+        self.snapshot = snapshot
+        logger.info("📅 Каталог мероприятий обновлен: версия %s, мероприятий %d", snapshot.version, len(events))
+        for listener in self.listeners:
+            listener(snapshot)
+        return True
+
+    async def reload(self) -> bool:
+        """Перезагрузка каталога из источника без блокировки обработчиков"""
+        if self.source == "sheet" and self.sheets_client:
+            events = await self.sheets_client.run(self.load_sheet, priority=PRIORITY_BACKGROUND)
+        else:
+            events = await asyncio.to_thread(self.load_file)
+        if not events:
+            return False
+        return self.swap(events)
+
+    async def run(self):
+        """Периодическая проверка источника на изменения"""
+        while True:
+            try:
+                await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка загрузки каталога мероприятий: %s", e)
+
+            await asyncio.sleep(self.reload_interval)
+
+    def start(self):
+        """Запуск фоновой перезагрузки"""
+        if not self.task:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Остановка фоновой перезагрузки"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
@@ -1,24 +1,65 @@
-import gspread
-from google.oauth2.service_account import Credentials
 import logging
+import os
+import threading
+import time
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+
+from booking_records import FIELDS, HEADERS, PAID_STATUS, BookingRecord, BookingTable, ColumnMap
+from sheets_quota import PRIORITY_READ, SheetsScheduler
+
+# Сколько секунд индекс строк по Telegram ID считается свежим (правки таблицы вручную)
+USER_INDEX_TTL = float(os.getenv("SHEETS_USER_INDEX_TTL", 60))
 
 
 class GoogleSheetsClient:
-    def __init__(self, credentials_file: str, spreadsheet_id: str):
+    def __init__(self, credentials_file: str, spreadsheet_id: str, booking_store=None):
         """
         Инициализация клиента Google Sheets
         credentials_file: путь к JSON файлу с учетными данными сервисного аккаунта
         spreadsheet_id: ID Google Таблицы (из URL)
+        booking_store: локальная копия бронирований (BookingStore), пишется вместе с листом
         """
         self.credentials_file = credentials_file
         self.spreadsheet_id = spreadsheet_id
+        self.booking_store = booking_store
         self.client = None
+        self.spreadsheet = None
         self.sheet = None
+        # Все запросы к Sheets API идут через одну очередь с учетом минутных квот
+        self.quota = SheetsScheduler()
+        # Колонки листа по заголовку; обновляется при каждом чтении всего листа
+        self.column_map = ColumnMap()
+        # Индекс Telegram ID -> номера строк листа (строится по одной колонке)
+        self.user_index: Optional[Dict[str, List[int]]] = None
+        self.user_index_at = 0.0
+        self.user_index_lock = threading.Lock()
+        # Правки по номерам строк (статусы оплаты) и перенос строк в архив не должны пересекаться:
+        # архив удаляет строки, и номера, найденные до него, указывали бы на чужие бронирования
+        self.rows_lock = threading.Lock()
+        # Меняется при каждом удалении строк листа; номера строк, сохраненные раньше, устарели
+        self.layout_version = 0
 
     async def initialize(self):
-        """Инициализация подключения к Google Sheets"""
+        """Инициализация подключения к Google Sheets (блокирующие вызовы gspread - в отдельном потоке)"""
+        await self.run(self.connect)
+
+    async def run(self, func, *args, priority: int = PRIORITY_READ):
+        """
+        Вызов блокирующего метода клиента из асинхронного кода (в потоках очереди запросов)
+        priority: PRIORITY_WRITE для записи бронирований и статусов, PRIORITY_BACKGROUND для фоновых перезагрузок
+        """
+        return await self.quota.run(func, *args, priority=priority)
+
+    def connect(self):
+        """
+        Подключение к таблице
+        gspread и google-auth импортируются здесь: они нужны только боту и только после старта,
+        а их импорт заметно удлиняет холодный запуск.
+        """
+        import gspread
+        from google.oauth2.service_account import Credentials
+
         try:
             # Области доступа
             scope = [
@@ -36,30 +77,28 @@ class GoogleSheetsClient:
             self.client = gspread.authorize(credentials)
 
             # Открываем таблицу
-            spreadsheet = self.client.open_by_key(self.spreadsheet_id)
+            self.spreadsheet = self.quota.read("open_by_key", self.client.open_by_key, self.spreadsheet_id)
 
             # Получаем или создаем лист "Бронирования"
             try:
-                self.sheet = spreadsheet.worksheet("Бронирования")
+                self.sheet = self.worksheet("Бронирования")
             except gspread.WorksheetNotFound:
                 # Создаем новый лист если не существует
-                self.sheet = spreadsheet.add_worksheet(
-                    title="Бронирования",
-                    rows="1000",
-                    cols="20"
+                # Сетка листа растет сама при добавлении строк, а архив (sheet_archive) ее сокращает
+                self.sheet = self.quota.write(
+                    "add_worksheet", lambda: self.spreadsheet.add_worksheet(
+                        title="Бронирования",
+                        rows=1,
+                        cols=len(HEADERS)
+                    )
                 )
                 # Добавляем заголовки
-                headers = [
-                    "Дата бронирования", "Telegram ID", "Username", "ФИО",
-                    "Телефон", "Серия паспорта", "Номер паспорта", "Дата рождения",
-                    "Мероприятие", "Стоимость", "Статус оплаты", "Примечания"
-                ]
-                self.sheet.append_row(headers)
+                self.quota.write("append_row", self.sheet.append_row, HEADERS)
 
             logging.info("✅ Google Sheets подключены")
 
         except Exception as e:
-            logging.error(f"❌ Ошибка подключения к Google Sheets: {e}")
+            logging.error("❌ Ошибка подключения к Google Sheets: %s", e)
             raise
 
     def add_booking(self, booking_data: Dict) -> bool:
@@ -70,58 +109,172 @@ class GoogleSheetsClient:
         try:
             now = datetime.now().strftime("%d.%m.%Y %H:%M")
 
-            row_data = [
-                now,  # Дата бронирования
-                str(booking_data.get('telegram_id', '')),
-                booking_data.get('username', ''),
-                booking_data.get('full_name', ''),
-                booking_data.get('phone', ''),
-                booking_data.get('passport_series', ''),
-                booking_data.get('passport_number', ''),
-                booking_data.get('birth_date', ''),
-                booking_data.get('event_name', ''),
-                booking_data.get('price', ''),
-                booking_data.get('payment_status', 'Не оплачено'),
-                booking_data.get('notes', '')
-            ]
+            values = {
+                "booked_at": now,
+                "telegram_id": str(booking_data.get('telegram_id', '')),
+                "username": booking_data.get('username', ''),
+                "full_name": booking_data.get('full_name', ''),
+                "phone": booking_data.get('phone', ''),
+                "passport_series": booking_data.get('passport_series', ''),
+                "passport_number": booking_data.get('passport_number', ''),
+                "birth_date": booking_data.get('birth_date', ''),
+                "event_name": booking_data.get('event_name', ''),
+                "price": booking_data.get('price', ''),
+                "payment_status": booking_data.get('payment_status', 'Не оплачено'),
+                "notes": booking_data.get('notes', ''),
+            }
 
-            self.sheet.append_row(row_data)
-            logging.info(f"✅ Бронирование добавлено для {booking_data.get('full_name')}")
+            self.quota.write("append_row", self.sheet.append_row, self.column_map.row(values))
+            self.user_index = None
+            self.mirror("add", values)
+            logging.info("✅ Бронирование добавлено для %s", booking_data.get('full_name'))
             return True
 
         except Exception as e:
-            logging.error(f"❌ Ошибка добавления бронирования: {e}")
+            logging.error("❌ Ошибка добавления бронирования: %s", e)
             return False
 
-    def get_user_bookings(self, telegram_id: int) -> List[Dict]:
+    def mirror(self, method: str, *args):
+        """
+        Повторение изменения листа в локальной копии
+        Лист - основной источник: ошибка копии не отменяет запись в таблицу, копию
+        можно пересобрать из листа (booking_export --sync-sheet, /export sync).
+        """
+        if self.booking_store is None:
+            return
+        try:
+            getattr(self.booking_store, method)(*args)
+        except Exception as e:
+            logging.warning("⚠️ Локальная копия бронирований не обновлена: %s", e)
+
+    def worksheet(self, title: str, priority: int = None):
+        """
+        Лист таблицы по названию (gspread.WorksheetNotFound, если его нет)
+        Каждый вызов - запрос метаданных таблицы, поэтому он тоже идет через очередь квот;
+        одновременные запросы одного листа объединяются.
+        """
+        return self.quota.read("worksheet", self.spreadsheet.worksheet, title,
+                               key=("worksheet", title), priority=priority)
+
+    def load_table(self) -> BookingTable:
+        """Весь лист бронирований одним запросом, по колонкам"""
+        values = self.quota.read("get_all_values", self.sheet.get_all_values, key="get_all_values")
+        if values:
+            self.column_map = ColumnMap(values[0])
+        return BookingTable.from_values(values)
+
+    def get_user_bookings(self, telegram_id: int) -> List[BookingRecord]:
         """Получение всех бронирований пользователя"""
         try:
-            all_records = self.sheet.get_all_records()
-            user_bookings = [
-                record for record in all_records
-                if str(record.get('Telegram ID')) == str(telegram_id)
-            ]
-            return user_bookings
+            return self.load_table().user_bookings(telegram_id)
 
         except Exception as e:
-            logging.error(f"❌ Ошибка получения бронирований: {e}")
+            logging.error("❌ Ошибка получения бронирований: %s", e)
+            return []
+
+    def user_rows(self, telegram_id: int) -> List[int]:
+        """
+        Номера строк листа с бронированиями пользователя
+        Индекс строится по одной колонке Telegram ID и переиспользуется USER_INDEX_TTL секунд;
+        добавление бронирования ботом сбрасывает его сразу.
+        """
+        with self.user_index_lock:
+            if self.user_index is None or time.monotonic() - self.user_index_at > USER_INDEX_TTL:
+                self.user_index = self.build_user_index()
+                self.user_index_at = time.monotonic()
+            return list(self.user_index.get(str(telegram_id), ()))
+
+    def reset_user_index(self):
+        """Сброс индекса строк: следующий user_rows перечитает колонку Telegram ID"""
+        self.user_index = None
+
+    def build_user_index(self) -> Dict[str, List[int]]:
+        column_number = self.column_map.column("telegram_id")
+        column = self.quota.read("col_values", self.sheet.col_values, column_number,
+                                 key=("col_values", column_number))
+
+        if not column or str(column[0]).strip() != HEADERS[FIELDS.index("telegram_id")]:
+            # Колонки переставлены: перечитываем лист целиком, заодно обновляется карта колонок
+            table = self.load_table()
+            return {key: [i + 2 for i in positions] for key, positions in table.index_users().items()}
+
+        index: Dict[str, List[int]] = {}
+        for row, value in enumerate(column[1:], start=2):
+            index.setdefault(str(value), []).append(row)
+        return index
+
+    def get_booking_rows(self, rows: List[int]) -> List[BookingRecord]:
+        """Бронирования из указанных строк листа одним запросом"""
+        if not rows:
             return []
+        from gspread.utils import rowcol_to_a1
+
+        width = self.column_map.width
+        ranges = [f"{rowcol_to_a1(row, 1)}:{rowcol_to_a1(row, width)}" for row in rows]
+        results = self.quota.read("batch_get", self.sheet.batch_get, ranges,
+                                  key=("batch_get", tuple(ranges)), rows=len(rows))
+        return [
+            self.column_map.record(row, values[0] if values else [])
+            for row, values in zip(rows, results)
+        ]
 
     def update_payment_status(self, telegram_id: int, event_name: str, status: str) -> bool:
         """Обновление статуса оплаты бронирования"""
-        try:
-            all_records = self.sheet.get_all_values()
+        with self.rows_lock:
+            try:
+                table = self.load_table()
+                events = table.columns["event_name"]
+                statuses = table.columns["payment_status"]
 
-            for i, row in enumerate(all_records[1:], start=2):  # Начинаем с 2 строки (пропускаем заголовки)
-                if (str(row[1]) == str(telegram_id) and
-                        row[8] == event_name and
-                        row[10] != "Оплачено"):
-                    self.sheet.update_cell(i, 11, status)  # Колонка "Статус оплаты"
-                    logging.info(f"✅ Статус оплаты обновлен для {telegram_id}")
-                    return True
+                for i in table.user_positions(telegram_id):
+                    if events[i] == event_name and statuses[i] != PAID_STATUS:
+                        self.quota.write("update_cell", self.sheet.update_cell,
+                                         i + 2, self.column_map.column("payment_status"), status)
+                        self.mirror("set_status", telegram_id, event_name, status)
+                        logging.info("✅ Статус оплаты обновлен для %s", telegram_id)
+                        return True
 
-            return False
+                return False
 
-        except Exception as e:
-            logging.error(f"❌ Ошибка обновления статуса: {e}")
-            return False
\ No newline at end of file
+            except Exception as e:
+                logging.error("❌ Ошибка обновления статуса: %s", e)
+                return False
+
+    def update_payment_statuses(self, updates: List[Tuple[int, str, str]]) -> int:
+        """
+        Пакетное обновление статусов оплаты одним запросом к таблице
+        updates: список (telegram_id, мероприятие, новый статус)
+        Возвращает количество обновленных строк
+        """
+        if not updates:
+            return 0
+
+        from gspread import Cell
+
+        with self.rows_lock:
+            try:
+                pending = {(str(telegram_id), event_name): status for telegram_id, event_name, status in updates}
+                table = self.load_table()
+                status_column = self.column_map.column("payment_status")
+                telegram_ids = table.columns["telegram_id"]
+                events = table.columns["event_name"]
+                statuses = table.columns["payment_status"]
+                cells = []
+
+                for i in range(len(table)):
+                    key = (str(telegram_ids[i]), events[i])
+                    if key in pending and statuses[i] != PAID_STATUS:
+                        cells.append(Cell(i + 2, status_column, pending.pop(key)))
+                        if not pending:
+                            break
+
+                if cells:
+                    self.quota.write("update_cells", self.sheet.update_cells, cells, cells=len(cells))
+                    self.mirror("set_statuses", updates)
+                    logging.info("✅ Обновлено статусов оплаты: %d", len(cells))
+
+                return len(cells)
+
+            except Exception as e:
+                logging.error("❌ Ошибка пакетного обновления статусов: %s", e)
+                return 0
@@ -1,4 +1,17 @@
 # knowledge_base.py
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from metrics import cache_hit
+from sheets_quota import PRIORITY_BACKGROUND
+from token_budget import compact_whitespace, estimate_tokens, select_sections
+
+logger = logging.getLogger(__name__)
+
 COMPANY_INFO = """
 ChebEXTREME - прокат снаряжения спорта и туризма в Чебоксарах.
 
@@ -69,12 +82,167 @@ ChebEXTREME - прокат снаряжения спорта и туризма 
 - Город: Чебоксары
 """
 
-def get_context_prompt(user_question):
-    return f"""
+# Бюджет токенов на базу знаний в запросе к YandexGPT
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 1500))
+
+# Разделы, которые попадают в запрос при любом вопросе
+ALWAYS_SECTIONS = ("КОНТАКТЫ",)
+
+
+# Структурированные тарифы проката по встроенному COMPANY_INFO
+# Действующие тарифы разбираются из текущей версии базы знаний (KnowledgeSnapshot.tariffs),
+# чтобы прокат и /prices брали те же цены, что называет консультант; эти значения - запасные.
+# hourly: список (часов, цена) - "День" считается как 11 часов работы пункта, "Сутки" - 24 часа
+# daily: цена за сутки по будням (пн-чт) и выходным (пт-вс)
+# discount: (от скольких суток, скидка на всю аренду)
+RENTAL_TARIFFS = {
+    "bike_c": {
+        "name": "Велосипед «С»",
+        "hourly": [(1, 200), (2, 350), (3, 500), (5, 600), (7, 700), (11, 800), (24, 900)]
+    },
+    "bike_b": {
+        "name": "Велосипед «В»",
+        "hourly": [(1, 250), (2, 500), (3, 700), (5, 850), (7, 1000), (11, 1100), (24, 1300)]
+    },
+    "bike_a": {
+        "name": "Велосипед «А»",
+        "hourly": [(1, 300), (2, 600), (3, 900), (11, 1500), (24, 2000)]
+    },
+    "scooter": {
+        "name": "Электросамокат",
+        "hourly": [(1, 350), (2, 500), (3, 700), (11, 1000), (24, 1500)]
+    },
+    "longboard": {
+        "name": "Лонгборд",
+        "hourly": [(1, 100), (3, 250), (24, 500)]
+    },
+    "sup": {
+        "name": "SUP-борд",
+        "daily": {"weekday": 1000, "weekend": 1500},
+        "discount": (2, 500)
+    },
+    "tent": {
+        "name": "Палатка",
+        "daily": {"weekday": 200, "weekend": 200}
+    },
+}
+
+# Где в базе знаний цены категории: (часть заголовка раздела, часть строки или None - весь раздел)
+TARIFF_SOURCES = {
+    "bike_c": ("ПРОКАТ ВЕЛОСИПЕД", "«С»"),
+    "bike_b": ("ПРОКАТ ВЕЛОСИПЕД", "«В»"),
+    "bike_a": ("ПРОКАТ ВЕЛОСИПЕД", "«А»"),
+    "scooter": ("ПРОКАТ ЭЛЕКТРОСАМОКАТ", None),
+    "longboard": ("ПРОКАТ ЛОНГБОРД", None),
+    "sup": ("ПРОКАТ SUP", None),
+    "tent": ("СНАРЯЖЕНИЕ ДЛЯ ТУРИЗМА", "Палатк"),
+}
+
+# "День" - часы работы пункта проката (10:00-21:00)
+DAY_HOURS = 11
+
+PRICE = r"(\d+(?:\s\d{3})*)\s*р"
+HOURLY_PATTERN = re.compile(r"(?:(\d+)\s*ч|(День)|(Сутки))\s*[-–—:]\s*" + PRICE, re.IGNORECASE)
+WEEKDAY_PATTERN = re.compile(r"понедельник\s*[-–]\s*четверг\s*:\s*" + PRICE, re.IGNORECASE)
+WEEKEND_PATTERN = re.compile(r"пятница\s*[-–]\s*воскресенье\s*:\s*" + PRICE, re.IGNORECASE)
+DISCOUNT_PATTERN = re.compile(r"скидка на (\d+) сут\w*\s*:\s*-?\s*" + PRICE, re.IGNORECASE)
+PRICE_PATTERN = re.compile(PRICE)
+
+
+def parse_price(value: str) -> int:
+    return int(value.replace(" ", ""))
+
+
+def parse_tariff(default: Dict, text: str) -> Optional[Dict]:
+    """Тариф категории из текста базы знаний по образцу встроенного (None, если цен не нашлось)"""
+    tariff = dict(default)
+    if "hourly" in default:
+        tiers = {}
+        for hours, day, full_day, price in HOURLY_PATTERN.findall(text):
+            tiers[int(hours) if hours else DAY_HOURS if day else 24] = parse_price(price)
+        if not tiers:
+            return None
+        tariff["hourly"] = sorted(tiers.items())
+        return tariff
+
+    weekday, weekend = WEEKDAY_PATTERN.search(text), WEEKEND_PATTERN.search(text)
+    if weekday and weekend:
+        tariff["daily"] = {"weekday": parse_price(weekday.group(1)), "weekend": parse_price(weekend.group(1))}
+    else:
+        single = PRICE_PATTERN.search(text)
+        if not single:
+            return None
+        tariff["daily"] = {"weekday": parse_price(single.group(1)), "weekend": parse_price(single.group(1))}
+
+    discount = DISCOUNT_PATTERN.search(text)
+    tariff.pop("discount", None)
+    if discount:
+        tariff["discount"] = (int(discount.group(1)), parse_price(discount.group(2)))
+    return tariff
+
+
+def parse_tariffs(sections: List[Tuple[str, str]]) -> Dict[str, Dict]:
+    """
+    Тарифы проката из разделов базы знаний
+    Категория, цены которой в тексте не найдены, остается со встроенным тарифом (с предупреждением в лог).
+    """
+    tariffs = {}
+    for category, default in RENTAL_TARIFFS.items():
+        section, marker = TARIFF_SOURCES[category]
+        lines = [
+            line
+            for title, body in sections if section in title.upper()
+            for line in body.split("\n") if marker is None or marker in line
+        ]
+        tariff = parse_tariff(default, "\n".join(lines))
+        if tariff is None:
+            logger.warning("⚠️ В базе знаний не найдены цены «%s», используется встроенный тариф", default["name"])
+            tariff = default
+        tariffs[category] = tariff
+    return tariffs
+
+
+def format_tariff(tariff: Dict) -> str:
+    """Цены тарифа одной строкой для /prices"""
+    if "hourly" in tariff:
+        shown = [(hours, price) for hours, price in tariff["hourly"] if hours in (1, 3, 24)] or tariff["hourly"]
+        units = {1: "ч", DAY_HOURS: "день", 24: "сутки"}
+        return ", ".join(f"{price}₽/{units.get(hours, f'{hours}ч')}" for hours, price in shown)
+
+    daily = tariff["daily"]
+    if daily["weekday"] == daily["weekend"]:
+        text = f"{daily['weekday']}₽/сутки"
+    else:
+        text = f"Пн-Чт {daily['weekday']}₽/сутки, Пт-Вс {daily['weekend']}₽/сутки"
+    if "discount" in tariff:
+        min_days, amount = tariff["discount"]
+        text += f", от {min_days} суток скидка {amount}₽"
+    return text
+
+
+def is_section_header(line: str) -> bool:
+    """Строка начинается с заголовка раздела вида "ПРОКАТ ВЕЛОСИПЕДОВ:" """
+    header, colon, _ = line.partition(":")
+    letters = [char for char in header if char.isalpha()]
+    return bool(colon) and bool(letters) and sum(char.isupper() for char in letters) / len(letters) >= 0.7
+
+
+def split_sections(text: str):
+    """Разбиение базы знаний на разделы (заголовок, текст) с удалением лишних пробелов"""
+    sections = []
+    for line in compact_whitespace(text).split("\n"):
+        if is_section_header(line) or not sections:
+            sections.append([line.partition(":")[0], line])
+        else:
+            sections[-1][1] += "\n" + line
+    return [(title, body) for title, body in sections]
+
+
+PROMPT_HEAD = """
 Ты консультант компании ChebEXTREME по прокату спортивного и туристического снаряжения.
 
 Информация о компании:
-{COMPANY_INFO}
+{company_info}
 
 Правила ответов:
 1. Отвечай дружелюбно и профессионально
@@ -83,6 +251,143 @@ def get_context_prompt(user_question):
 4. Всегда указывай актуальные цены и условия
 5. Предлагай дополнительные услуги когда уместно
 
-Вопрос клиента: {user_question}
+Вопрос клиента: """
+
+PROMPT_TAIL = """
+
+Ответ:"""
+
+
+class KnowledgeSnapshot:
+    __slots__ = ("version", "text", "sections", "costs", "heads", "tariffs")
+
+    def __init__(self, text: str):
+        """
+        Неизменяемая версия базы знаний
+        Разделы, их оценки токенов и начало запроса готовятся один раз на версию;
+        кэш начал запроса живет вместе с версией и не переживает ее замену.
+        tariffs: тарифы проката по ценам этой версии (см. parse_tariffs)
+        """
+        self.text = text
+        self.version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+        self.sections = split_sections(text)
+        self.costs = [estimate_tokens(body) for title, body in self.sections]
+        self.heads: Dict[Tuple[int, ...], str] = {}
+        self.tariffs = parse_tariffs(self.sections)
+
+    def prompt(self, user_question: str, token_budget: int = None) -> str:
+        """Запрос к модели: разделы под бюджет токенов + вопрос клиента"""
+        selected = select_sections(
+            self.sections, user_question, token_budget or PROMPT_TOKEN_BUDGET,
+            always=ALWAYS_SECTIONS, costs=self.costs
+        )
+        key = tuple(self.sections.index(section) for section in selected)
+        head = self.heads.get(key)
+        cache_hit("prompt_head", head is not None)
+        if head is None:
+            if len(self.heads) >= 256:
+                self.heads.clear()
+            company_info = "\n".join(body for title, body in selected)
+            head = self.heads[key] = PROMPT_HEAD.format(company_info=company_info)
+        return head + user_question + PROMPT_TAIL
+
+
+DEFAULT_SNAPSHOT = KnowledgeSnapshot(COMPANY_INFO)
+
+
+def get_context_prompt(user_question, token_budget: int = None):
+    return DEFAULT_SNAPSHOT.prompt(user_question, token_budget)
+
+
+class KnowledgeBase:
+    def __init__(self, sheets_client=None, knowledge_file: str = None):
+        """
+        База знаний консультанта с фоновой перезагрузкой
+        sheets_client: клиент Google Sheets для чтения листа "База знаний"
+        knowledge_file: путь к текстовому файлу базы знаний (KNOWLEDGE_FILE)
+        Без файла и листа используется встроенный COMPANY_INFO.
+        """
+        self.sheets_client = sheets_client
+        self.knowledge_file = knowledge_file or os.getenv("KNOWLEDGE_FILE", "knowledge_base.txt")
+        self.source = os.getenv("KNOWLEDGE_SOURCE", "file")  # file или sheet
+        self.reload_interval = int(os.getenv("KNOWLEDGE_RELOAD_INTERVAL", 60))
+
+        self.file_mtime = None
+        self.task = None
+
+        text = self.load_file()
+        self.snapshot = KnowledgeSnapshot(text) if text else DEFAULT_SNAPSHOT
+
+    def get_context_prompt(self, user_question: str, token_budget: int = None) -> str:
+        """Запрос к модели по текущей версии (версия берется один раз на запрос)"""
+        return self.snapshot.prompt(user_question, token_budget)
+
+    def load_file(self) -> Optional[str]:
+        """Чтение базы знаний из файла (None, если файл не изменился или отсутствует)"""
+        try:
+            mtime = os.stat(self.knowledge_file).st_mtime
+        except OSError:
+            return None
+
+        if mtime == self.file_mtime:
+            return None
+
+        with open(self.knowledge_file, encoding="utf-8") as f:
+            text = f.read()
+        self.file_mtime = mtime
+        return text
+
+    def load_sheet(self) -> Optional[str]:
+        """Чтение базы знаний с листа "База знаний": по строке текста в первой колонке"""
+        if not self.sheets_client or not self.sheets_client.spreadsheet:
+            return None
+
+        worksheet = self.sheets_client.worksheet("База знаний")
+        return "\n".join(self.sheets_client.quota.read("col_values", worksheet.col_values, 1))
+
+    def swap(self, text: str) -> bool:
+        """Компиляция новой версии и атомарная замена текущей"""
+        snapshot = KnowledgeSnapshot(text)
+        if snapshot.version == self.snapshot.version:
+            return False
+
+        self.snapshot = snapshot
+        logger.info("📚 База знаний обновлена: версия %s, разделов %d", snapshot.version, len(snapshot.sections))
+        return True
+
+    async def reload(self) -> bool:
+        """Перезагрузка базы знаний из источника без блокировки обработчиков"""
+        if self.source == "sheet" and self.sheets_client:
+            text = await self.sheets_client.run(self.load_sheet, priority=PRIORITY_BACKGROUND)
+        else:
+            text = await asyncio.to_thread(self.load_file)
+        if not text or not text.strip():
+            return False
+        return self.swap(text)
+
+    async def run(self):
+        """Периодическая проверка источника на изменения"""
+        while True:
+            try:
+                await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка загрузки базы знаний: %s", e)
+
+            await asyncio.sleep(self.reload_interval)
+
+    def start(self):
+        """Запуск фоновой перезагрузки"""
+        if not self.task:
+            self.task = asyncio.create_task(self.run())
 
-Ответ:"""
\ No newline at end of file
+    async def stop(self):
+        """Остановка фоновой перезагрузки"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
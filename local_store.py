@@ -0,0 +1,41 @@
+import os
+import sqlite3
+import logging
+from typing import Dict, Optional
+
+# Путь к локальной базе по умолчанию (общая для бота и webhook-сервера)
+DEFAULT_DB_PATH = "chebextreme.db"
+
+
+def get_db_path(db_path: Optional[str] = None) -> str:
+    """Путь к локальной базе: явный аргумент, LOCAL_DB_PATH или значение по умолчанию"""
+    return db_path or os.getenv("LOCAL_DB_PATH", DEFAULT_DB_PATH)
+
+
+def connect(db_path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Открытие соединения с локальной базой SQLite
+    db_path: путь к файлу базы (по умолчанию LOCAL_DB_PATH)
+    """
+    path = get_db_path(db_path)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+    conn.row_factory = sqlite3.Row
+
+    # WAL позволяет боту и webhook-серверу читать базу параллельно с записью
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    logging.debug("Открыта локальная база %s", path)
+    return conn
+
+
+def ensure_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str]):
+    """
+    Добавление недостающих колонок в существующую таблицу
+    columns: словарь {имя колонки: SQL-описание типа}
+    """
+    existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, declaration in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {declaration}")
+            logging.info("Добавлена колонка %s.%s", table, name)
@@ -0,0 +1,243 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+# Ключи, значения которых не попадают в логи (сравнение без учета регистра)
+SECRET_KEYS = {
+    "token", "password", "secret", "secret_key", "api_key", "authorization",
+    "passport_series", "passport_number", "birth_date", "phone",
+}
+
+# Переменные окружения с секретами: их значения вырезаются из любого текста
+SECRET_ENV = ("TINKOFF_SECRET_KEY", "TINKOFF_TERMINAL_KEY", "TELEGRAM_TOKEN", "YANDEX_API_KEY")
+
+REDACTED = "***"
+
+# Шаблоны секретов в свободном тексте: (шаблон, замена)
+# Паспорт ищется только после слов "паспорт"/"серия": голые 10 цифр - это и PaymentId, и id чатов.
+# Телефон - с +7 или с 8 и разделителями: слитные 11 цифр от идентификаторов не отличить
+TEXT_PATTERNS = (
+    (re.compile(r"(?<!\d)\d{8,10}:[A-Za-z0-9_-]{35}\b"), REDACTED),  # Токен Telegram бота (и в URL .../bot<токен>/)
+    (re.compile(r"Api-Key\s+\S+"), REDACTED),  # Заголовок авторизации YandexGPT
+    (re.compile(r"(?i)((?:паспорт|серия)[^\d\n]{0,20})\d{2}\s?\d{2}[\s№]*\d{6}\b"), rf"\1{REDACTED}"),  # Серия и номер паспорта
+    (re.compile(r"(?<![\w+])(?:\+7[\s(-]*|8[\s(-]+)\d{3}[\s)-]*\d{3}[\s-]?\d{2}[\s-]?\d{2}\b"), REDACTED),  # Телефон
+)
+
+# Атрибуты LogRecord, которые не относятся к пользовательским полям (extra)
+RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sampled"}
+
+
+def redact_value(value, depth: int = 0):
+    """Маскирование секретов в словарях, списках и строках"""
+    if depth > 5:
+        return value
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if str(key).lower() in SECRET_KEYS else redact_value(item, depth + 1)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact_value(item, depth + 1) for item in value)
+    if isinstance(value, str):
+        return redact_text(value)
+    return value
+
+
+def redact_text(text: str) -> str:
+    for secret in secret_values():
+        if secret in text:
+            text = text.replace(secret, REDACTED)
+    for pattern, replacement in TEXT_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+cached_secrets: Optional[Tuple[str, ...]] = None
+
+
+def secret_values() -> Tuple[str, ...]:
+    """Значения секретов из окружения (читаются при первом обращении, после load_dotenv)"""
+    global cached_secrets
+    if cached_secrets is None:
+        cached_secrets = tuple(value for value in (os.getenv(name) for name in SECRET_ENV) if value and len(value) >= 6)
+    return cached_secrets
+
+
+class RedactingFilter(logging.Filter):
+    """
+    Форматирование сообщения с маскированием секретов
+    Выполняется только для записей, прошедших проверку уровня, поэтому
+    отладочные сообщения с payload'ами ничего не стоят, когда DEBUG выключен.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.args:
+            # Единственный аргумент-словарь logging хранит без кортежа
+            args = redact_value(record.args)
+            try:
+                record.msg = str(record.msg) % args
+            except (TypeError, ValueError):
+                record.msg = f"{record.msg} {args}"
+            record.args = None
+        record.msg = redact_text(str(record.msg))
+
+        for key, value in vars(record).items():
+            if key not in RECORD_FIELDS:
+                setattr(record, key, redact_value(value))
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, burst: int = None, every: int = None, interval: float = None):
+        """
+        Прореживание повторяющихся сообщений уровня ниже WARNING
+        Для каждого шаблона (логгер + текст до подстановки аргументов) за интервал
+        пропускаются первые burst записей, дальше - каждая every-я.
+        """
+        super().__init__()
+        self.burst = burst or int(os.getenv("LOG_SAMPLE_BURST", 20))
+        self.every = every or int(os.getenv("LOG_SAMPLE_EVERY", 100))
+        self.interval = interval or float(os.getenv("LOG_SAMPLE_INTERVAL", 60))
+        self.counters: Dict[Tuple[str, str], int] = {}
+        self.window_start = time.monotonic()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        now = time.monotonic()
+        if now - self.window_start > self.interval:
+            self.counters.clear()
+            self.window_start = now
+
+        key = (record.name, str(record.msg))
+        count = self.counters.get(key, 0) + 1
+        if len(self.counters) < 10000 or key in self.counters:
+            self.counters[key] = count
+
+        if count <= self.burst:
+            return True
+        if (count - self.burst) % self.every == 0:
+            record.sampled = self.every
+            return True
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись в одну строку JSON: время, уровень, логгер, сообщение и поля extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_FIELDS:
+                entry[key] = value
+        if getattr(record, "sampled", None):
+            entry["sampled"] = record.sampled
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = redact_text(record.exc_text)
+        if record.stack_info:
+            entry["stack"] = redact_text(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# Форматирование трассировок в потоке, записавшем сообщение (до маскирования)
+TRACEBACK_FORMATTER = logging.Formatter()
+
+
+class RedactingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Постановка записи в очередь потока записи
+    Стандартный prepare вклеивает трассировку исключения в текст сообщения уже после фильтров,
+    и секреты из текста исключения попадали в лог как есть. Здесь трассировка маскируется
+    и остается отдельным полем (exc_text), чтобы ее оформил форматтер.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or TRACEBACK_FORMATTER.formatException(record.exc_info)
+            # Кадры трассировки не держатся в очереди до записи
+            record.exc_info = None
+        if record.exc_text:
+            record.exc_text = redact_text(record.exc_text)
+        if record.stack_info:
+            record.stack_info = redact_text(record.stack_info)
+        return record
+
+
+def parse_levels(value: str) -> Dict[str, int]:
+    """
+    Уровни по модулям: "tinkoff_payment=DEBUG,aiogram.event=WARNING"
+    Неизвестные уровни пропускаются с предупреждением, а не роняют запуск.
+    """
+    levels = {}
+    for item in value.split(","):
+        name, _, level = item.partition("=")
+        if not (name.strip() and level.strip()):
+            continue
+        number = logging.getLevelName(level.strip().upper())
+        if isinstance(number, int):
+            levels[name.strip()] = number
+        else:
+            logging.getLogger(__name__).warning("Неизвестный уровень логирования в LOG_LEVELS: %s", item.strip())
+    return levels
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """
+    Настройка логирования процесса
+    LOG_LEVEL: общий уровень (INFO), LOG_LEVELS: уровни отдельных модулей
+    LOG_FORMAT: json или text, LOG_FILE: файл вместо stderr
+    Запись в файл/консоль выполняет отдельный поток (QueueListener), обработчики
+    и event loop только кладут запись в очередь.
+    """
+    root = logging.getLogger()
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for name, level in parse_levels(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
+
+    log_file = os.getenv("LOG_FILE")
+    target = logging.FileHandler(log_file, encoding="utf-8") if log_file else logging.StreamHandler(sys.stderr)
+    if os.getenv("LOG_FORMAT", "json") == "json":
+        target.setFormatter(JsonFormatter())
+    else:
+        target.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    handler = RedactingQueueHandler(queue.SimpleQueue())
+    handler.addFilter(SamplingFilter())
+    handler.addFilter(RedactingFilter())
+
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+
+    listener = logging.handlers.QueueListener(handler.queue, target, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_listener, listener)
+    return listener
+
+
+def stop_listener(listener: logging.handlers.QueueListener):
+    """Остановка потока записи; повторный вызов (listener уже остановлен вручную) ничего не делает"""
+    if getattr(listener, "_thread", None) is not None:
+        listener.stop()
+
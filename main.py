@@ -1,14 +1,18 @@
+import time
+
+# Начало импортов: от него считается время запуска (см. startup)
+STARTED = time.perf_counter()
+
 import asyncio
 import os
-from aiogram import Bot, Dispatcher
-from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.fsm.context import FSMContext
+import shutil
+import tempfile
+import uuid
+from contextlib import suppress
+from datetime import datetime, timedelta
 import logging
-from tinkoff_payment import init_payment
 
-# Попытка загрузить переменные окружения (опционально)
+# Переменные окружения загружаются до импорта модулей бота: они читают настройки при импорте
 try:
     from dotenv import load_dotenv
 
@@ -16,13 +20,40 @@ try:
 except ImportError:
     print("⚠️ python-dotenv не установлен. Используйте переменные окружения напрямую.")
 
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.filters import Command
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.context import FSMContext
+from aiogram.exceptions import TelegramBadRequest
+from tinkoff_payment import TINKOFF_SECRET_KEY, init_payment, payment_store, prewarm as prewarm_tinkoff
 from yandex_gpt_client import YandexGPTClient
-from knowledge_base import get_context_prompt
+from knowledge_base import PROMPT_TOKEN_BUDGET, KnowledgeBase, format_tariff
 from google_sheet_client import GoogleSheetsClient
 from booking_handler import BookingHandler, BookingCallback, BookingStates
+from payment_reconciler import PaymentReconciler
+from scheduler import JobStore, Scheduler
+from send_queue import PRIORITY_REMINDER, send_priority, setup_rate_limit
+from broadcast import ChatRegistry, ChatRegistryMiddleware, broadcast
+from seat_inventory import SeatInventory
+from background_tasks import BackgroundTasks
+from update_engine import UpdateEngine
+from conversation_memory import ConversationMemory
+from token_budget import TokenUsage
+from metrics import REGISTRY, MetricsMiddleware, start_metrics_server
+from log_config import setup_logging
+from tracing import TraceExporter, TracingMiddleware, format_tree, tracer
+from rental_inventory import RentalInventory
+from rental_handler import RentalHandler, RentalCallback
+from startup import STARTUP_PREWARM, StartupTimer
+from my_bookings import MyBookings, MyBookingsCallback
+from booking_stats import STATS_DAYS, BookingStats
+from booking_store import BookingStore
+from booking_export import export_bookings, export_filename, parse_arguments, sync_from_sheet
+from sheet_archive import SheetArchiver
 
 # Настройка логирования
-logging.basicConfig(level=logging.INFO)
+log_listener = setup_logging()
 
 # Токены и настройки (лучше вынести в переменные окружения)
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
@@ -30,23 +61,79 @@ YANDEX_API_KEY = os.getenv('YANDEX_API_KEY')
 YANDEX_FOLDER_ID = os.getenv('YANDEX_FOLDER_ID')
 GOOGLE_CREDENTIALS_FILE = os.getenv('GOOGLE_CREDENTIALS_FILE')
 GOOGLE_SPREADSHEET_ID = os.getenv('GOOGLE_SPREADSHEET_ID')
+ADMIN_IDS = {int(admin_id) for admin_id in os.getenv('ADMIN_IDS', '').split(',') if admin_id.strip()}
 
 # Инициализация бота с хранилищем состояний
 storage = MemoryStorage()
 bot = Bot(token=TELEGRAM_TOKEN)
 dp = Dispatcher(storage=storage)
 
+# Все исходящие сообщения проходят через лимиты Telegram
+send_limiter = setup_rate_limit(bot)
+chat_registry = ChatRegistry()
+dp.message.outer_middleware(ChatRegistryMiddleware(chat_registry))
+
 # Инициализация клиентов
-yandex_gpt = YandexGPTClient(YANDEX_API_KEY, YANDEX_FOLDER_ID)
-sheets_client = GoogleSheetsClient(GOOGLE_CREDENTIALS_FILE, GOOGLE_SPREADSHEET_ID)
-booking_handler = BookingHandler(sheets_client)
+token_usage = TokenUsage()
+yandex_gpt = YandexGPTClient(YANDEX_API_KEY, YANDEX_FOLDER_ID, token_usage)
+booking_store = BookingStore()
+sheets_client = GoogleSheetsClient(GOOGLE_CREDENTIALS_FILE, GOOGLE_SPREADSHEET_ID, booking_store)
+seat_inventory = SeatInventory()
+booking_handler = BookingHandler(sheets_client, seat_inventory)
+event_catalog = booking_handler.catalog
+event_catalog.on_reload(lambda snapshot: seat_inventory.sync_events(snapshot.events))
+# База знаний консультанта (история диалогов при перезагрузке сохраняется: актуальные цены
+# приходят с новым контекстом базы знаний); из нее же берутся цены проката и /prices
+knowledge = KnowledgeBase(sheets_client)
+rental_inventory = RentalInventory(knowledge=knowledge)
+rental_handler = RentalHandler(sheets_client, rental_inventory)
+my_bookings = MyBookings(sheets_client, booking_store=booking_store)
+sheet_archiver = SheetArchiver(sheets_client, event_catalog, booking_store)
+booking_stats = BookingStats()
+payment_reconciler = PaymentReconciler(bot, sheets_client, payment_store, seat_inventory)
+scheduler = Scheduler(JobStore())
+
+background_tasks = BackgroundTasks()
+update_engine = UpdateEngine(dp, bot)
+
+# Метрики: длительность обработчиков и состояние очередей
+dp.message.middleware(MetricsMiddleware())
+dp.callback_query.middleware(MetricsMiddleware())
+
+# Трассировка: корневой span на обновление, вложенный - на обработчик
+dp.update.outer_middleware(TracingMiddleware())
+dp.message.middleware(TracingMiddleware())
+dp.callback_query.middleware(TracingMiddleware())
+trace_exporter = TraceExporter()
+REGISTRY.gauge("bot_update_queue_depth", "Обновления в очереди на обработку", lambda: update_engine.depth)
+REGISTRY.gauge("bot_updates_in_flight", "Обновления в обработке", lambda: update_engine.in_flight)
+REGISTRY.gauge("bot_send_queue_depth", "Сообщения, ожидающие лимита Telegram", send_limiter.queue_depth)
+REGISTRY.gauge("bot_background_tasks", "Выполняющиеся фоновые задачи", background_tasks.active)
+REGISTRY.gauge("sheets_read_quota_headroom", "Запас минутной квоты чтений Google Sheets",
+               lambda: sheets_client.quota.headroom()["read"])
+REGISTRY.gauge("sheets_write_quota_headroom", "Запас минутной квоты записей Google Sheets",
+               lambda: sheets_client.quota.headroom()["write"])
+REGISTRY.gauge("sheets_requests_waiting", "Запросы к Google Sheets, ожидающие квоты", sheets_client.quota.queue_depth)
+
+# Время жизни ссылки на оплату (обещано пользователю в тексте подтверждения)
+PAYMENT_LINK_TTL = timedelta(minutes=int(os.getenv("PAYMENT_LINK_TTL_MINUTES", 15)))
+
+# Время на сохранение бронирования и создание платежа в фоне
+BOOKING_CONFIRM_TIMEOUT = int(os.getenv("BOOKING_CONFIRM_TIMEOUT", 60))
+
+# Предельное время рассылки в фоне, секунды
+BROADCAST_TIMEOUT = int(os.getenv("BROADCAST_TIMEOUT", 3600))
 
 # Словарь для отслеживания активных запросов пользователей
 active_requests = set()
 
+# Короткая история вопросов для уточняющих запросов ("а на 3 часа?")
+conversation_memory = ConversationMemory()
+
 
 @dp.message(Command("start"))
 async def cmd_start(message: Message):
+    conversation_memory.drop(message.from_user.id)
     welcome_text = """
 🏂 Добро пожаловать в ChebEXTREME!
 
@@ -61,6 +148,7 @@ async def cmd_start(message: Message):
 Команды:
 /start - 👋 Приветствие и информация о боте
 /booking - 🎯 Забронировать мероприятие
+/rent - 🚴 Забронировать прокат снаряжения
 /mybookings - 📋 Мои бронирования
 /prices - 💰 Цены на прокат
 /contact - 📞 Контакты и информация о компании
@@ -79,6 +167,7 @@ async def cmd_help(message: Message):
 **Команды:**
 /start - Приветственное сообщение
 /booking - Забронировать мероприятие
+/rent - Забронировать прокат снаряжения
 /mybookings - Посмотреть свои бронирования
 /prices - Показать все цены на прокат
 /contact - Показать контакты
@@ -105,62 +194,86 @@ async def cmd_booking(message: Message, state: FSMContext):
     await booking_handler.start_booking(message, state)
 
 
-@dp.message(Command("mybookings"))
-async def cmd_my_bookings(message: Message):
-    """Просмотр бронирований пользователя"""
-    user_id = message.from_user.id
-    bookings = sheets_client.get_user_bookings(user_id)
+@dp.message(Command("rent"))
+async def cmd_rent(message: Message):
+    """Команда бронирования проката"""
+    await rental_handler.start_rental(message)
 
-    if not bookings:
-        await message.answer(
-            "📋 У вас пока нет бронирований.\n\n"
-            "Используйте /booking для создания нового бронирования."
-        )
+
+@dp.message(Command("rent_cancel"))
+async def cmd_rent_cancel(message: Message):
+    """Отмена брони проката сотрудником, например при неявке (только для администраторов)"""
+    if message.from_user.id not in ADMIN_IDS:
         return
 
-    text = "📋 **ВАШИ БРОНИРОВАНИЯ:**\n\n"
+    argument = message.text.partition(' ')[2].strip().lstrip('#')
+    if not argument.isdigit():
+        await message.answer("Использование: /rent_cancel номер_брони")
+        return
 
-    for i, booking in enumerate(bookings, 1):
-        text += f"**{i}. {booking.get('Мероприятие', 'Неизвестно')}**\n"
-        text += f"💰 {booking.get('Стоимость', 'Не указано')} ₽\n"
-        text += f"📅 {booking.get('Дата бронирования', 'Не указано')}\n"
-        text += f"💳 {booking.get('Статус оплаты', 'Не указано')}\n"
-        text += "---\n"
+    reservation = await rental_handler.release(int(argument))
+    if not reservation:
+        await message.answer(f"Активной брони проката #{argument} нет")
+        return
+    await message.answer(
+        f"🚫 Бронь проката #{reservation['id']} отменена, снаряжение освобождено "
+        f"({reservation['start'].strftime('%d.%m %H:%M')}, {reservation['hours']} ч)"
+    )
 
-    text += "\n📞 Вопросы по бронированию: @chebextreme"
 
-    await message.answer(text, parse_mode="Markdown")
+@dp.callback_query(RentalCallback.filter())
+async def handle_rental_callback(callback: CallbackQuery, callback_data: RentalCallback):
+    """Обработка callback'ов бронирования проката"""
+    await rental_handler.handle_callback(callback, callback_data)
 
 
-@dp.message(Command("prices"))
-async def cmd_prices(message: Message):
-    prices_text = """
-💰 АКТУАЛЬНЫЕ ЦЕНЫ ChebEXTREME
+@dp.message(Command("mybookings"))
+async def cmd_my_bookings(message: Message):
+    """Просмотр бронирований пользователя (постранично)"""
+    try:
+        text, keyboard = await my_bookings.open(message.from_user.id)
+    except Exception as e:
+        logging.error("❌ Ошибка получения бронирований: %s", e)
+        await message.answer("⚠️ Не удалось загрузить бронирования. Попробуйте позже.")
+        return
+
+    await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
+
+
+@dp.callback_query(MyBookingsCallback.filter())
+async def handle_my_bookings_page(callback: CallbackQuery, callback_data: MyBookingsCallback):
+    """Листание /mybookings"""
+    if callback_data.action != "page":
+        await callback.answer()
+        return
 
-🚴‍♂️ **ВЕЛОСИПЕДЫ:**
-Категория «С»: 200₽/ч, 500₽/3ч, 900₽/сутки
-Категория «В»: 250₽/ч, 700₽/3ч, 1300₽/сутки  
-Категория «А»: 300₽/ч, 900₽/3ч, 2000₽/сутки
+    try:
+        text, keyboard = await my_bookings.page(callback.from_user.id, callback_data.page)
+    except Exception as e:
+        logging.error("❌ Ошибка получения бронирований: %s", e)
+        await callback.answer("⚠️ Не удалось загрузить бронирования", show_alert=True)
+        return
 
-🛴 **САМОКАТЫ:** 350₽/ч, 700₽/3ч, 1500₽/сутки
+    # Страница могла не измениться (курсор пересобран после перезапуска)
+    with suppress(TelegramBadRequest):
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    await callback.answer()
 
-🏄‍♂️ **SUP-БОРДЫ:**
-Пн-Чт: 1000₽/сутки
-Пт-Вс: 1500₽/сутки
 
-🏕️ **ТУРИСТИЧЕСКОЕ СНАРЯЖЕНИЕ:**
-Палатки: от 200₽/сутки
-Спальники: от 200₽/сутки
-Шатеры: от 1200₽/сутки
+@dp.message(Command("prices"))
+async def cmd_prices(message: Message):
+    """Цены проката из текущей версии базы знаний и мероприятия из каталога"""
+    tariffs = knowledge.snapshot.tariffs
+    lines = ["💰 АКТУАЛЬНЫЕ ЦЕНЫ ChebEXTREME\n", "🚴‍♂️ **ПРОКАТ:**"]
+    lines += [f"{tariff['name']}: {format_tariff(tariff)}" for tariff in tariffs.values()]
 
-🎯 **МЕРОПРИЯТИЯ:**
-Сплавы по рекам: от 15000₽
-Походы: от 10000₽
-Велотуры: от 8000₽
+    events = event_catalog.snapshot.compiled.values()
+    if events:
+        lines.append("\n🎯 **МЕРОПРИЯТИЯ:**")
+        lines += [f"{event.data['name']} ({event.data['dates']}): {event.price_at():,}₽" for event in events]
 
-📞 Подробности: /contact или /booking
-"""
-    await message.answer(prices_text, parse_mode="Markdown")
+    lines.append("\n📞 Подробности: /contact или /booking")
+    await message.answer("\n".join(lines), parse_mode="Markdown")
 
 
 @dp.message(Command("contact"))
@@ -204,6 +317,175 @@ async def cmd_test_payment(message: Message):
         await message.answer(f"❌ Ошибка: {str(e)}")
 
 
+@dp.message(Command("broadcast"))
+async def cmd_broadcast(message: Message):
+    """Рассылка сообщения всем пользователям бота (только для администраторов)"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+
+    text = message.text.partition(' ')[2].strip()
+    if not text:
+        await message.answer("Использование: /broadcast текст сообщения")
+        return
+
+    # Повторная доставка той же команды не запускает вторую рассылку
+    task_key = f"broadcast:{message.chat.id}:{message.message_id}"
+    if background_tasks.seen(task_key):
+        return
+
+    status_msg = await message.answer(f"📣 Рассылка запущена, получателей: {chat_registry.count()}")
+
+    async def report_progress(sent: int, failed: int, total: int):
+        await status_msg.edit_text(f"📣 Рассылка: отправлено {sent} из {total}, ошибок {failed}")
+
+    async def run_broadcast():
+        stats = await broadcast(bot, chat_registry, text, progress=report_progress)
+        await message.answer(
+            "✅ Рассылка завершена\n\n"
+            f"Отправлено: {stats['sent']}\n"
+            f"Заблокировали бота: {stats['blocked']}\n"
+            f"Ошибок: {stats['failed']}"
+        )
+
+    # Рассылка идет в фоне, чтобы не занимать обработку обновлений; при остановке бота она дожидается
+    # или отменяется вместе с остальными фоновыми задачами
+    background_tasks.spawn(
+        task_key,
+        run_broadcast(),
+        timeout=BROADCAST_TIMEOUT,
+        on_timeout=lambda: message.answer("⚠️ Рассылка остановлена: не уложилась в BROADCAST_TIMEOUT")
+    )
+
+
+@dp.message(Command("trace_last"))
+async def cmd_trace_last(message: Message):
+    """Дерево span'ов последнего медленного запроса пользователя (только для администраторов)"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+
+    argument = message.text.partition(' ')[2].strip()
+    if argument and not argument.isdigit():
+        await message.answer("Использование: /trace_last [telegram_id]")
+        return
+    user_id = int(argument) if argument else message.from_user.id
+
+    trace = tracer.last_slow.get(user_id)
+    if not trace:
+        await message.answer(
+            f"Медленных запросов пользователя {user_id} не найдено "
+            f"(порог {tracer.slow_threshold * 1000:.0f} мс)"
+        )
+        return
+
+    await message.answer(format_tree(trace)[:4000])
+
+
+@dp.message(Command("stats"))
+async def cmd_stats(message: Message):
+    """Бронирования, выручка, конверсия и вопросы по дням и мероприятиям (только для администраторов)"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+
+    argument = message.text.partition(' ')[2].strip()
+    if argument == "rebuild":
+        payments = await asyncio.to_thread(booking_stats.rebuild)
+        await message.answer(f"🔄 Статистика пересчитана по {payments} платежам")
+        argument = ""
+    if argument and not (argument.isdigit() and int(argument) > 0):
+        await message.answer("Использование: /stats [дней] или /stats rebuild")
+        return
+
+    days = int(argument) if argument else STATS_DAYS
+    text = await asyncio.to_thread(booking_stats.render, days)
+    usage = await asyncio.to_thread(token_usage.daily, days)
+    if usage:
+        text += (
+            f"\n\n🤖 YandexGPT: {sum(day['requests'] for day in usage)} запросов, "
+            f"токенов {sum(day['total_tokens'] for day in usage)} "
+            f"(вход {sum(day['input_tokens'] for day in usage)}, ответ {sum(day['completion_tokens'] for day in usage)})"
+        )
+    await message.answer(text[:4000])
+
+
+@dp.message(Command("quota"))
+async def cmd_quota(message: Message):
+    """Запас квот Google Sheets API и очередь запросов (только для администраторов)"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+
+    await message.answer(f"📊 Google Sheets: {sheets_client.quota.describe()}")
+
+
+@dp.message(Command("archive"))
+async def cmd_archive(message: Message):
+    """Перенос бронирований прошедших мероприятий в листы архива сейчас (только для администраторов)"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+
+    status_msg = await message.answer("🗄 Архивация бронирований...")
+    try:
+        moved = await sheets_client.run(sheet_archiver.archive_once)
+    except Exception as e:
+        logging.error("Ошибка архивации бронирований: %s", e)
+        await status_msg.edit_text(f"❌ Ошибка архивации: {e}")
+        return
+
+    if not moved:
+        await status_msg.edit_text("🗄 Переносить в архив нечего")
+        return
+    await status_msg.edit_text(
+        "✅ Перенесено в архив:\n" + "\n".join(f"Сезон {season}: {count}" for season, count in moved.items())
+    )
+
+
+# Telegram не принимает от бота документы больше 50 МБ
+EXPORT_MAX_BYTES = 50 * 1024 * 1024
+
+
+@dp.message(Command("export"))
+async def cmd_export(message: Message):
+    """Выгрузка бронирований файлом из локальной копии (только для администраторов)"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+
+    argument = message.text.partition(' ')[2].strip()
+    if argument == "sync":
+        count = await sheets_client.run(sync_from_sheet, booking_store, sheets_client)
+        await message.answer(f"🔄 Локальная копия обновлена из таблицы: {count} бронирований")
+        return
+
+    try:
+        export_format, filters = parse_arguments(argument)
+    except ValueError as e:
+        await message.answer(
+            f"❌ {e}\n\n"
+            "Использование: /export [csv|xlsx] [event=мероприятие] [from=2025-05-01] [to=2025-09-30] "
+            "[status=Оплачено]\n/export sync - перечитать таблицу в локальную копию"
+        )
+        return
+
+    filename = export_filename(export_format, filters)
+    path = os.path.join(tempfile.mkdtemp(prefix="chebextreme-export-"), filename)
+    try:
+        count = await asyncio.to_thread(export_bookings, booking_store, path, export_format, filters)
+        if not count:
+            await message.answer(f"📭 Нет бронирований: {filters.describe()}")
+        elif os.path.getsize(path) > EXPORT_MAX_BYTES:
+            await message.answer(
+                f"📦 Выгрузка ({count} строк) больше 50 МБ. Сузьте фильтры или выгрузите из консоли: "
+                "python booking_export.py"
+            )
+        else:
+            await message.answer_document(
+                FSInputFile(path, filename=filename),
+                caption=f"📤 Бронирований: {count} ({filters.describe()})"
+            )
+    except RuntimeError as e:
+        await message.answer(f"❌ {e}")
+    finally:
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
 # Обработчики callback'ов для бронирования
 @dp.callback_query(BookingCallback.filter())
 async def handle_booking_callback(callback: CallbackQuery, callback_data: BookingCallback, state: FSMContext):
@@ -215,44 +497,110 @@ async def handle_booking_callback(callback: CallbackQuery, callback_data: Bookin
     elif action == "start_form":
         await booking_handler.start_form(callback, state)
     elif action == "confirm":
-        # Получаем данные бронирования
+        # Повторная доставка или двойное нажатие на ту же кнопку
+        task_key = f"confirm:{callback.message.chat.id}:{callback.message.message_id}"
+        if background_tasks.seen(task_key):
+            await callback.answer("⏳ Бронирование уже обрабатывается")
+            return
+
+        # Отвечаем сразу, чтобы кнопка не "крутилась", пока идут запросы к таблице и Tinkoff
+        await callback.answer("⏳ Оформляем бронирование...")
+
         booking_data = await state.get_data()
-        
-        try:
-            # Создаем платеж в Tinkoff
-            payment_url = init_payment(
-                amount=int(booking_data.get('amount', 100)),
-                 description=f"Бронирование {booking_data.get('event_name') or 'услуги'}",
-                customer_id=str(callback.from_user.id),
-                chat_id=callback.from_user.id
-            )
-            
-            # Отправляем пользователю ссылку на оплату
-            await callback.message.answer(
-                "💳 Для завершения бронирования, пожалуйста, оплатите заказ:\n\n"
-                f"🎯 Мероприятие: {booking_data.get('event_name')}\n"
-                f"💰 Сумма: {booking_data.get('amount')} ₽\n\n"
-                f"🔗 Ссылка на оплату: {payment_url}\n\n"
-                "После оплаты вы получите подтверждение в этом чате.",
-                parse_mode="Markdown"
-            )
-            
-            # Сохраняем бронирование
-            await booking_handler.confirm_booking(callback, state)
-            
-        except Exception as e:
-            logging.error(f"Ошибка создания платежа: {e}")
-            await callback.message.answer(
-                "❌ Произошла ошибка при создании платежа. "
-                "Пожалуйста, попробуйте позже или свяжитесь с поддержкой."
-            )
-            
+        await state.clear()
+        if 'selected_event' not in booking_data:
+            await callback.message.edit_text("⚠️ Данные бронирования не найдены. Начните заново: /booking")
+            return
+
+        order_id = str(uuid.uuid4())
+        background_tasks.spawn(
+            task_key,
+            process_booking_confirmation(callback.message, callback.from_user, booking_data, order_id),
+            timeout=BOOKING_CONFIRM_TIMEOUT,
+            on_timeout=lambda: handle_confirmation_timeout(callback.message, order_id)
+        )
+        await callback.message.edit_text("⏳ Сохраняем бронирование и создаем ссылку на оплату...")
+
     elif action == "cancel":
         await booking_handler.cancel_booking(callback, state)
     elif action == "back":
         await booking_handler.start_booking(callback.message, state)
 
 
+async def process_booking_confirmation(message: Message, user, booking_data: dict, order_id: str):
+    """Фоновая часть подтверждения: таблица, платеж и отложенные задачи"""
+    if await booking_handler.confirm_booking(message, user, booking_data, order_id):
+        schedule_booking_jobs(order_id, user.id, booking_handler.events.get(booking_data['selected_event'], {}))
+
+
+async def handle_confirmation_timeout(message: Message, order_id: str):
+    """Подтверждение не уложилось в таймаут: снимаем резерв и отменяем ссылку, если она успеет создаться"""
+    seat_inventory.release(order_id)
+    scheduler.schedule(
+        "payment_expiry",
+        time.time() + PAYMENT_LINK_TTL.total_seconds(),
+        {"order_id": order_id},
+        job_key=f"expiry:{order_id}"
+    )
+    await message.edit_text(
+        "❌ Платежная система отвечает слишком долго.\n\n"
+        "Пожалуйста, попробуйте позже или свяжитесь с нами: @chebextreme или +7 927 669 19 52"
+    )
+
+
+async def send_event_reminder(payload: dict):
+    """Задача планировщика: напоминание о мероприятии за день до начала"""
+    payment = payment_store.get_payment(payload['order_id'])
+    if not payment or payment['status'] != 'CONFIRMED':
+        return  # Бронирование не оплачено или отменено
+
+    with send_priority(PRIORITY_REMINDER):
+        await bot.send_message(chat_id=payload['chat_id'], text=payload['text'])
+
+
+def schedule_booking_jobs(order_id: str, chat_id: int, event: dict):
+    """Планирование отмены неоплаченной ссылки и напоминания о мероприятии"""
+    scheduler.schedule(
+        "payment_expiry",
+        time.time() + PAYMENT_LINK_TTL.total_seconds(),
+        {"order_id": order_id},
+        job_key=f"expiry:{order_id}"
+    )
+
+    if event.get('start_date'):
+        remind_at = datetime.strptime(event['start_date'], "%Y-%m-%d") - timedelta(days=1) + timedelta(hours=10)
+        if remind_at > datetime.now():
+            scheduler.schedule(
+                "event_reminder",
+                remind_at.timestamp(),
+                {
+                    "order_id": order_id,
+                    "chat_id": chat_id,
+                    "text": f"🔔 Напоминаем: завтра начинается «{event['name']}»\n"
+                            f"📅 {event['dates']} • 📍 {event['location']}\n\n"
+                            "📞 Вопросы: @chebextreme или +7 927 669 19 52"
+                },
+                job_key=f"reminder:{order_id}"
+            )
+
+
+def schedule_rental_prune():
+    """Очистка индекса проката - сразу после полуночи"""
+    tomorrow = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+    scheduler.schedule("rental_prune", (tomorrow + timedelta(minutes=5)).timestamp(), {}, job_key="rental_prune")
+
+
+async def prune_rentals(payload: dict):
+    """Задача планировщика: удаление прошедших дней из индекса проката и планирование следующей очистки"""
+    rental_inventory.prune()
+    schedule_rental_prune()
+
+
+scheduler.register("payment_expiry", payment_reconciler.expire_payment)
+scheduler.register("event_reminder", send_event_reminder)
+scheduler.register("rental_prune", prune_rentals)
+
+
 # Обработчики состояний бронирования
 @dp.message(BookingStates.waiting_for_full_name)
 async def process_full_name(message: Message, state: FSMContext):
@@ -302,16 +650,23 @@ async def handle_message(message: Message, state: FSMContext):
 
     # Добавляем пользователя в активные запросы
     active_requests.add(user_id)
+    booking_stats.record_question()
 
     try:
         # Отправляем сообщение о начале обработки
         processing_msg = await message.answer("🤖 Ищу информацию...")
 
         # Получаем ответ от YandexGPT
-        context_prompt = get_context_prompt(message.text)
-        response = await yandex_gpt.get_response(context_prompt)
+        # История диалога уходит в тот же запрос, поэтому ее токены вычитаются из бюджета базы знаний
+        # (но не больше половины: без разделов базы модели не на что опереться)
+        history = conversation_memory.get(user_id)
+        token_budget = max(PROMPT_TOKEN_BUDGET - conversation_memory.tokens(user_id), PROMPT_TOKEN_BUDGET // 2)
+        context_prompt = knowledge.get_context_prompt(message.text, token_budget)
+        response = await yandex_gpt.get_response(context_prompt, history=history, user_id=user_id)
 
         if response:
+            conversation_memory.add(user_id, message.text, response)
+
             # Удаляем сообщение о обработке и отправляем ответ
             await processing_msg.delete()
 
@@ -328,7 +683,7 @@ async def handle_message(message: Message, state: FSMContext):
             )
 
     except Exception as e:
-        logging.error(f"Ошибка при обработке сообщения: {e}")
+        logging.error("Ошибка при обработке сообщения: %s", e)
         await message.answer(
             "😅 Произошла ошибка при обработке запроса. "
             "Попробуйте позже или свяжитесь с нами напрямую!\n\n"
@@ -340,6 +695,11 @@ async def handle_message(message: Message, state: FSMContext):
         active_requests.discard(user_id)
 
 
+# Импорты и создание объектов модуля - первый этап запуска
+startup = StartupTimer(STARTED)
+startup.mark("imports")
+
+
 async def main():
     """Запуск бота"""
     logging.info("Запуск бота ChebEXTREME...")
@@ -361,23 +721,54 @@ async def main():
         logging.error("❌ Не установлен GOOGLE_SPREADSHEET_ID!")
         return
 
+    if not TINKOFF_SECRET_KEY:
+        logging.error("❌ Не установлен TINKOFF_SECRET_KEY!")
+        return
+
+    metrics_runner = None
     try:
-        # Инициализируем YandexGPT
+        metrics_runner = await start_metrics_server()
         await yandex_gpt.initialize()
-        logging.info("✅ YandexGPT инициализирован")
 
-        # Инициализируем Google Sheets
-        await sheets_client.initialize()
-        logging.info("✅ Google Sheets инициализированы")
+        # Независимые клиенты подключаются одновременно; заодно открываем TLS-соединения
+        # с Telegram, YandexGPT и Tinkoff, чтобы первые запросы пользователей не ждали рукопожатий
+        prewarm = {}
+        if STARTUP_PREWARM:
+            prewarm = {
+                "telegram": bot.get_me(),
+                "yandex_gpt": yandex_gpt.prewarm(),
+                "tinkoff": asyncio.to_thread(prewarm_tinkoff),
+            }
+        await startup.gather({"sheets": sheets_client.initialize()}, prewarm)
+        logging.info("✅ YandexGPT и Google Sheets инициализированы")
+
+        # Запускаем фоновую сверку статусов платежей
+        payment_reconciler.start()
+        schedule_rental_prune()
+        scheduler.start()
+        event_catalog.start()
+        knowledge.start()
+        sheet_archiver.start()
+        trace_exporter.start()
+        startup.mark("services")
 
         # Запускаем бота
-        logging.info("🚀 Бот запущен и готов к работе!")
-        await dp.start_polling(bot)
+        logging.info("🚀 Бот запущен и готов к работе за %s", startup.report())
+        await update_engine.run()
 
     except Exception as e:
-        logging.error(f"❌ Ошибка запуска: {e}")
+        logging.error("❌ Ошибка запуска: %s", e)
 
     finally:
+        await background_tasks.shutdown()
+        await payment_reconciler.stop()
+        await scheduler.stop()
+        await event_catalog.stop()
+        await knowledge.stop()
+        await sheet_archiver.stop()
+        await trace_exporter.stop()
+        if metrics_runner:
+            await metrics_runner.cleanup()
         await yandex_gpt.close()
         await bot.session.close()
 
@@ -0,0 +1,237 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def escape_label(value) -> str:
+    """Экранирование значения метки по формату Prometheus: обратная косая черта, кавычка, перевод строки"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    """Метки в формате Prometheus: {name="value",...}"""
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    __slots__ = ("name", "help", "labelnames", "values")
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        """Монотонный счетчик; значения хранятся по кортежу меток"""
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        # Без блокировки: под GIL потеря инкремента из разных потоков возможна, но для мониторинга несущественна
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in list(self.values.items()):
+            lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    __slots__ = ("name", "help", "func")
+
+    def __init__(self, name: str, help: str, func: Callable[[], float]):
+        """Текущее значение, которое вычисляется при выдаче метрик (глубина очереди и т.п.)"""
+        self.name = name
+        self.help = help
+        self.func = func
+
+    def render(self) -> List[str]:
+        try:
+            value = self.func()
+        except Exception as e:
+            logger.error("Ошибка вычисления метрики %s: %s", self.name, e)
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+class Histogram:
+    __slots__ = ("name", "help", "labelnames", "buckets", "series", "lock")
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Гистограмма задержек
+        Серия по меткам - список: счетчики корзин (не накопительные), затем сумма и количество.
+        Накопительные значения считаются только при выдаче, запись - бинарный поиск и три сложения.
+        """
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.series: Dict[Tuple, List[float]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        self.record(labels, value)
+
+    def record(self, labels: Tuple, value: float):
+        """Запись значения по готовому кортежу меток (без распаковки аргументов)"""
+        series = self.series.get(labels)
+        if series is None:
+            with self.lock:
+                series = self.series.setdefault(labels, [0] * (len(self.buckets) + 3))
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def time(self, *labels, errors: Counter = None) -> "Timer":
+        """Замер длительности блока: with histogram.time("label"): ..."""
+        return Timer(self, errors, labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in list(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+class Timer:
+    __slots__ = ("histogram", "errors", "labels", "started")
+
+    def __init__(self, histogram: Histogram, errors: Counter, labels: Tuple):
+        """Контекстный менеджер замера: длительность в гистограмму, исключение - в счетчик ошибок"""
+        self.histogram = histogram
+        self.errors = errors
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.record(self.labels, time.perf_counter() - self.started)
+        if exc_type is not None and self.errors is not None:
+            self.errors.inc(*self.labels)
+        return False
+
+    # Используется и в async with вместе с асинхронными контекстами (сессии aiohttp)
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+class Registry:
+    def __init__(self):
+        """Набор метрик процесса"""
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, func: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, help, func))
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HANDLER_DURATION = REGISTRY.histogram(
+    "bot_handler_duration_seconds", "Длительность обработчиков бота", ("handler",)
+)
+HANDLER_ERRORS = REGISTRY.counter(
+    "bot_handler_errors_total", "Исключения в обработчиках бота", ("handler",)
+)
+EXTERNAL_DURATION = REGISTRY.histogram(
+    "external_request_duration_seconds", "Длительность запросов к внешним сервисам", ("service", "method")
+)
+EXTERNAL_ERRORS = REGISTRY.counter(
+    "external_request_errors_total", "Ошибки запросов к внешним сервисам", ("service", "method")
+)
+EXTERNAL_RETRIES = REGISTRY.counter(
+    "external_request_retries_total", "Повторные попытки запросов к внешним сервисам", ("service", "method")
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests_total", "Обращения к кэшам", ("cache", "result")
+)
+
+
+def track(service: str, method: str) -> Timer:
+    """Замер запроса к внешнему сервису: with track("tinkoff", "Init"): ..."""
+    return Timer(EXTERNAL_DURATION, EXTERNAL_ERRORS, (service, method))
+
+
+def cache_hit(cache: str, hit: bool):
+    """Учет попадания или промаха кэша"""
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+class MetricsMiddleware:
+    """
+    Длительность и ошибки обработчиков (регистрируется как внутренний middleware)
+    aiogram принимает любой вызываемый объект, поэтому модуль не зависит от aiogram
+    и используется также webhook-сервером.
+    """
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object else "unknown"
+        with Timer(HANDLER_DURATION, HANDLER_ERRORS, (name,)):
+            return await handler(event, data)
+
+
+async def start_metrics_server(registry: Registry = REGISTRY, port: int = None, host: str = None):
+    """
+    HTTP-сервер бота с метриками Prometheus на /metrics (METRICS_PORT, 0 - отключен)
+    По умолчанию слушает только 127.0.0.1 (METRICS_HOST): метрики без авторизации
+    не должны быть видны снаружи. Возвращает runner для остановки или None
+    """
+    from aiohttp import web
+
+    port = int(os.getenv("METRICS_PORT", 9100)) if port is None else port
+    host = host or os.getenv("METRICS_HOST", "127.0.0.1")
+    if not port:
+        return None
+
+    async def handle_metrics(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("📈 Метрики доступны на %s:%s: /metrics", host, port)
+    return runner
+
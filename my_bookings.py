@@ -0,0 +1,161 @@
+import os
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from booking_records import BookingRecord
+from google_sheet_client import USER_INDEX_TTL
+from metrics import cache_hit
+
+MYBOOKINGS_PAGE_SIZE = int(os.getenv("MYBOOKINGS_PAGE_SIZE", 5))
+# Сколько секунд страница показывается из кэша (статус оплаты может измениться)
+MYBOOKINGS_CACHE_TTL = float(os.getenv("MYBOOKINGS_CACHE_TTL", 60))
+# Сколько пользователей и страниц держать в памяти
+MYBOOKINGS_CACHE_SIZE = int(os.getenv("MYBOOKINGS_CACHE_SIZE", 2000))
+
+EMPTY_TEXT = (
+    "📋 У вас пока нет бронирований.\n\n"
+    "Используйте /booking для создания нового бронирования."
+)
+FOOTER = "\n📞 Вопросы по бронированию: @chebextreme"
+
+Page = Tuple[str, Optional[InlineKeyboardMarkup]]
+
+
+class MyBookingsCallback(CallbackData, prefix="mybk"):
+    action: str  # page - показать страницу, noop - кнопка с номером страницы
+    page: int = 0
+
+
+class BookingCursor:
+    __slots__ = ("rows", "archived", "layout", "version")
+
+    def __init__(self, rows: List[int], archived: List[int] = None, layout: int = 0):
+        """
+        Курсор пользователя: номера строк его бронирований (новые первыми) на момент /mybookings
+        Листание идет по этому снимку, поэтому новые строки в таблице не сдвигают страницы.
+        archived: id архивных бронирований в локальной копии (идут после строк листа)
+        layout: версия раскладки листа; после архивации номера строк устаревают
+        """
+        self.rows = rows
+        self.archived = archived or []
+        self.layout = layout
+        self.version = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.rows) + len(self.archived)
+
+    def pages(self, page_size: int) -> int:
+        return max(1, -(-len(self) // page_size))
+
+
+class MyBookings:
+    def __init__(self, sheets_client, page_size: int = None, cache_ttl: float = None,
+                 cache_size: int = None, booking_store=None):
+        """
+        Постраничный /mybookings
+        Со страницы читаются только ее строки листа (по индексу строк пользователя),
+        готовые страницы кэшируются, чтобы листание туда-обратно не ходило в таблицу.
+        Архивные бронирования (см. sheet_archive) читаются из локальной копии booking_store.
+        """
+        self.sheets_client = sheets_client
+        self.booking_store = booking_store
+        self.page_size = page_size or MYBOOKINGS_PAGE_SIZE
+        self.cache_ttl = MYBOOKINGS_CACHE_TTL if cache_ttl is None else cache_ttl
+        self.cache_size = cache_size or MYBOOKINGS_CACHE_SIZE
+        self.cursors: "OrderedDict[int, BookingCursor]" = OrderedDict()
+        self.pages: "OrderedDict[Tuple[int, float, int], Tuple[float, Page]]" = OrderedDict()
+
+    async def open(self, user_id: int) -> Page:
+        """Первая страница /mybookings: курсор строится заново"""
+        cursor = await self.refresh_cursor(user_id)
+        return await self.page(user_id, 0, cursor)
+
+    async def refresh_cursor(self, user_id: int) -> BookingCursor:
+        layout = self.sheets_client.layout_version
+        rows = await self.sheets_client.run(self.sheets_client.user_rows, user_id)
+        archived = self.booking_store.archived_ids(user_id) if self.booking_store else []
+        cursor = BookingCursor(sorted(rows, reverse=True), archived, layout)
+        self.cursors[user_id] = cursor
+        self.cursors.move_to_end(user_id)
+        while len(self.cursors) > self.cache_size:
+            self.cursors.popitem(last=False)
+        return cursor
+
+    async def page(self, user_id: int, page: int, cursor: BookingCursor = None, retry: bool = True) -> Page:
+        """
+        Страница бронирований пользователя (с 0)
+        Курсор живет не дольше индекса строк (USER_INDEX_TTL): после ручной правки листа
+        номера строк могут указывать на чужие бронирования.
+        """
+        cursor = cursor or self.cursors.get(user_id)
+        if (cursor is None or cursor.layout != self.sheets_client.layout_version
+                or time.monotonic() - cursor.version > USER_INDEX_TTL):
+            cursor = await self.refresh_cursor(user_id)
+        if not len(cursor):
+            return EMPTY_TEXT, None
+        page = min(max(page, 0), cursor.pages(self.page_size) - 1)
+
+        key = (user_id, cursor.version, page)
+        cached = self.pages.get(key)
+        hit = cached is not None and time.monotonic() - cached[0] < self.cache_ttl
+        cache_hit("mybookings_page", hit)
+        if hit:
+            self.pages.move_to_end(key)
+            return cached[1]
+
+        start = page * self.page_size
+        end = start + self.page_size
+        rows = cursor.rows[start:end]
+        records = await self.sheets_client.run(self.sheets_client.get_booking_rows, rows) if rows else []
+        if any(record.telegram_id != user_id for record in records):
+            # Строки листа сдвинулись: чужие записи не показываем, индекс и курсор строим заново
+            records = [record for record in records if record.telegram_id == user_id]
+            if retry:
+                self.sheets_client.reset_user_index()
+                return await self.page(user_id, page, await self.refresh_cursor(user_id), retry=False)
+        archived = cursor.archived[max(start - len(cursor.rows), 0):max(end - len(cursor.rows), 0)]
+        if archived:
+            records += self.booking_store.get_records(archived)
+        result = self.render(records, start, len(cursor)), self.keyboard(page, cursor.pages(self.page_size))
+
+        self.pages[key] = (time.monotonic(), result)
+        while len(self.pages) > self.cache_size:
+            self.pages.popitem(last=False)
+        return result
+
+    @staticmethod
+    def render(records: List[BookingRecord], start: int, total: int) -> str:
+        """Текст страницы одной склейкой"""
+        parts = [f"📋 **ВАШИ БРОНИРОВАНИЯ** ({start + 1}–{start + len(records)} из {total}):\n\n"]
+        for i, booking in enumerate(records, start + 1):
+            parts.append(
+                f"**{i}. {booking.event_name or 'Неизвестно'}**\n"
+                f"💰 {booking.price or 'Не указано'} ₽\n"
+                f"📅 {booking.booked_at or 'Не указано'}\n"
+                f"💳 {booking.payment_status or 'Не указано'}\n"
+                "---\n"
+            )
+        parts.append(FOOTER)
+        return "".join(parts)
+
+    @staticmethod
+    def keyboard(page: int, pages: int) -> Optional[InlineKeyboardMarkup]:
+        if pages <= 1:
+            return None
+        buttons = []
+        if page > 0:
+            buttons.append(InlineKeyboardButton(
+                text="◀️ Назад", callback_data=MyBookingsCallback(action="page", page=page - 1).pack()
+            ))
+        buttons.append(InlineKeyboardButton(
+            text=f"{page + 1}/{pages}", callback_data=MyBookingsCallback(action="noop", page=page).pack()
+        ))
+        if page < pages - 1:
+            buttons.append(InlineKeyboardButton(
+                text="Вперед ▶️", callback_data=MyBookingsCallback(action="page", page=page + 1).pack()
+            ))
+        return InlineKeyboardMarkup(inline_keyboard=[buttons])
@@ -0,0 +1,129 @@
+import logging
+from typing import Dict, Any
+from aiogram import Bot
+
+from send_queue import PRIORITY_PAYMENT, send_priority
+
+logger = logging.getLogger(__name__)
+
+
+async def notify_payment_status(bot: Bot, payment_data: Dict[str, Any], chat_id: int):
+    """Отправка пользователю уведомления, соответствующего статусу платежа"""
+    with send_priority(PRIORITY_PAYMENT):
+        await send_status_notification(bot, payment_data, chat_id)
+
+
+async def send_status_notification(bot: Bot, payment_data: Dict[str, Any], chat_id: int):
+    """Выбор уведомления по статусу платежа"""
+    status = payment_data.get('Status')
+
+    if status == 'CONFIRMED':
+        # Платеж подтвержден
+        await send_payment_success_notification(bot, payment_data, chat_id)
+
+    elif status == 'REJECTED':
+        # Платеж отклонен
+        await send_payment_failed_notification(bot, payment_data, chat_id)
+
+    elif status == 'AUTHORIZED':
+        # Платеж авторизован, но еще не подтвержден
+        await send_payment_authorized_notification(bot, payment_data, chat_id)
+
+    elif status == 'REFUNDED':
+        # Платеж возвращен
+        await send_payment_refunded_notification(bot, payment_data, chat_id)
+
+    elif status == 'REVERSED':
+        # Платеж отменен
+        await send_payment_reversed_notification(bot, payment_data, chat_id)
+
+
+async def send_payment_success_notification(bot: Bot, payment_data: Dict[str, Any], chat_id: int):
+    """Отправка уведомления об успешной оплате"""
+    try:
+        order_id = payment_data.get('OrderId')
+        amount = payment_data.get('Amount', 0) // 100
+
+        message = f"""
+🎉 *ОПЛАТА ПРОШЛА УСПЕШНО!*
+
+✅ Ваше бронирование подтверждено
+💰 Сумма: {amount:,} ₽
+📋 Номер заказа: {order_id}
+
+📞 *Что дальше:*
+• Мы отправим вам подробную программу мероприятия
+• За день до начала мы напомним вам о встрече
+• Если у вас есть вопросы, просто ответьте на это сообщение
+        """
+        await bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
+    except Exception as e:
+        logger.error("Ошибка отправки уведомления об успешной оплате: %s", e)
+
+async def send_payment_failed_notification(bot: Bot, payment_data: Dict[str, Any], chat_id: int):
+    """Отправка уведомления об отклоненной оплате"""
+    try:
+        order_id = payment_data.get('OrderId')
+        amount = payment_data.get('Amount', 0) // 100
+
+        message = f"""
+❌ *ОПЛАТА ОТКЛОНЕНА!*
+💰 Сумма: {amount:,} ₽
+📋 Номер заказа: {order_id}
+
+Пожалуйста, попробуйте еще раз или свяжитесь с поддержкой.
+        """
+        await bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
+    except Exception as e:
+        logger.error("Ошибка отправки уведомления об отклоненной оплате: %s", e)
+
+async def send_payment_authorized_notification(bot: Bot, payment_data: Dict[str, Any], chat_id: int):
+    """Отправка уведомления об авторизации платежа"""
+    try:
+        order_id = payment_data.get('OrderId')
+        amount = payment_data.get('Amount', 0) // 100
+
+        message = f"""
+⏳ *Платеж обрабатывается*
+💰 Сумма: {amount:,} ₽
+📋 Номер заказа: {order_id}
+
+Мы уведомим вас, когда платеж будет подтвержден.
+        """
+        await bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
+    except Exception as e:
+        logger.error("Ошибка отправки уведомления об авторизации платежа: %s", e)
+
+async def send_payment_refunded_notification(bot: Bot, payment_data: Dict[str, Any], chat_id: int):
+    """Отправка уведомления о возврате платежа"""
+    try:
+        order_id = payment_data.get('OrderId')
+        amount = payment_data.get('Amount', 0) // 100
+
+        message = f"""
+💫 *Возврат платежа выполнен*
+💰 Сумма: {amount:,} ₽
+📋 Номер заказа: {order_id}
+
+Средства скоро вернутся на ваш счет.
+        """
+        await bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
+    except Exception as e:
+        logger.error("Ошибка отправки уведомления о возврате платежа: %s", e)
+
+async def send_payment_reversed_notification(bot: Bot, payment_data: Dict[str, Any], chat_id: int):
+    """Отправка уведомления об отмене платежа"""
+    try:
+        order_id = payment_data.get('OrderId')
+        amount = payment_data.get('Amount', 0) // 100
+
+        message = f"""
+🔄 *Платеж отменен*
+💰 Сумма: {amount:,} ₽
+📋 Номер заказа: {order_id}
+
+Если у вас есть вопросы, пожалуйста, свяжитесь с поддержкой.
+        """
+        await bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
+    except Exception as e:
+        logger.error("Ошибка отправки уведомления об отмене платежа: %s", e)
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from aiogram import Bot
+
+from payment_notifications import notify_payment_status
+from send_queue import PRIORITY_PAYMENT, send_priority
+from sheets_quota import PRIORITY_WRITE
+from payment_store import PaymentStore, SHEET_STATUSES, STATUS_ORDER
+from tinkoff_payment import cancel_payment, check_payment_status
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentReconciler:
+    def __init__(self, bot: Bot, sheets_client, payment_store: PaymentStore, seat_inventory=None):
+        """
+        Фоновая сверка статусов платежей через GetState на случай потерянных webhook'ов
+        bot: бот для уведомления пользователей
+        sheets_client: клиент Google Sheets для обновления статусов оплаты
+        payment_store: локальное хранилище платежей
+        seat_inventory: учет мест (резерв снимается при отмене платежа)
+        """
+        self.bot = bot
+        self.sheets_client = sheets_client
+        self.payment_store = payment_store
+        self.seat_inventory = seat_inventory
+
+        # Настройки сверки
+        self.interval = int(os.getenv("PAYMENT_RECONCILE_INTERVAL", 60))  # секунды между проходами
+        self.min_age = timedelta(minutes=int(os.getenv("PAYMENT_RECONCILE_MIN_AGE", 10)))
+        self.max_age = timedelta(days=int(os.getenv("PAYMENT_RECONCILE_MAX_AGE_DAYS", 3)))
+        self.concurrency = int(os.getenv("PAYMENT_RECONCILE_CONCURRENCY", 5))
+        self.batch_size = int(os.getenv("PAYMENT_RECONCILE_BATCH", 100))
+
+        self.task = None
+
+    def next_check_delay(self, age: timedelta) -> timedelta:
+        """
+        Адаптивный интервал проверки: молодые платежи проверяем часто, старые редко
+        Интервал растет пропорционально возрасту платежа от 1 минуты до 6 часов.
+        """
+        delay = age / 4
+        return max(timedelta(minutes=1), min(delay, timedelta(hours=6)))
+
+    async def reconcile_once(self) -> int:
+        """Один проход сверки. Возвращает количество платежей с изменившимся статусом"""
+        payments = self.payment_store.get_pending_payments(self.min_age, self.batch_size)
+        if not payments:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_state(payment: Dict) -> Dict:
+            async with semaphore:
+                # Синхронный запрос через общий пул соединений tinkoff_payment
+                return await asyncio.to_thread(check_payment_status, payment['payment_id'])
+
+        states = await asyncio.gather(*(fetch_state(payment) for payment in payments))
+
+        now = datetime.now()
+        next_checks = {}
+        changed = []
+
+        for payment, state in zip(payments, states):
+            age = now - datetime.fromisoformat(payment['created_at'])
+
+            if state.get('success') and state.get('status') != payment['status']:
+                if self.payment_store.apply_status(payment['order_id'], payment['payment_id'], state['status']):
+                    changed.append((payment, state))
+
+            # Следующая проверка нужна и после смены статуса: промежуточный статус (AUTHORIZED и т.п.)
+            # оставляет платеж в ожидании, а финальный исключает его из выборки и без расписания
+            if age < self.max_age:
+                next_checks[payment['order_id']] = now + self.next_check_delay(age)
+            else:
+                # Слишком старый платеж: больше не опрашиваем
+                next_checks[payment['order_id']] = datetime.max
+                logger.warning("Платеж %s не оплачен за %s, сверка остановлена", payment['payment_id'], self.max_age)
+
+        self.payment_store.schedule_checks(next_checks)
+
+        if changed:
+            await self.apply_changes(changed)
+
+        logger.info("Сверка платежей: проверено %d, изменилось %d", len(payments), len(changed))
+        return len(changed)
+
+    async def apply_changes(self, changed: List):
+        """Обновление таблицы одним пакетом и уведомление пользователей"""
+        if self.seat_inventory:
+            for payment, state in changed:
+                self.seat_inventory.apply_payment_status(payment['order_id'], state['status'])
+
+        updates = [
+            (payment['chat_id'], payment['event_name'], SHEET_STATUSES[state['status']])
+            for payment, state in changed
+            if payment['chat_id'] and payment['event_name'] and state['status'] in SHEET_STATUSES
+        ]
+        if updates:
+            await self.sheets_client.run(self.sheets_client.update_payment_statuses, updates, priority=PRIORITY_WRITE)
+
+        for payment, state in changed:
+            if not payment['chat_id']:
+                continue
+
+            payment_data = {
+                'Status': state['status'],
+                'PaymentId': payment['payment_id'],
+                'OrderId': payment['order_id'],
+                'Amount': (payment['amount'] or 0) * 100,
+            }
+            await notify_payment_status(self.bot, payment_data, payment['chat_id'])
+
+    async def expire_payment(self, payload: Dict):
+        """
+        Задача планировщика: отмена платежа, не оплаченного за время жизни ссылки
+        payload: {'order_id': ...}
+        """
+        payment = self.payment_store.get_payment(payload['order_id'])
+        if not payment or not payment['payment_id']:
+            return
+
+        # Оплаченные и уже авторизованные платежи не трогаем
+        if payment['status_rank'] >= STATUS_ORDER['AUTHORIZED']:
+            return
+
+        if not await asyncio.to_thread(cancel_payment, payment['payment_id']):
+            raise Exception(f"Не удалось отменить платеж {payment['payment_id']}")
+
+        if not self.payment_store.apply_status(payment['order_id'], payment['payment_id'], 'DEADLINE_EXPIRED'):
+            return
+
+        logger.info("Платеж %s отменен по истечении срока ссылки", payment['payment_id'])
+
+        if self.seat_inventory:
+            self.seat_inventory.release(payment['order_id'])
+
+        if payment['chat_id'] and payment['event_name']:
+            await self.sheets_client.run(
+                self.sheets_client.update_payment_statuses,
+                [(payment['chat_id'], payment['event_name'], SHEET_STATUSES['DEADLINE_EXPIRED'])],
+                priority=PRIORITY_WRITE
+            )
+
+        if payment['chat_id']:
+            with send_priority(PRIORITY_PAYMENT):
+                await self.bot.send_message(
+                    chat_id=payment['chat_id'],
+                    text="⌛ Срок действия ссылки на оплату истек, бронирование отменено.\n\n"
+                         "Чтобы забронировать заново, используйте /booking"
+                )
+
+    async def run(self):
+        """Бесконечный цикл сверки"""
+        logger.info("🔄 Сверка статусов платежей запущена")
+        while True:
+            try:
+                await self.reconcile_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка сверки статусов платежей: %s", e)
+
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Запуск сверки фоновой задачей"""
+        if not self.task:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Остановка фоновой задачи"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
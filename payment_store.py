@@ -0,0 +1,201 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from booking_stats import STATS_SCHEMA, bump, stats_day, status_deltas
+from local_store import connect, ensure_columns
+
+# Порядок статусов Tinkoff: уведомление принимается, только если его статус
+# стоит дальше последнего известного. Повторы и запоздавшие статусы
+# (например, AUTHORIZED после CONFIRMED) отбрасываются.
+STATUS_ORDER = {
+    "NEW": 0,
+    "FORM_SHOWED": 1,
+    "AUTHORIZING": 2,
+    "3DS_CHECKING": 3,
+    "3DS_CHECKED": 4,
+    "AUTHORIZED": 5,
+    "CONFIRMING": 6,
+    "REVERSING": 6,
+    "CONFIRMED": 7,
+    "PARTIAL_REVERSED": 7,
+    "REVERSED": 8,
+    "REJECTED": 8,
+    "AUTH_FAIL": 8,
+    "CANCELED": 8,
+    "DEADLINE_EXPIRED": 8,
+    "REFUNDING": 9,
+    "PARTIAL_REFUNDED": 10,
+    "REFUNDED": 11,
+}
+
+# Статусы, после которых платеж больше не ожидает оплаты
+FINAL_STATUSES = {
+    "CONFIRMED", "REVERSED", "PARTIAL_REVERSED", "REJECTED", "AUTH_FAIL",
+    "CANCELED", "DEADLINE_EXPIRED", "REFUNDED", "PARTIAL_REFUNDED",
+}
+
+# Платеж ожидает оплаты, пока его статус не дошел до CONFIRMED или отказа
+PENDING_RANK_LIMIT = STATUS_ORDER["CONFIRMED"]
+
+# Статусы Tinkoff в терминах колонки "Статус оплаты" таблицы бронирований
+SHEET_STATUSES = {
+    "CONFIRMED": "Оплачено",
+    "REJECTED": "Оплата отклонена",
+    "AUTH_FAIL": "Оплата отклонена",
+    "CANCELED": "Отменено",
+    "REVERSED": "Отменено",
+    "PARTIAL_REVERSED": "Отменено",
+    "DEADLINE_EXPIRED": "Срок оплаты истек",
+    "REFUNDED": "Возврат",
+    "PARTIAL_REFUNDED": "Частичный возврат",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS payments (
+    order_id TEXT PRIMARY KEY,
+    payment_id TEXT,
+    chat_id INTEGER,
+    amount INTEGER,
+    status TEXT NOT NULL DEFAULT 'NEW',
+    status_rank INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_payment_id ON payments(payment_id);
+"""
+
+# Колонки, добавленные после первой версии схемы
+EXTRA_COLUMNS = {
+    "event_name": "TEXT",
+    "next_check_at": "TEXT",
+}
+
+
+def status_rank(status: str) -> int:
+    """Позиция статуса в цепочке; неизвестные статусы считаем начальными"""
+    return STATUS_ORDER.get(status, 0)
+
+
+def payment_key(payment_id) -> Optional[str]:
+    """PaymentId для колонки payment_id: без PaymentId - NULL (строка "None" нарушила бы уникальный индекс)"""
+    return str(payment_id) if payment_id is not None else None
+
+
+class PaymentStore:
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Локальное хранилище платежей
+        db_path: путь к файлу SQLite (по умолчанию LOCAL_DB_PATH)
+        """
+        self.conn = connect(db_path)
+        self.lock = threading.Lock()
+        self.conn.executescript(SCHEMA)
+        self.conn.executescript(STATS_SCHEMA)
+        ensure_columns(self.conn, "payments", EXTRA_COLUMNS)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_payments_pending ON payments(next_check_at) "
+            f"WHERE status_rank < {PENDING_RANK_LIMIT}"
+        )
+
+    def save_payment(self, order_id: str, chat_id: int, amount: int, event_name: str = None):
+        """Сохранение нового платежа до отправки Init (и бронирования в статистике)"""
+        now = datetime.now().isoformat()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO payments "
+                    "(order_id, chat_id, amount, event_name, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (order_id, chat_id, amount, event_name, now, now)
+                )
+                if cursor.rowcount > 0:
+                    bump(self.conn, stats_day(now), event_name, bookings=1)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def set_payment_id(self, order_id: str, payment_id: str):
+        """Привязка PaymentId, полученного от Tinkoff, к заказу"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE payments SET payment_id = ?, updated_at = ? WHERE order_id = ?",
+                (payment_key(payment_id), datetime.now().isoformat(), order_id)
+            )
+
+    def get_payment(self, order_id: str) -> Dict:
+        """Получение информации о платеже по OrderId"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM payments WHERE order_id = ?", (order_id,)
+            ).fetchone()
+        return dict(row) if row else {}
+
+    def apply_status(self, order_id: str, payment_id: str, status: str) -> bool:
+        """
+        Применение статуса из уведомления Tinkoff
+        Возвращает True, если статус новый и уведомление нужно обработать,
+        и False для повтора или устаревшего перехода.
+        """
+        rank = status_rank(status)
+        now = datetime.now().isoformat()
+
+        # Одна операция по первичному ключу: вставка или продвижение статуса вперед.
+        # Прежний статус читается в той же транзакции, чтобы обновить счетчики статистики.
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous = self.conn.execute(
+                    "SELECT status, amount, event_name, created_at FROM payments WHERE order_id = ?",
+                    (order_id,)
+                ).fetchone()
+                cursor = self.conn.execute(
+                    "INSERT INTO payments (order_id, payment_id, status, status_rank, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(order_id) DO UPDATE SET "
+                    "payment_id = COALESCE(excluded.payment_id, payments.payment_id), status = excluded.status, "
+                    "status_rank = excluded.status_rank, updated_at = excluded.updated_at "
+                    "WHERE excluded.status_rank > payments.status_rank",
+                    (order_id, payment_key(payment_id), status, rank, now, now)
+                )
+                applied = cursor.rowcount > 0
+                if applied and previous:
+                    bump(self.conn, stats_day(previous["created_at"]), previous["event_name"],
+                         **status_deltas(previous["status"], status, previous["amount"]))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+        if not applied:
+            logging.info("Пропущено повторное/устаревшее уведомление %s: %s", payment_id, status)
+        return applied
+
+    def get_pending_payments(self, min_age: timedelta, limit: int = 100) -> List[Dict]:
+        """
+        Платежи, ожидающие оплаты, у которых подошло время проверки
+        min_age: минимальный возраст платежа с момента создания
+        limit: максимальное количество платежей за один проход
+        """
+        now = datetime.now()
+        created_before = (now - min_age).isoformat()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM payments "
+                f"WHERE status_rank < {PENDING_RANK_LIMIT} AND payment_id IS NOT NULL "
+                "AND created_at <= ? AND (next_check_at IS NULL OR next_check_at <= ?) "
+                "ORDER BY next_check_at LIMIT ?",
+                (created_before, now.isoformat(), limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def schedule_checks(self, next_checks: Dict[str, datetime]):
+        """Сохранение времени следующей проверки для набора заказов"""
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE payments SET next_check_at = ? WHERE order_id = ?",
+                [(when.isoformat(), order_id) for order_id, when in next_checks.items()]
+            )
@@ -0,0 +1,291 @@
+from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+from aiogram.filters.callback_data import CallbackData
+from datetime import date, datetime, timedelta
+import logging
+from typing import Dict, Optional
+
+from knowledge_base import RENTAL_TARIFFS
+from rental_inventory import RentalInventory, OPEN_HOUR, CLOSE_HOUR, rental_price
+from sheets_quota import PRIORITY_WRITE
+
+WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+# На сколько дней вперед можно забронировать прокат
+BOOKING_HORIZON_DAYS = 7
+
+
+# Callback данные для кнопок проката
+class RentalCallback(CallbackData, prefix="rent"):
+    action: str
+    category: str = ""
+    day: int = 0  # День начала аренды (date.toordinal): кнопки не сдвигаются после полуночи
+    hour: int = 0
+    hours: int = 0
+    reservation: int = 0  # Номер брони (кнопка отмены)
+
+
+def rental_event_name(category: str, start: datetime, hours: int) -> str:
+    """Название брони в колонке "Мероприятие" таблицы (по нему же бронь находится при отмене)"""
+    end = start + timedelta(hours=hours)
+    return f"Прокат: {RENTAL_TARIFFS[category]['name']} {start.strftime('%d.%m %H:%M')}–{end.strftime('%d.%m %H:%M')}"
+
+
+def duration_label(hours: int) -> str:
+    """Подпись длительности аренды"""
+    if hours % 24 == 0:
+        days = hours // 24
+        return "Сутки" if days == 1 else f"{days} сут."
+    if hours == CLOSE_HOUR - OPEN_HOUR:
+        return "День"
+    return f"{hours} ч"
+
+
+class RentalHandler:
+    def __init__(self, sheets_client, inventory: RentalInventory):
+        self.sheets_client = sheets_client
+        self.inventory = inventory
+
+        self.categories_keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(
+                text=tariff["name"],
+                callback_data=RentalCallback(action="category", category=category).pack()
+            )]
+            for category, tariff in RENTAL_TARIFFS.items()
+            if inventory.fleet.get(category)
+        ])
+
+    def get_durations(self, category: str):
+        """Варианты длительности из тарифной сетки категории"""
+        tariff = self.inventory.tariffs()[category]
+        if "daily" in tariff:
+            return [24, 48, 72]
+        return [hours for hours, price in tariff["hourly"]]
+
+    def get_start(self, callback_data: RentalCallback) -> datetime:
+        """Время начала аренды из данных кнопки"""
+        return self.start_at(callback_data.day, callback_data.hour)
+
+    def start_at(self, day: int, hour: int) -> datetime:
+        """Время начала аренды по дню (date.toordinal) и часу"""
+        return datetime.combine(date.fromordinal(max(day, 1)), datetime.min.time()).replace(hour=hour)
+
+    async def start_rental(self, message: Message):
+        """Начало бронирования проката"""
+        await message.answer(
+            "🚴 **ПРОКАТ СНАРЯЖЕНИЯ**\n\nВыберите, что хотите взять:",
+            reply_markup=self.categories_keyboard,
+            parse_mode="Markdown"
+        )
+
+    async def handle_callback(self, callback: CallbackQuery, callback_data: RentalCallback):
+        """Обработка шагов выбора проката"""
+        action = callback_data.action
+
+        if action in ("check", "reserve") and self.get_start(callback_data) <= datetime.now():
+            await callback.answer("⏰ Это время уже прошло, выберите другое", show_alert=True)
+            return
+
+        if action == "category":
+            await self.show_days(callback, callback_data)
+        elif action == "day":
+            await self.show_hours(callback, callback_data)
+        elif action == "hour":
+            await self.show_durations(callback, callback_data)
+        elif action == "check":
+            await self.show_availability(callback, callback_data)
+        elif action == "reserve":
+            await self.reserve(callback, callback_data)
+        elif action == "cancel":
+            await self.cancel(callback, callback_data)
+        elif action == "back":
+            await callback.message.edit_text(
+                "🚴 **ПРОКАТ СНАРЯЖЕНИЯ**\n\nВыберите, что хотите взять:",
+                reply_markup=self.categories_keyboard,
+                parse_mode="Markdown"
+            )
+            await callback.answer()
+
+    async def show_days(self, callback: CallbackQuery, callback_data: RentalCallback):
+        """Выбор дня"""
+        today = datetime.now().date()
+        buttons = []
+        for offset in range(BOOKING_HORIZON_DAYS):
+            day = today + timedelta(days=offset)
+            buttons.append(InlineKeyboardButton(
+                text=f"{WEEKDAYS[day.weekday()]} {day.strftime('%d.%m')}",
+                callback_data=RentalCallback(
+                    action="day", category=callback_data.category, day=day.toordinal()
+                ).pack()
+            ))
+
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            buttons[i:i + 4] for i in range(0, len(buttons), 4)
+        ] + [[InlineKeyboardButton(text="🔙 Назад", callback_data=RentalCallback(action="back").pack())]])
+
+        await callback.message.edit_text(
+            f"📅 **{RENTAL_TARIFFS[callback_data.category]['name']}**\n\nВыберите день:",
+            reply_markup=keyboard,
+            parse_mode="Markdown"
+        )
+        await callback.answer()
+
+    async def show_hours(self, callback: CallbackQuery, callback_data: RentalCallback):
+        """Выбор времени начала"""
+        now = datetime.now()
+        buttons = []
+        for hour in range(OPEN_HOUR, CLOSE_HOUR):
+            if self.start_at(callback_data.day, hour) <= now:
+                continue
+            buttons.append(InlineKeyboardButton(
+                text=f"{hour}:00",
+                callback_data=RentalCallback(
+                    action="hour", category=callback_data.category, day=callback_data.day, hour=hour
+                ).pack()
+            ))
+
+        if not buttons:
+            await callback.answer("На сегодня прокат уже закрыт, выберите другой день", show_alert=True)
+            return
+
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            buttons[i:i + 4] for i in range(0, len(buttons), 4)
+        ])
+        await callback.message.edit_text("🕙 Выберите время начала аренды:", reply_markup=keyboard)
+        await callback.answer()
+
+    async def show_durations(self, callback: CallbackQuery, callback_data: RentalCallback):
+        """Выбор длительности"""
+        start = self.get_start(callback_data)
+        buttons = [
+            InlineKeyboardButton(
+                text=duration_label(hours),
+                callback_data=RentalCallback(
+                    action="check", category=callback_data.category,
+                    day=callback_data.day, hour=callback_data.hour, hours=hours
+                ).pack()
+            )
+            for hours in self.get_durations(callback_data.category)
+        ]
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            buttons[i:i + 4] for i in range(0, len(buttons), 4)
+        ])
+        await callback.message.edit_text(
+            f"⏱ Начало: {start.strftime('%d.%m %H:%M')}\n\nНа сколько берете?",
+            reply_markup=keyboard
+        )
+        await callback.answer()
+
+    async def show_availability(self, callback: CallbackQuery, callback_data: RentalCallback):
+        """Проверка наличия и стоимость либо ближайшие свободные слоты"""
+        category = callback_data.category
+        start = self.get_start(callback_data)
+        hours = callback_data.hours
+        name = RENTAL_TARIFFS[category]["name"]
+
+        if self.inventory.is_available(category, start, hours):
+            price = rental_price(category, start, hours, self.inventory.tariffs())
+            keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(
+                    text=f"✅ Забронировать за {price:,} ₽",
+                    callback_data=callback_data.model_copy(update={"action": "reserve"}).pack()
+                )],
+                [InlineKeyboardButton(text="🔙 Назад", callback_data=RentalCallback(action="back").pack())]
+            ])
+            await callback.message.edit_text(
+                f"🟢 **{name}** свободен\n\n"
+                f"📅 {start.strftime('%d.%m %H:%M')} • ⏱ {duration_label(hours)}\n"
+                f"💰 Стоимость: {price:,} ₽",
+                reply_markup=keyboard,
+                parse_mode="Markdown"
+            )
+            await callback.answer()
+            return
+
+        # Предлагаем ближайшие свободные интервалы той же длительности
+        suggestions = self.inventory.suggest(category, start, hours)
+        buttons = [
+            [InlineKeyboardButton(
+                text=f"{WEEKDAYS[slot.weekday()]} {slot.strftime('%d.%m %H:%M')}",
+                callback_data=RentalCallback(
+                    action="check", category=category,
+                    day=slot.date().toordinal(), hour=slot.hour, hours=hours
+                ).pack()
+            )]
+            for slot in suggestions
+        ]
+        buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data=RentalCallback(action="back").pack())])
+
+        text = f"🔴 На это время {name} уже занят."
+        text += "\n\nБлижайшие свободные варианты:" if suggestions else "\n\nВ ближайшую неделю свободных нет, напишите нам: @chebextreme"
+        await callback.message.edit_text(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons))
+        await callback.answer()
+
+    async def reserve(self, callback: CallbackQuery, callback_data: RentalCallback):
+        """Бронирование единицы снаряжения"""
+        category = callback_data.category
+        start = self.get_start(callback_data)
+        hours = callback_data.hours
+        user = callback.from_user
+
+        reservation = self.inventory.reserve(category, start, hours, user.id)
+        if not reservation:
+            await callback.answer("😔 Пока вы выбирали, это время заняли", show_alert=True)
+            await self.show_availability(callback, callback_data.model_copy(update={"action": "check"}))
+            return
+
+        name = RENTAL_TARIFFS[category]["name"]
+        end = start + timedelta(hours=hours)
+
+        # Заявка попадает в общую таблицу бронирований, где ее видят сотрудники
+        await self.sheets_client.run(self.sheets_client.add_booking, {
+            'telegram_id': user.id,
+            'username': user.username or '',
+            'full_name': user.full_name,
+            'event_name': rental_event_name(category, start, hours),
+            'price': reservation['price'],
+            'payment_status': 'Оплата при получении',
+            'notes': f"Прокат через Telegram бота, бронь #{reservation['id']}"
+        }, priority=PRIORITY_WRITE)
+        logging.info("Бронь проката #%d: %s %s %d ч", reservation['id'], category, start, hours)
+
+        await callback.message.edit_text(
+            f"🎉 **Бронь проката #{reservation['id']} принята!**\n\n"
+            f"🚴 {name}\n"
+            f"📅 {start.strftime('%d.%m %H:%M')} – {end.strftime('%d.%m %H:%M')}\n"
+            f"💰 {reservation['price']:,} ₽ (оплата при получении)\n\n"
+            "📍 ул. Ленинградская, 14\n"
+            "🪪 Залог: документ, удостоверяющий личность\n\n"
+            "📞 Вопросы: @chebextreme или +7 927 669 19 52",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(
+                text="❌ Отменить бронь",
+                callback_data=RentalCallback(action="cancel", reservation=reservation['id']).pack()
+            )]]),
+            parse_mode="Markdown"
+        )
+        await callback.answer()
+
+    async def cancel(self, callback: CallbackQuery, callback_data: RentalCallback):
+        """Отмена брони пользователем (до начала аренды)"""
+        reservation = await self.release(callback_data.reservation, callback.from_user.id)
+        if not reservation:
+            await callback.answer("Бронь уже отменена или аренда началась", show_alert=True)
+            return
+
+        await callback.message.edit_text(
+            f"🚫 Бронь проката #{reservation['id']} отменена.\n\nЗабронировать снова: /rent"
+        )
+        await callback.answer()
+
+    async def release(self, reservation_id: int, chat_id: int = None) -> Optional[Dict]:
+        """
+        Отмена брони и отметка в таблице бронирований
+        chat_id: отмена пользователем (только своей брони); без него - сотрудником, например при неявке
+        """
+        reservation = self.inventory.cancel(reservation_id, chat_id)
+        if reservation and reservation['chat_id']:
+            await self.sheets_client.run(
+                self.sheets_client.update_payment_status, reservation['chat_id'],
+                rental_event_name(reservation['category'], reservation['start'], reservation['hours']),
+                "Отменено", priority=PRIORITY_WRITE
+            )
+        return reservation
@@ -0,0 +1,227 @@
+import json
+import logging
+import math
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from knowledge_base import RENTAL_TARIFFS
+from local_store import connect
+
+logger = logging.getLogger(__name__)
+
+# Часы работы пункта проката
+OPEN_HOUR = 10
+CLOSE_HOUR = 21
+
+# Парк снаряжения по умолчанию (количество единиц в категории)
+DEFAULT_FLEET = {
+    "bike_c": 10,
+    "bike_b": 8,
+    "bike_a": 5,
+    "scooter": 6,
+    "longboard": 4,
+    "sup": 4,
+    "tent": 10,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rental_reservations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category TEXT NOT NULL,
+    item INTEGER NOT NULL,
+    start_at TEXT NOT NULL,
+    hours INTEGER NOT NULL,
+    chat_id INTEGER,
+    price INTEGER,
+    status TEXT NOT NULL DEFAULT 'active',
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_rental_active ON rental_reservations(status, start_at);
+"""
+
+
+def rental_price(category: str, start: datetime, hours: int, tariffs: Dict[str, Dict] = None) -> int:
+    """Стоимость аренды по тарифам из базы знаний (по умолчанию - встроенным RENTAL_TARIFFS)"""
+    tariff = (tariffs or RENTAL_TARIFFS)[category]
+
+    if "daily" in tariff:
+        days = math.ceil(hours / 24)
+        total = 0
+        for day in range(days):
+            weekday = (start + timedelta(days=day)).weekday()
+            total += tariff["daily"]["weekend" if weekday >= 4 else "weekday"]
+        if "discount" in tariff:
+            min_days, amount = tariff["discount"]
+            if days >= min_days:
+                total -= amount
+        return total
+
+    tiers = tariff["hourly"]
+    if hours > 24:
+        return math.ceil(hours / 24) * tiers[-1][1]
+
+    # Самый дешевый тариф, покрывающий нужное количество часов
+    return min(price for tier_hours, price in tiers if tier_hours >= hours)
+
+
+def split_by_days(start: datetime, hours: int) -> List[Tuple[int, int, int]]:
+    """Разбиение интервала на части по дням: (день, первый час, последний час + 1)"""
+    parts = []
+    current = start.replace(minute=0, second=0, microsecond=0)
+    remaining = hours
+    while remaining > 0:
+        first = current.hour
+        last = min(24, first + remaining)
+        parts.append((current.date().toordinal(), first, last))
+        remaining -= last - first
+        current = datetime.combine(current.date() + timedelta(days=1), datetime.min.time())
+    return parts
+
+
+class RentalInventory:
+    def __init__(self, fleet: Dict[str, int] = None, db_path: Optional[str] = None, knowledge=None):
+        """
+        Индекс занятости снаряжения
+        Для каждой категории и дня хранится 24 битовые маски: бит i установлен,
+        если единица i занята в этот час. Проверка интервала - AND по часам,
+        стоимость не зависит от числа единиц в парке (одна операция над маской на час).
+        knowledge: база знаний (KnowledgeBase), цены берутся из ее текущей версии
+        """
+        self.fleet = fleet or self.load_fleet()
+        self.knowledge = knowledge
+        self.conn = connect(db_path)
+        self.lock = threading.Lock()
+        self.conn.executescript(SCHEMA)
+
+        # (категория, день) -> 24 маски занятых единиц; хранятся только дни с бронями
+        self.busy: Dict[Tuple[str, int], List[int]] = {}
+        self.load_reservations()
+
+    def tariffs(self) -> Dict[str, Dict]:
+        """Действующие тарифы: из текущей версии базы знаний, без нее - встроенные"""
+        return self.knowledge.snapshot.tariffs if self.knowledge else RENTAL_TARIFFS
+
+    def load_fleet(self) -> Dict[str, int]:
+        """Состав парка из RENTAL_FLEET_FILE (JSON) или значения по умолчанию"""
+        fleet_file = os.getenv("RENTAL_FLEET_FILE")
+        if fleet_file and os.path.exists(fleet_file):
+            with open(fleet_file, encoding="utf-8") as f:
+                return json.load(f)
+        return dict(DEFAULT_FLEET)
+
+    def load_reservations(self):
+        """Восстановление индекса из активных броней, которые еще не закончились"""
+        since = (datetime.now() - timedelta(days=31)).isoformat()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT category, item, start_at, hours FROM rental_reservations "
+                "WHERE status = 'active' AND start_at >= ?",
+                (since,)
+            ).fetchall()
+        for row in rows:
+            self.mark(row["category"], row["item"], datetime.fromisoformat(row["start_at"]), row["hours"], True)
+        logger.info("Загружено броней проката: %d", len(rows))
+
+    def mark(self, category: str, item: int, start: datetime, hours: int, busy: bool):
+        """Установка или снятие занятости единицы на интервал"""
+        bit = 1 << item
+        for day, first, last in split_by_days(start, hours):
+            masks = self.busy.setdefault((category, day), [0] * 24)
+            for hour in range(first, last):
+                masks[hour] = masks[hour] | bit if busy else masks[hour] & ~bit
+            if not busy and not any(masks):
+                del self.busy[(category, day)]
+
+    def free_items(self, category: str, start: datetime, hours: int) -> int:
+        """Маска единиц категории, свободных на весь интервал"""
+        free = (1 << self.fleet.get(category, 0)) - 1
+        for day, first, last in split_by_days(start, hours):
+            masks = self.busy.get((category, day))
+            if not masks:
+                continue
+            for hour in range(first, last):
+                free &= ~masks[hour]
+                if not free:
+                    return 0
+        return free
+
+    def is_available(self, category: str, start: datetime, hours: int) -> bool:
+        """Есть ли свободная единица на весь интервал"""
+        return self.free_items(category, start, hours) != 0
+
+    def suggest(self, category: str, start: datetime, hours: int,
+                limit: int = 3, days: int = 7) -> List[datetime]:
+        """Ближайшие к запрошенному свободные начала аренды в часы работы пункта"""
+        now = datetime.now()
+        candidates = []
+        first_day = start.date()
+        for offset in range(-1, days):
+            day = first_day + timedelta(days=offset)
+            for hour in range(OPEN_HOUR, CLOSE_HOUR):
+                candidate = datetime.combine(day, datetime.min.time()).replace(hour=hour)
+                if candidate > now and candidate != start:
+                    candidates.append(candidate)
+
+        # Проверяем в порядке удаленности от желаемого времени
+        candidates.sort(key=lambda candidate: abs(candidate - start))
+        result = []
+        for candidate in candidates:
+            if self.is_available(category, candidate, hours):
+                result.append(candidate)
+                if len(result) >= limit:
+                    break
+        return sorted(result)
+
+    def reserve(self, category: str, start: datetime, hours: int, chat_id: int = None) -> Optional[Dict]:
+        """
+        Бронирование свободной единицы
+        Возвращает данные брони или None, если на интервал все занято
+        """
+        free = self.free_items(category, start, hours)
+        if not free:
+            return None
+
+        item = (free & -free).bit_length() - 1  # Младшая свободная единица
+        price = rental_price(category, start, hours, self.tariffs())
+        self.mark(category, item, start, hours, True)
+
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO rental_reservations (category, item, start_at, hours, chat_id, price, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (category, item, start.isoformat(), hours, chat_id, price, datetime.now().isoformat())
+            )
+        return {"id": cursor.lastrowid, "category": category, "item": item,
+                "start": start, "hours": hours, "price": price}
+
+    def cancel(self, reservation_id: int, chat_id: int = None) -> Optional[Dict]:
+        """
+        Отмена брони проката (пользователем или сотрудником при неявке)
+        chat_id: если передан, отменяется только бронь этого пользователя и только до начала аренды
+        Возвращает данные отмененной брони или None
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT category, item, start_at, hours, chat_id FROM rental_reservations "
+                "WHERE id = ? AND status = 'active'",
+                (reservation_id,)
+            ).fetchone()
+            if not row:
+                return None
+            start = datetime.fromisoformat(row["start_at"])
+            if chat_id is not None and (row["chat_id"] != chat_id or start <= datetime.now()):
+                return None
+            self.conn.execute("UPDATE rental_reservations SET status = 'canceled' WHERE id = ?", (reservation_id,))
+
+        self.mark(row["category"], row["item"], start, row["hours"], False)
+        logger.info("Бронь проката #%d отменена", reservation_id)
+        return {"id": reservation_id, "category": row["category"], "item": row["item"],
+                "start": start, "hours": row["hours"], "chat_id": row["chat_id"]}
+
+    def prune(self, today: date = None):
+        """Удаление из индекса прошедших дней (раз в сутки задачей планировщика rental_prune)"""
+        today_ordinal = (today or date.today()).toordinal()
+        for key in [key for key in self.busy if key[1] < today_ordinal]:
+            del self.busy[key]
@@ -0,0 +1,208 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from local_store import connect
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    run_at REAL NOT NULL,
+    payload TEXT NOT NULL,
+    job_key TEXT UNIQUE,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class JobStore:
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Таблица отложенных задач в локальной базе
+        Задачи могут добавлять и бот, и webhook-сервер; выполняет их планировщик бота.
+        """
+        self.conn = connect(db_path)
+        self.lock = threading.Lock()
+        self.conn.executescript(SCHEMA)
+
+    def add(self, kind: str, run_at: float, payload: Dict, job_key: str = None) -> int:
+        """
+        Добавление задачи. При совпадении job_key задача заменяется новой
+        Возвращает id задачи
+        """
+        with self.lock:
+            if job_key:
+                self.conn.execute("DELETE FROM scheduled_jobs WHERE job_key = ?", (job_key,))
+            cursor = self.conn.execute(
+                "INSERT INTO scheduled_jobs (kind, run_at, payload, job_key) VALUES (?, ?, ?, ?)",
+                (kind, run_at, json.dumps(payload, ensure_ascii=False), job_key)
+            )
+            return cursor.lastrowid
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        """Получение задачи по id"""
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM scheduled_jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def cancel(self, job_key: str) -> bool:
+        """Отмена задачи по ключу"""
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM scheduled_jobs WHERE job_key = ?", (job_key,))
+            return cursor.rowcount > 0
+
+    def delete(self, job_id: int):
+        """Удаление выполненной задачи"""
+        with self.lock:
+            self.conn.execute("DELETE FROM scheduled_jobs WHERE id = ?", (job_id,))
+
+    def reschedule(self, job_id: int, run_at: float):
+        """Перенос задачи после неудачной попытки"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE scheduled_jobs SET run_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (run_at, job_id)
+            )
+
+    def load_after(self, last_id: int):
+        """Сроки задач с id больше last_id (для загрузки при старте и подхвата новых)"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT id, run_at FROM scheduled_jobs WHERE id > ? ORDER BY id", (last_id,)
+            ).fetchall()
+
+
+class Scheduler:
+    def __init__(self, job_store: JobStore):
+        """
+        Планировщик отложенных задач на куче сроков
+        В памяти хранится только пара (время, id) на задачу, данные задачи читаются
+        из таблицы в момент выполнения, поэтому отмена сводится к удалению строки.
+        """
+        self.job_store = job_store
+        self.handlers: Dict[str, Callable[[Dict], Awaitable[None]]] = {}
+        self.heap = []
+        self.last_loaded_id = 0
+        self.running = set()
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+        self.poll_interval = int(os.getenv("SCHEDULER_POLL_INTERVAL", 30))
+        self.max_attempts = int(os.getenv("SCHEDULER_MAX_ATTEMPTS", 5))
+        self.retry_delay = int(os.getenv("SCHEDULER_RETRY_DELAY", 60))
+        self.semaphore = asyncio.Semaphore(int(os.getenv("SCHEDULER_CONCURRENCY", 10)))
+
+    def register(self, kind: str, handler: Callable[[Dict], Awaitable[None]]):
+        """Регистрация обработчика для типа задачи"""
+        self.handlers[kind] = handler
+
+    def schedule(self, kind: str, run_at: float, payload: Dict, job_key: str = None) -> int:
+        """
+        Планирование задачи
+        run_at: время выполнения (unix timestamp)
+        job_key: ключ для замены или отмены задачи
+        """
+        job_id = self.job_store.add(kind, run_at, payload, job_key)
+        self.push(job_id, run_at)
+        return job_id
+
+    def cancel(self, job_key: str) -> bool:
+        """Отмена задачи по ключу (запись в куче отбросится при срабатывании)"""
+        return self.job_store.cancel(job_key)
+
+    def push(self, job_id: int, run_at: float):
+        """Добавление срока в кучу с пробуждением цикла, если срок стал ближайшим"""
+        heapq.heappush(self.heap, (run_at, job_id))
+        if self.heap[0][1] == job_id:
+            self.wakeup.set()
+
+    def load_new(self):
+        """Подхват задач, добавленных в таблицу (после рестарта или другим процессом)"""
+        rows = self.job_store.load_after(self.last_loaded_id)
+        for row in rows:
+            heapq.heappush(self.heap, (row["run_at"], row["id"]))
+            self.last_loaded_id = row["id"]
+        if rows:
+            logger.debug("Загружено задач: %d", len(rows))
+
+    async def run_job(self, job_id: int):
+        """Выполнение одной задачи"""
+        try:
+            async with self.semaphore:
+                job = self.job_store.get(job_id)
+                if not job:
+                    return  # Задача отменена или уже выполнена
+
+                handler = self.handlers.get(job["kind"])
+                if not handler:
+                    logger.error("Нет обработчика для задачи %s", job['kind'])
+                    self.job_store.delete(job_id)
+                    return
+
+                try:
+                    await handler(json.loads(job["payload"]))
+                    self.job_store.delete(job_id)
+
+                except Exception as e:
+                    logger.error("Ошибка выполнения задачи %s #%s: %s", job['kind'], job_id, e)
+                    if job["attempts"] + 1 >= self.max_attempts:
+                        self.job_store.delete(job_id)
+                        return
+
+                    # Повтор с растущей задержкой
+                    run_at = time.time() + self.retry_delay * 2 ** job["attempts"]
+                    self.job_store.reschedule(job_id, run_at)
+                    self.push(job_id, run_at)
+        finally:
+            self.running.discard(job_id)
+
+    async def run(self):
+        """Основной цикл планировщика"""
+        self.load_new()
+        logger.info("⏰ Планировщик запущен, задач в очереди: %d", len(self.heap))
+
+        while True:
+            now = time.time()
+            while self.heap and self.heap[0][0] <= now:
+                run_at, job_id = heapq.heappop(self.heap)
+                if job_id in self.running:
+                    continue
+                job = self.job_store.get(job_id)
+                if not job or job["run_at"] > now:
+                    continue  # Отменена или перенесена (новый срок уже в куче)
+                self.running.add(job_id)
+                asyncio.create_task(self.run_job(job_id))
+
+            timeout = self.poll_interval
+            if self.heap:
+                timeout = min(timeout, max(self.heap[0][0] - time.time(), 0))
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            self.load_new()
+
+    def start(self):
+        """Запуск планировщика фоновой задачей"""
+        if not self.task:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Остановка планировщика (задачи останутся в таблице до следующего запуска)"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
@@ -0,0 +1,139 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+from local_store import connect
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS event_seats (
+    event_id TEXT PRIMARY KEY,
+    capacity INTEGER NOT NULL,
+    taken INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS seat_holds (
+    hold_id TEXT PRIMARY KEY,
+    event_id TEXT NOT NULL,
+    chat_id INTEGER,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+# Статусы платежа, при которых место освобождается
+RELEASE_STATUSES = {
+    "REJECTED", "AUTH_FAIL", "CANCELED", "DEADLINE_EXPIRED",
+    "REVERSED", "PARTIAL_REVERSED", "REFUNDED",
+}
+
+
+class SeatInventory:
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Учет мест на мероприятиях
+        Счетчик занятых мест меняется одним условным UPDATE внутри транзакции SQLite,
+        поэтому база сама сериализует конкурентные брони из бота и webhook-сервера.
+        """
+        self.conn = connect(db_path)
+        self.lock = threading.Lock()
+        self.conn.executescript(SCHEMA)
+
+    def sync_events(self, events: Dict[str, Dict]):
+        """Регистрация вместимости мероприятий (занятые места сохраняются)"""
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO event_seats (event_id, capacity) VALUES (?, ?) "
+                "ON CONFLICT(event_id) DO UPDATE SET capacity = excluded.capacity",
+                [(event_id, event['capacity']) for event_id, event in events.items() if 'capacity' in event]
+            )
+
+    def remaining(self, event_id: str) -> Optional[int]:
+        """Количество свободных мест (None, если вместимость не ограничена)"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT capacity - taken FROM event_seats WHERE event_id = ?", (event_id,)
+            ).fetchone()
+        return max(row[0], 0) if row else None
+
+    def hold(self, event_id: str, hold_id: str, chat_id: int = None) -> bool:
+        """
+        Резервирование места до оплаты
+        hold_id: идентификатор резерва (OrderId платежа)
+        Возвращает False, если мест не осталось
+        """
+        now = datetime.now().isoformat()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self.conn.execute(
+                    "UPDATE event_seats SET taken = taken + 1 WHERE event_id = ? AND taken < capacity",
+                    (event_id,)
+                )
+                if cursor.rowcount == 0:
+                    unlimited = self.conn.execute(
+                        "SELECT 1 FROM event_seats WHERE event_id = ?", (event_id,)
+                    ).fetchone() is None
+                    self.conn.execute("ROLLBACK")
+                    return unlimited
+
+                self.conn.execute(
+                    "INSERT INTO seat_holds (hold_id, event_id, chat_id, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, 'held', ?, ?)",
+                    (hold_id, event_id, chat_id, now, now)
+                )
+                self.conn.execute("COMMIT")
+                return True
+
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def confirm(self, hold_id: str) -> bool:
+        """Подтверждение резерва после оплаты"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE seat_holds SET status = 'confirmed', updated_at = ? "
+                "WHERE hold_id = ? AND status = 'held'",
+                (datetime.now().isoformat(), hold_id)
+            )
+            return cursor.rowcount > 0
+
+    def release(self, hold_id: str) -> bool:
+        """Освобождение места (отмена, истекшая ссылка, отказ или возврат)"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT event_id FROM seat_holds WHERE hold_id = ? AND status IN ('held', 'confirmed')",
+                    (hold_id,)
+                ).fetchone()
+                if not row:
+                    self.conn.execute("ROLLBACK")
+                    return False
+
+                self.conn.execute(
+                    "UPDATE seat_holds SET status = 'released', updated_at = ? WHERE hold_id = ?",
+                    (datetime.now().isoformat(), hold_id)
+                )
+                self.conn.execute(
+                    "UPDATE event_seats SET taken = taken - 1 WHERE event_id = ? AND taken > 0",
+                    (row["event_id"],)
+                )
+                self.conn.execute("COMMIT")
+
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+        logger.info("Место освобождено: резерв %s", hold_id)
+        return True
+
+    def apply_payment_status(self, order_id: str, status: str):
+        """Подтверждение или освобождение места по новому статусу платежа"""
+        if status == "CONFIRMED":
+            self.confirm(order_id)
+        elif status in RELEASE_STATUSES:
+            self.release(order_id)
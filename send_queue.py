@@ -0,0 +1,196 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+from metrics import EXTERNAL_RETRIES
+from tracing import detached_task, span
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты исходящих сообщений (меньше - раньше)
+PRIORITY_PAYMENT = 0
+PRIORITY_REPLY = 1
+PRIORITY_REMINDER = 2
+PRIORITY_BROADCAST = 3
+
+# Методы Telegram API, на которые распространяются лимиты отправки сообщений
+LIMITED_METHODS = {
+    "SendMessage", "EditMessageText", "SendDocument", "SendPhoto",
+    "CopyMessage", "ForwardMessage",
+}
+
+# Приоритет отправок в текущем контексте (ответы в хендлерах - PRIORITY_REPLY)
+current_priority: ContextVar[int] = ContextVar("send_priority", default=PRIORITY_REPLY)
+
+
+@contextmanager
+def send_priority(priority: int):
+    """Установка приоритета для всех отправок внутри блока"""
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class SendRateLimiter:
+    def __init__(self, global_rate: float = None, chat_interval: float = None):
+        """
+        Планировщик исходящих сообщений с лимитами Telegram
+        global_rate: сообщений в секунду на весь бот (токен-бакет)
+        chat_interval: минимальный интервал между сообщениями в один чат, секунды
+        """
+        self.global_rate = global_rate or float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+        self.chat_interval = chat_interval or float(os.getenv("TELEGRAM_CHAT_INTERVAL", 1))
+        self.burst = self.global_rate
+
+        self.tokens = self.burst
+        self.last_refill = time.monotonic()
+        self.chat_ready_at: Dict[int, float] = {}
+
+        self.waiters = []
+        self.counter = itertools.count()
+        self.wakeup = None
+        self.task = None
+        self.loop = None
+
+    def queue_depth(self) -> int:
+        """Количество отправок, ожидающих разрешения"""
+        return len(self.waiters)
+
+    def ensure_running(self):
+        """Запуск цикла выдачи разрешений в текущем event loop"""
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.loop is not loop:
+            self.loop = loop
+            self.wakeup = asyncio.Event()
+            self.waiters = []
+            # Цикл переживает отправку, которая его запустила, и не должен входить в ее трассу
+            self.task = detached_task(self.run())
+
+    async def acquire(self, chat_id, priority: int = PRIORITY_REPLY):
+        """Ожидание разрешения на отправку сообщения в чат"""
+        self.ensure_running()
+        future = self.loop.create_future()
+        heapq.heappush(self.waiters, (priority, next(self.counter), chat_id, future))
+        self.wakeup.set()
+        await future
+
+    def penalize(self, chat_id, retry_after: float):
+        """
+        Учет ответа 429: пауза только для этого чата
+        Остальные чаты продолжают получать сообщения в пределах общего токен-бакета.
+        """
+        resume_at = time.monotonic() + retry_after
+        self.chat_ready_at[chat_id] = max(self.chat_ready_at.get(chat_id, 0), resume_at)
+        logger.warning("Telegram попросил подождать %s с (чат %s)", retry_after, chat_id)
+
+    def refill(self, now: float):
+        """Пополнение токен-бакета"""
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.global_rate)
+        self.last_refill = now
+
+    def prune_chats(self, now: float):
+        """Удаление устаревших отметок о чатах, чтобы словарь не рос бесконечно"""
+        if len(self.chat_ready_at) > 10000:
+            self.chat_ready_at = {
+                chat_id: ready_at for chat_id, ready_at in self.chat_ready_at.items() if ready_at > now
+            }
+
+    async def run(self):
+        """Выдача разрешений в порядке приоритета с учетом глобального и початового лимитов"""
+        while True:
+            if not self.waiters:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            self.refill(now)
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.global_rate)
+                continue
+
+            # Ищем самое приоритетное ожидание, чат которого готов принять сообщение
+            deferred = []
+            granted = False
+            while self.waiters:
+                item = heapq.heappop(self.waiters)
+                future = item[3]
+                if future.done():
+                    continue  # Отправитель перестал ждать
+                if self.chat_ready_at.get(item[2], 0) > now:
+                    deferred.append(item)
+                    continue
+
+                self.tokens -= 1
+                self.chat_ready_at[item[2]] = now + self.chat_interval
+                future.set_result(None)
+                granted = True
+                break
+
+            for item in deferred:
+                heapq.heappush(self.waiters, item)
+
+            if not granted and deferred:
+                # Все ожидающие чаты на паузе: ждем ближайший или новое сообщение
+                nearest = min(self.chat_ready_at.get(item[2], 0) for item in deferred)
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), max(nearest - now, 0))
+                except asyncio.TimeoutError:
+                    pass
+
+            self.prune_chats(now)
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    def __init__(self, limiter: SendRateLimiter, max_retries: int = 3):
+        """
+        Middleware сессии бота: все отправки сообщений проходят через лимитер,
+        ответы 429 обрабатываются повтором после retry_after
+        """
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if type(method).__name__ not in LIMITED_METHODS:
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        priority = current_priority.get()
+
+        with span(f"telegram.{type(method).__name__}", chat_id=chat_id or 0, priority=priority):
+            for attempt in range(self.max_retries + 1):
+                await self.limiter.acquire(chat_id, priority)
+                try:
+                    return await make_request(bot, method)
+                except TelegramRetryAfter as e:
+                    self.limiter.penalize(chat_id, e.retry_after)
+                    if attempt == self.max_retries:
+                        raise
+                    EXTERNAL_RETRIES.inc("telegram", type(method).__name__)
+
+
+def setup_rate_limit(bot: Bot, limiter: SendRateLimiter = None) -> SendRateLimiter:
+    """Подключение лимитера к сессии бота"""
+    limiter = limiter or SendRateLimiter()
+    bot.session.middleware(RateLimitMiddleware(limiter))
+    return limiter
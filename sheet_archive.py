@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from booking_records import FIELDS, HEADERS, BookingRecord, BookingTable
+from booking_store import BookingStore, booked_on
+from sheets_quota import PRIORITY_BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+# Часы между проходами архивации (0 - только вручную, командой /archive)
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("SHEETS_ARCHIVE_INTERVAL_HOURS", 24))
+# Через сколько дней после начала мероприятия его бронирования уходят в архив
+ARCHIVE_GRACE_DAYS = int(os.getenv("SHEETS_ARCHIVE_GRACE_DAYS", 14))
+# Бронирования старше этого срока уходят в архив, даже если мероприятия уже нет в каталоге
+ARCHIVE_MAX_AGE_DAYS = int(os.getenv("SHEETS_ARCHIVE_MAX_AGE_DAYS", 365))
+
+ARCHIVE_SHEET = "Архив {season}"
+INDEX_SHEET = "Архив"
+SEASON = timedelta(days=365)
+# Колонки, по которым строка архива сверяется с бронированием основного листа
+ARCHIVE_KEY = tuple(FIELDS.index(field) for field in ("booked_at", "telegram_id", "event_name"))
+INDEX_HEADERS = ["Сезон", "Лист", "Мероприятие", "Бронирований", "Оплачено", "Выручка, ₽", "Обновлено"]
+
+
+def parse_iso(value) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def event_starts(events: Dict[str, Dict]) -> Dict[str, date]:
+    """Дата начала мероприятия по названию (так мероприятие записано в колонке листа)"""
+    starts = {}
+    for event in events.values():
+        start = parse_iso(event.get("start_date", ""))
+        if start and event.get("name"):
+            starts[event["name"]] = start
+    return starts
+
+
+def plan_archive(table: BookingTable, starts: Dict[str, date], today: date = None,
+                 grace_days: int = None, max_age_days: int = None) -> Dict[int, List[int]]:
+    """
+    Какие строки листа перенести в архив: {сезон: позиции строк в таблице}
+    Бронирование уходит в архив, если мероприятие, на которое оно сделано, закончилось
+    (дата начала из каталога плюс grace_days прошла, а бронь сделана в течение года до начала:
+    названия мероприятий повторяются из сезона в сезон), или если бронированию больше max_age_days.
+    Сезон - год мероприятия или, если дата мероприятия неизвестна, год бронирования.
+    Строки с нераспознанной датой остаются на листе.
+    """
+    today = today or date.today()
+    grace = timedelta(days=ARCHIVE_GRACE_DAYS if grace_days is None else grace_days)
+    oldest = today - timedelta(days=ARCHIVE_MAX_AGE_DAYS if max_age_days is None else max_age_days)
+
+    plan: Dict[int, List[int]] = {}
+    events = table.columns["event_name"]
+    for i, booked_at in enumerate(table.columns["booked_at"]):
+        booked = parse_iso(booked_on(booked_at) or "")
+        if booked is None:
+            continue
+        start = starts.get(events[i])
+        if start and start - SEASON < booked <= start and start + grace < today:
+            plan.setdefault(start.year, []).append(i)
+        elif booked < oldest:
+            plan.setdefault(booked.year, []).append(i)
+    return plan
+
+
+def archive_key(values: List) -> tuple:
+    """Ключ строки для сверки с архивом: дата бронирования, Telegram ID, мероприятие"""
+    return tuple(str(values[i]) if i < len(values) and values[i] is not None else "" for i in ARCHIVE_KEY)
+
+
+def not_archived(records: List[BookingRecord], archive_rows: List[List]) -> List[BookingRecord]:
+    """
+    Бронирования, которых еще нет среди строк листа архива
+    Одинаковые строки считаются поштучно: две одинаковые брони и одна копия в архиве - одна к переносу.
+    """
+    present = Counter(archive_key(row) for row in archive_rows)
+    missing = []
+    for record in records:
+        key = archive_key(record.to_row())
+        if present[key]:
+            present[key] -= 1
+        else:
+            missing.append(record)
+    return missing
+
+
+def row_runs(rows: List[int]) -> List[List[int]]:
+    """Непрерывные диапазоны номеров строк [начало, конец], от нижних к верхним (для удаления)"""
+    runs: List[List[int]] = []
+    for row in sorted(rows):
+        if runs and runs[-1][1] == row - 1:
+            runs[-1][1] = row
+        else:
+            runs.append([row, row])
+    return runs[::-1]
+
+
+class SheetArchiver:
+    def __init__(self, sheets_client, catalog, booking_store: BookingStore):
+        """
+        Перенос бронирований прошедших мероприятий с листа "Бронирования" на листы "Архив <сезон>"
+        Основной лист держит только актуальные бронирования, поэтому все его чтения
+        (индекс пользователей, статусы оплаты) не растут вместе с историей. Лист "Архив" -
+        сводка по сезонам и мероприятиям, а поиск архивных бронирований пользователя идет
+        по локальной копии (BookingStore), а не чтением листов архива.
+        sheets_client: клиент Google Sheets
+        catalog: каталог мероприятий (даты начала)
+        booking_store: локальная копия бронирований
+        """
+        self.sheets_client = sheets_client
+        self.catalog = catalog
+        self.booking_store = booking_store
+        self.interval = ARCHIVE_INTERVAL_HOURS * 3600
+        self.task = None
+
+    def archive_once(self, today: date = None) -> Dict[int, int]:
+        """
+        Один проход архивации (блокирующий, для GoogleSheetsClient.run)
+        Проход можно повторять: если прошлый скопировал строки в архив, но не удалил их
+        с основного листа, уже скопированные строки повторно не добавляются.
+        Возвращает {сезон: перенесено строк}
+        """
+        client = self.sheets_client
+        with client.rows_lock:
+            table = client.load_table()
+            plan = plan_archive(table, event_starts(self.catalog.snapshot.events), today)
+            if not plan:
+                return {}
+
+            # Лист могли править вручную после чтения: строки проверяются по колонке Telegram ID
+            column = client.quota.read("col_values", client.sheet.col_values,
+                                       client.column_map.column("telegram_id"))[1:]
+            column += [""] * (len(table) - len(column))
+            if column[:len(table)] != list(table.columns["telegram_id"]):
+                logger.warning("⚠️ Лист бронирований изменился во время архивации, перенос отложен")
+                return {}
+
+            archived = {}
+            for season, positions in sorted(plan.items()):
+                records = [table.record(i) for i in positions]
+                title = ARCHIVE_SHEET.format(season=season)
+                worksheet = self.worksheet(title, len(HEADERS), HEADERS)
+                archive_rows = client.quota.read("get_all_values", worksheet.get_all_values)[1:]
+                missing = not_archived(records, archive_rows)
+                if len(missing) < len(records):
+                    logger.info("🗄 %s: %d строк уже в архиве, добавляются только остальные",
+                                title, len(records) - len(missing))
+                if missing:
+                    client.quota.write("append_rows", worksheet.append_rows,
+                                       [record.to_row() for record in missing], rows=len(missing))
+                archived[title] = records
+
+            # Все удаления одним запросом, снизу вверх, чтобы номера оставшихся диапазонов не сдвигались
+            rows = [i + 2 for positions in plan.values() for i in positions]
+            requests = [
+                {"deleteDimension": {"range": {
+                    "sheetId": client.sheet.id, "dimension": "ROWS", "startIndex": start - 1, "endIndex": end,
+                }}}
+                for start, end in row_runs(rows)
+            ]
+            client.quota.write("batch_update", client.spreadsheet.batch_update, {"requests": requests},
+                               requests=len(requests))
+            client.user_index = None
+            client.layout_version += 1
+
+        # Локальная копия отмечается только после удаления с основного листа,
+        # иначе /mybookings показал бы бронирование дважды
+        for title, records in archived.items():
+            self.booking_store.mark_archived(records, title)
+        self.update_index()
+        moved = {season: len(positions) for season, positions in sorted(plan.items())}
+        logger.info("🗄 Перенесено в архив: %s", ", ".join(f"{season}: {count}" for season, count in moved.items()))
+        return moved
+
+    def worksheet(self, title: str, cols: int, headers: Optional[List[str]] = None, rows: int = 1):
+        """Лист архива; создается (с заголовком headers) и растет по мере добавления строк"""
+        import gspread
+
+        client = self.sheets_client
+        try:
+            return client.worksheet(title)
+        except gspread.WorksheetNotFound:
+            worksheet = client.quota.write(
+                "add_worksheet", lambda: client.spreadsheet.add_worksheet(title=title, rows=rows, cols=cols)
+            )
+            if headers:
+                client.quota.write("append_row", worksheet.append_row, headers)
+            return worksheet
+
+    def update_index(self):
+        """Лист "Архив": сводка по листам архива, собирается из локальной копии"""
+        updated = datetime.now().strftime("%d.%m.%Y %H:%M")
+        values = [INDEX_HEADERS] + [
+            [sheet.rpartition(" ")[2], sheet, event_name, count, paid or 0, revenue or 0, updated]
+            for sheet, event_name, count, paid, revenue in self.booking_store.archive_summary()
+        ]
+        worksheet = self.worksheet(INDEX_SHEET, len(INDEX_HEADERS), rows=len(values))
+        quota = self.sheets_client.quota
+        quota.write("clear", worksheet.clear)
+        quota.write("update", worksheet.update, values, "A1", rows=len(values))
+
+    async def run(self):
+        """Периодическая архивация"""
+        logger.info("🗄 Архивация листа бронирований запущена")
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sheets_client.run(self.archive_once, priority=PRIORITY_BACKGROUND)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка архивации бронирований: %s", e)
+
+    def start(self):
+        """Запуск архивации фоновой задачей (если задан интервал)"""
+        if not self.task and self.interval > 0:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Остановка фоновой задачи"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
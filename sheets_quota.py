@@ -0,0 +1,315 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Optional
+
+from metrics import EXTERNAL_RETRIES, REGISTRY, track
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты запросов к Google Sheets (меньше - раньше)
+PRIORITY_WRITE = 0       # запись бронирований и статусов оплаты
+PRIORITY_READ = 1        # чтения для ответа пользователю
+PRIORITY_BACKGROUND = 2  # фоновые перезагрузки каталога и базы знаний
+
+# Квоты Sheets API на пользователя (сервисный аккаунт) в минуту, отдельно для чтения и записи
+SHEETS_READS_PER_MINUTE = int(os.getenv("SHEETS_READS_PER_MINUTE", 60))
+SHEETS_WRITES_PER_MINUTE = int(os.getenv("SHEETS_WRITES_PER_MINUTE", 60))
+# Сколько запросов можно отправить подряд, прежде чем включится равномерный темп
+# (0 - вся минутная квота: так Google сам пополняет квоту)
+SHEETS_BURST = int(os.getenv("SHEETS_BURST", 0))
+# Доля минутной квоты, которую фоновые запросы не трогают (запас для пользователей)
+SHEETS_BACKGROUND_RESERVE = float(os.getenv("SHEETS_BACKGROUND_RESERVE", 0.25))
+# Одновременных запросов к API (остальные ждут, не занимая лишних соединений)
+SHEETS_MAX_IN_FLIGHT = int(os.getenv("SHEETS_MAX_IN_FLIGHT", 6))
+# Потоки для блокирующих вызовов gspread: ожидание квоты не должно занимать общий пул
+# asyncio.to_thread (на одном ядре в нем 5 потоков, и там же запросы к Tinkoff).
+# У каждого приоритета свой пул, чтобы чтения, ждущие квоты, не задерживали запись бронирований
+SHEETS_THREADS = int(os.getenv("SHEETS_THREADS", 16))
+LANE_THREADS = {
+    PRIORITY_WRITE: max(4, SHEETS_THREADS // 2),
+    PRIORITY_READ: SHEETS_THREADS,
+    PRIORITY_BACKGROUND: 2,
+}
+# Повторы при 429 и ошибках сервера: экспоненциальная задержка со случайным разбросом
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", 5))
+SHEETS_RETRY_BASE = float(os.getenv("SHEETS_RETRY_BASE", 1))
+SHEETS_RETRY_CAP = float(os.getenv("SHEETS_RETRY_CAP", 32))
+
+RETRY_CODES = {429, 500, 502, 503, 504}
+# Запись повторяется только после 429: ошибка сервера могла прийти уже после добавления строки,
+# и повтор append_row продублировал бы бронирование
+WRITE_RETRY_CODES = {429}
+WINDOW = 60.0
+
+# Приоритет работы, выполняемой в потоке очереди (см. SheetsScheduler.run): его наследуют чтения внутри нее
+LANE = contextvars.ContextVar("sheets_lane", default=PRIORITY_READ)
+
+COALESCED_READS = REGISTRY.counter(
+    "sheets_reads_coalesced_total", "Чтения Google Sheets, объединенные с уже выполняющимся", ("method",)
+)
+
+
+def retry_delay(attempt: int, base: float = None, cap: float = None) -> float:
+    """Задержка перед повтором: случайная в пределах экспоненциально растущего окна (full jitter)"""
+    base = SHEETS_RETRY_BASE if base is None else base
+    cap = SHEETS_RETRY_CAP if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class Quota:
+    __slots__ = ("limit", "rate", "burst", "tokens", "updated", "sent", "paused_until")
+
+    def __init__(self, limit: int, burst: int):
+        """
+        Минутная квота одного вида запросов
+        Скользящее окно повторяет учет Google (не больше limit запросов за 60 секунд),
+        токен-бакет с темпом limit/60 в секунду не дает выбрать квоту одним залпом.
+        """
+        self.limit = limit
+        self.rate = limit / WINDOW
+        self.burst = max(1, min(burst or limit, limit))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.sent: deque = deque()
+        self.paused_until = 0.0
+
+    def refresh(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        while self.sent and self.sent[0] <= now - WINDOW:
+            self.sent.popleft()
+
+    def headroom(self) -> int:
+        """Сколько запросов еще можно отправить в текущем минутном окне"""
+        return self.limit - len(self.sent)
+
+    def wait_time(self, now: float, reserve: int = 0) -> float:
+        """Через сколько секунд можно отправить запрос (0 - сейчас); reserve - запас, который не трогать"""
+        wait = max(self.paused_until - now, 0.0, (1 - self.tokens) / self.rate)
+        excess = len(self.sent) + reserve - self.limit + 1
+        if excess > 0:
+            wait = max(wait, self.sent[min(excess, len(self.sent)) - 1] + WINDOW - now)
+        return wait
+
+    def take(self, now: float):
+        self.tokens -= 1
+        self.sent.append(now)
+
+    def pause(self, now: float, delay: float):
+        """Google ответил 429: локальный учет разошелся с настоящим, ждем и начинаем с пустого бакета"""
+        self.paused_until = max(self.paused_until, now + delay)
+        self.tokens = 0.0
+
+
+class Flight:
+    __slots__ = ("future", "generation")
+
+    def __init__(self):
+        self.future: Future = Future()
+        # Номер записи на момент отправки запроса (None - запрос еще ждет в очереди)
+        self.generation: Optional[int] = None
+
+
+class SheetsScheduler:
+    def __init__(self, reads_per_minute: int = None, writes_per_minute: int = None,
+                 max_in_flight: int = None, max_retries: int = None):
+        """
+        Единая очередь запросов к Google Sheets с учетом квот API
+        Вызовы gspread синхронные и выполняются в потоках (asyncio.to_thread), поэтому очередь
+        построена на threading.Condition: поток ждет разрешения, а разрешения выдаются
+        по приоритету - запись раньше чтения, пользовательские чтения раньше фоновых.
+        Одинаковые чтения, идущие одновременно, выполняются одним запросом.
+        """
+        self.quotas = {
+            "read": Quota(reads_per_minute or SHEETS_READS_PER_MINUTE, SHEETS_BURST),
+            "write": Quota(writes_per_minute or SHEETS_WRITES_PER_MINUTE, SHEETS_BURST),
+        }
+        self.max_in_flight = max_in_flight or SHEETS_MAX_IN_FLIGHT
+        self.max_retries = SHEETS_MAX_RETRIES if max_retries is None else max_retries
+
+        self.condition = threading.Condition()
+        self.waiting = []
+        self.counter = itertools.count()
+        self.in_flight = 0
+        self.flights: Dict[Hashable, Flight] = {}
+        # Счетчик завершенных записей: к чтению, отправленному до записи, новые читатели не присоединяются
+        self.write_generation = 0
+        self.executors = {
+            priority: ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"sheets-{priority}")
+            for priority, threads in LANE_THREADS.items()
+        }
+
+    async def run(self, func: Callable, *args, priority: int = PRIORITY_READ):
+        """
+        Блокирующая работа с таблицей (методы GoogleSheetsClient и т.п.) в потоках очереди
+        Как asyncio.to_thread, но в отдельном пуле своего приоритета: запрос, ждущий квоты,
+        не задерживает ни остальные блокирующие вызовы бота, ни работу с более высоким приоритетом.
+        Чтения внутри func получают приоритет priority.
+        """
+        context = contextvars.copy_context()
+        context.run(LANE.set, priority)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executors[priority], functools.partial(context.run, func, *args)
+        )
+
+    def headroom(self) -> Dict[str, int]:
+        """Запас квоты в текущем минутном окне: {"read": ..., "write": ...}"""
+        now = time.monotonic()
+        with self.condition:
+            for quota in self.quotas.values():
+                quota.refresh(now)
+            return {kind: quota.headroom() for kind, quota in self.quotas.items()}
+
+    def queue_depth(self) -> int:
+        """Запросы, ожидающие квоты или свободного слота"""
+        return len(self.waiting)
+
+    def describe(self) -> str:
+        headroom = self.headroom()
+        return (
+            f"чтение {headroom['read']}/{self.quotas['read'].limit}, "
+            f"запись {headroom['write']}/{self.quotas['write'].limit} в минуту, "
+            f"в очереди {self.queue_depth()}, выполняется {self.in_flight}"
+        )
+
+    def dispatch(self, now: float) -> Optional[float]:
+        """
+        Выдача разрешений ожидающим по приоритету (под self.condition)
+        Возвращает, через сколько секунд проверить снова (None - ждать освобождения слота).
+        """
+        for quota in self.quotas.values():
+            quota.refresh(now)
+
+        granted = False
+        blocked = set()
+        recheck = None
+        for ticket in sorted(self.waiting):
+            priority, _, kind, _ = ticket
+            if self.in_flight >= self.max_in_flight:
+                break
+            if kind in blocked:
+                continue
+            quota = self.quotas[kind]
+            reserve = int(quota.limit * SHEETS_BACKGROUND_RESERVE) if priority >= PRIORITY_BACKGROUND else 0
+            wait = quota.wait_time(now, reserve)
+            if wait > 0:
+                # Более поздние запросы того же вида не обгоняют ожидающий
+                if priority < PRIORITY_BACKGROUND:
+                    blocked.add(kind)
+                recheck = wait if recheck is None else min(recheck, wait)
+                continue
+            quota.take(now)
+            ticket[3] = True
+            self.in_flight += 1
+            granted = True
+
+        if granted:
+            self.waiting = [ticket for ticket in self.waiting if not ticket[3]]
+            heapq.heapify(self.waiting)
+            self.condition.notify_all()
+        return recheck
+
+    def acquire(self, kind: str, priority: int):
+        """Ожидание разрешения на один запрос вида kind ("read" или "write")"""
+        ticket = [priority, next(self.counter), kind, False]
+        with self.condition:
+            heapq.heappush(self.waiting, ticket)
+            while True:
+                recheck = self.dispatch(time.monotonic())
+                if ticket[3]:
+                    return
+                self.condition.wait(recheck)
+
+    def release(self, kind: str):
+        with self.condition:
+            self.in_flight -= 1
+            if kind == "write":
+                # Даже неудачная запись могла изменить лист
+                self.write_generation += 1
+            self.dispatch(time.monotonic())
+            self.condition.notify_all()
+
+    def call(self, kind: str, method: str, func: Callable, *args, priority: int = None, **attributes):
+        """
+        Запрос к Sheets API через очередь: ожидание квоты, замер и повторы
+        При 429 (и ошибках сервера для чтений) запрос повторяется после случайной задержки,
+        а после 429 квота этого вида приостанавливается для всех.
+        """
+        if priority is None:
+            priority = PRIORITY_WRITE if kind == "write" else LANE.get()
+        retry_codes = WRITE_RETRY_CODES if kind == "write" else RETRY_CODES
+        attempt = 0
+        while True:
+            self.acquire(kind, priority)
+            error = None
+            try:
+                if attempt:
+                    EXTERNAL_RETRIES.inc("sheets", method)
+                with track("sheets", method), span(f"sheets.{method}", attempt=attempt + 1, **attributes):
+                    return func(*args)
+            except Exception as e:
+                if getattr(e, "code", None) not in retry_codes or attempt >= self.max_retries:
+                    raise
+                error = e
+            finally:
+                self.release(kind)
+
+            delay = retry_delay(attempt)
+            if getattr(error, "code", None) == 429:
+                with self.condition:
+                    self.quotas[kind].pause(time.monotonic(), delay)
+            logger.warning("⚠️ Google Sheets %s: %s, повтор через %.1f с (%s)", method, error, delay, self.describe())
+            time.sleep(delay)
+            attempt += 1
+
+    def read(self, method: str, func: Callable, *args, key: Hashable = None, priority: int = None,
+             **attributes):
+        """
+        Чтение через очередь
+        key: ключ одинаковых чтений; если такое чтение ждет в очереди или уже отправлено
+        и после отправки не было записи, вызывающий получает его результат вместо нового запроса.
+        """
+        if key is None:
+            return self.call("read", method, func, *args, priority=priority, **attributes)
+
+        with self.condition:
+            flight = self.flights.get(key)
+            leader = flight is None or flight.generation not in (None, self.write_generation)
+            if leader:
+                flight = self.flights[key] = Flight()
+
+        if not leader:
+            COALESCED_READS.inc(method)
+            return flight.future.result()
+
+        def send(*call_args):
+            with self.condition:
+                flight.generation = self.write_generation
+            return func(*call_args)
+
+        try:
+            result = self.call("read", method, send, *args, priority=priority, **attributes)
+        except BaseException as e:
+            flight.future.set_exception(e)
+            raise
+        else:
+            flight.future.set_result(result)
+            return result
+        finally:
+            with self.condition:
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+
+    def write(self, method: str, func: Callable, *args, **attributes):
+        return self.call("write", method, func, *args, priority=PRIORITY_WRITE, **attributes)
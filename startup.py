@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Заранее открывать соединения с внешними API при запуске (0 - отключить)
+STARTUP_PREWARM = os.getenv("STARTUP_PREWARM", "1") != "0"
+
+
+class StartupTimer:
+    def __init__(self, started: Optional[float] = None):
+        """
+        Замер этапов запуска
+        started: time.perf_counter() в начале импортов процесса
+        Последовательные этапы отмечаются mark(), независимые запускаются параллельно через gather().
+        """
+        self.started = started if started is not None else time.perf_counter()
+        self.last = self.started
+        self.phases: Dict[str, float] = {}
+
+    def mark(self, name: str):
+        """Этап, закончившийся сейчас и начавшийся с предыдущей отметки"""
+        now = time.perf_counter()
+        self.phases[name] = now - self.last
+        self.last = now
+
+    async def phase(self, name: str, awaitable: Awaitable):
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    async def gather(self, required: Dict[str, Awaitable], optional: Dict[str, Awaitable] = None):
+        """
+        Независимые этапы одновременно
+        Ошибка обязательного этапа прерывает запуск (после завершения остальных),
+        ошибка необязательного (прогрев соединений) только логируется.
+        """
+        optional = optional or {}
+        names = list(required) + list(optional)
+        results = await asyncio.gather(
+            *(self.phase(name, awaitable) for name, awaitable in {**required, **optional}.items()),
+            return_exceptions=True
+        )
+        self.last = time.perf_counter()
+
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                if name in required:
+                    raise result
+                logger.warning("⚠️ Этап запуска %s не выполнен: %s", name, result)
+
+    def report(self) -> str:
+        """Итог запуска: общее время и длительность этапов"""
+        total = time.perf_counter() - self.started
+        phases = ", ".join(f"{name} {seconds:.2f}" for name, seconds in self.phases.items())
+        return f"{total:.2f} с ({phases})"
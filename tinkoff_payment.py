@@ -1,27 +1,23 @@
 import uuid
 import requests
+from requests.adapters import HTTPAdapter
 import os
-import hashlib
 import logging
 from typing import Dict, Optional
-from datetime import datetime
-from dotenv import load_dotenv
+from payment_store import PaymentStore
+import tinkoff_signing
+from metrics import track
+from tracing import span
 
-# Настройка логирования
+# Настройка логирования (уровень задается через LOG_LEVELS, см. log_config)
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
-# Загружаем переменные окружения
-logger.debug("Загружаем переменные окружения из .env файла")
-load_dotenv(override=True)  # Принудительная перезагрузка
-
-# Конфигурация Tinkoff
+# Конфигурация Tinkoff (.env загружает запускаемый процесс до импорта модуля;
+# отсутствие ключей проверяется при запуске бота и при создании платежа, а не при импорте)
 TINKOFF_TERMINAL_KEY = os.getenv("TINKOFF_TERMINAL_KEY")
 TINKOFF_SECRET_KEY = os.getenv("TINKOFF_SECRET_KEY")
-if not TINKOFF_SECRET_KEY:
-    raise ValueError("TINKOFF_SECRET_KEY не настроен")
-# Используем тестовый URL для API
-TINKOFF_API_URL = "https://securepay.tinkoff.ru/v2"
+# URL API (переопределяется для тестового стенда и бенчмарков)
+TINKOFF_API_URL = os.getenv("TINKOFF_API_URL", "https://securepay.tinkoff.ru/v2")
 
 # Заголовки для запросов
 HEADERS = {
@@ -29,63 +25,41 @@ HEADERS = {
     'Accept': 'application/json'
 }
 
-# Отладочный вывод значений
-logger.debug(f"Текущая директория: {os.getcwd()}")
-logger.debug(f"TINKOFF_TERMINAL_KEY: {TINKOFF_TERMINAL_KEY}")
-logger.debug(f"TINKOFF_SECRET_KEY: {TINKOFF_SECRET_KEY}")
-logger.debug(f"TINKOFF_API_URL: {TINKOFF_API_URL}")
+# Пул соединений к API Tinkoff (переиспользуется всеми запросами, в том числе сверкой статусов)
+TINKOFF_POOL_SIZE = int(os.getenv("TINKOFF_POOL_SIZE", 10))
+session = requests.Session()
+session.headers.update(HEADERS)
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=TINKOFF_POOL_SIZE))
 
 # URL'ы для редиректа (можно настроить через переменные окружения)
 SUCCESS_URL = os.getenv("TINKOFF_SUCCESS_URL", "https://t.me/chebextreme")
 FAIL_URL = os.getenv("TINKOFF_FAIL_URL", "https://t.me/chebextreme")
 
-# Словарь для хранения информации о платежах
-payment_info = {}
+# Хранилище информации о платежах (общее с webhook-сервером)
+payment_store = PaymentStore()
 
-def save_payment_info(order_id: str, chat_id: int, amount: int):
+def save_payment_info(order_id: str, chat_id: int, amount: int, event_name: str = None):
     """Сохранение информации о платеже"""
-    payment_info[order_id] = {
-        'chat_id': chat_id,
-        'amount': amount,
-        'created_at': datetime.now().isoformat()
-    }
+    payment_store.save_payment(order_id, chat_id, amount, event_name)
 
 def get_payment_info(order_id: str) -> Dict:
     """Получение информации о платеже"""
-    return payment_info.get(order_id, {})
+    return payment_store.get_payment(order_id)
 
 def generate_token(data: dict, secret_key: str) -> str:
-    # Исключаем Token, Receipt, DATA
-    data_for_token = {
-        k: v for k, v in data.items() 
-        if k != "Token" and v is not None and k not in ["Receipt", "DATA"]
-    }
-
-    sorted_pairs = sorted(data_for_token.items())
-
-    logger.debug(f"Sorted pairs for token: {sorted_pairs}")
-
-    values = []
-    for key, value in sorted_pairs:
-        if isinstance(value, bool):
-            values.append("true" if value else "false")
-        elif isinstance(value, (int, float)):
-            values.append(str(int(value)))
-        else:
-            values.append(str(value))
-
-    values.append(str(secret_key))
+    """Токен запроса к API Tinkoff (см. tinkoff_signing)"""
+    return tinkoff_signing.sign(data, secret_key)
 
-    token_str = "".join(values)
-    logger.debug(f"Token string before hash: {token_str}")
-
-    return hashlib.sha256(token_str.encode('utf-8')).hexdigest()
 
+def prewarm():
+    """Заранее открыть TLS-соединение с API в пуле сессии, чтобы первый платеж не ждал рукопожатия"""
+    session.head(TINKOFF_API_URL, timeout=5).close()
 
 
 def init_payment(amount: int, description: str, customer_id: str,
                  customer_email: str = None, customer_phone: str = None,
-                 chat_id: int = None) -> str:
+                 chat_id: int = None, event_name: str = None,
+                 order_id: str = None) -> str:
     """
     Инициализация платежа через Tinkoff API
     """
@@ -95,14 +69,14 @@ def init_payment(amount: int, description: str, customer_id: str,
     if amount < 1:
         raise ValueError("Сумма должна быть не менее 1 рубля")
     
-    logger.debug(f"Amount (руб): {amount}, Amount (копейки): {amount * 100}")
+    logger.debug("Amount (руб): %s, Amount (копейки): %s", amount, amount * 100)
 
-    order_id = str(uuid.uuid4())
-    logger.debug(f"Generated OrderId: {order_id}")
+    order_id = order_id or str(uuid.uuid4())
+    logger.debug("Generated OrderId: %s", order_id)
 
     # Сохраняем информацию о платеже для последующей обработки webhook'ом
     if chat_id:
-        save_payment_info(order_id, chat_id, amount)
+        save_payment_info(order_id, chat_id, amount, event_name)
 
     # Базовый payload
     payload = {
@@ -123,26 +97,29 @@ def init_payment(amount: int, description: str, customer_id: str,
     # Генерируем токен
     payload["Token"] = generate_token(payload, TINKOFF_SECRET_KEY)
 
-    logger.info(f"Создание платежа на сумму {amount} руб. для клиента {customer_id}")
-    logger.debug(f"Payload: {payload}")
+    logger.info("Создание платежа на сумму %s руб. для клиента %s", amount, customer_id)
+    logger.debug("Payload: %s", payload)
 
     try:
-        response = requests.post(
-            f"{TINKOFF_API_URL}/Init",
-            json=payload,
-            headers=HEADERS,
-            timeout=30
-        )
-        response.raise_for_status()
+        with track("tinkoff", "Init"), span("tinkoff.Init"):
+            response = session.post(
+                f"{TINKOFF_API_URL}/Init",
+                json=payload,
+                timeout=30
+            )
+            response.raise_for_status()
 
         data = response.json()
-        logger.debug(f"Ответ от Tinkoff: {data}")
+        logger.debug("Ответ от Tinkoff: %s", data)
 
         if data.get("Success"):
             payment_id = data.get("PaymentId")
             payment_url = data.get("PaymentURL")
 
-            logger.info(f"Платеж создан успешно. PaymentId: {payment_id}")
+            if chat_id and payment_id:
+                payment_store.set_payment_id(order_id, payment_id)
+
+            logger.info("Платеж создан успешно. PaymentId: %s", payment_id)
             return payment_url
         else:
             error_message = data.get("Message", "Неизвестная ошибка")
@@ -154,10 +131,10 @@ def init_payment(amount: int, description: str, customer_id: str,
             )
 
     except requests.exceptions.RequestException as e:
-        logger.error(f"Ошибка запроса к Tinkoff API: {e}")
+        logger.error("Ошибка запроса к Tinkoff API: %s", e)
         raise Exception(f"Ошибка связи с платежной системой: {e}")
     except Exception as e:
-        logger.error(f"Неожиданная ошибка при создании платежа: {e}")
+        logger.error("Неожиданная ошибка при создании платежа: %s", e)
         raise
 
 
@@ -173,13 +150,13 @@ def check_payment_status(payment_id: str) -> Dict:
     payload["Token"] = generate_token(payload, TINKOFF_SECRET_KEY)
 
     try:
-        response = requests.post(
-            f"{TINKOFF_API_URL}/GetState",
-            json=payload,
-            headers=HEADERS,
-            timeout=30
-        )
-        response.raise_for_status()
+        with track("tinkoff", "GetState"), span("tinkoff.GetState"):
+            response = session.post(
+                f"{TINKOFF_API_URL}/GetState",
+                json=payload,
+                timeout=30
+            )
+            response.raise_for_status()
 
         data = response.json()
 
@@ -198,7 +175,7 @@ def check_payment_status(payment_id: str) -> Dict:
             }
 
     except Exception as e:
-        logger.error(f"Ошибка проверки статуса платежа {payment_id}: {e}")
+        logger.error("Ошибка проверки статуса платежа %s: %s", payment_id, e)
         return {
             "success": False,
             "error": str(e)
@@ -217,19 +194,19 @@ def cancel_payment(payment_id: str) -> bool:
     payload["Token"] = generate_token(payload, TINKOFF_SECRET_KEY)
 
     try:
-        response = requests.post(
-            f"{TINKOFF_API_URL}/Cancel",
-            json=payload,
-            headers=HEADERS,
-            timeout=30
-        )
-        response.raise_for_status()
+        with track("tinkoff", "Cancel"), span("tinkoff.Cancel"):
+            response = session.post(
+                f"{TINKOFF_API_URL}/Cancel",
+                json=payload,
+                timeout=30
+            )
+            response.raise_for_status()
 
         data = response.json()
         return data.get("Success", False)
 
     except Exception as e:
-        logger.error(f"Ошибка отмены платежа {payment_id}: {e}")
+        logger.error("Ошибка отмены платежа %s: %s", payment_id, e)
         return False
 
 
@@ -241,8 +218,8 @@ def test_connection() -> bool:
         return False
 
     try:
-        logger.debug(f"Тестирование подключения с TerminalKey: {TINKOFF_TERMINAL_KEY}")
-        logger.debug(f"API URL: {TINKOFF_API_URL}")
+        logger.debug("Тестирование подключения с TerminalKey: %s", TINKOFF_TERMINAL_KEY)
+        logger.debug("API URL: %s", TINKOFF_API_URL)
         
         # Создаем тестовый платеж
         test_payload = {
@@ -255,9 +232,9 @@ def test_connection() -> bool:
         # Генерируем токен
         test_payload["Token"] = generate_token(test_payload, TINKOFF_SECRET_KEY)
         
-        logger.debug(f"Тестовый payload: {test_payload}")
+        logger.debug("Тестовый payload: %s", test_payload)
         
-        response = requests.post(
+        response = session.post(
             f"{TINKOFF_API_URL}/Init",
             json=test_payload,
             headers=HEADERS,
@@ -266,26 +243,34 @@ def test_connection() -> bool:
         response.raise_for_status()
         
         data = response.json()
-        logger.debug(f"Ответ от сервера: {data}")
+        logger.debug("Ответ от сервера: %s", data)
         
         if data.get("Success"):
-            logger.info(f"Тест подключения к Tinkoff API прошел успешно. PaymentURL: {data.get('PaymentURL')}")
+            logger.info("Тест подключения к Tinkoff API прошел успешно. PaymentURL: %s", data.get('PaymentURL'))
             return True
         else:
             error_message = data.get("Message", "Неизвестная ошибка")
             error_code = data.get("ErrorCode", "")
             details = data.get("Details", "")
             logger.error(
-                f"Тест подключения не прошел: {error_message} "
-                f"(код: {error_code}, детали: {details})"
+                "Тест подключения не прошел: %s (код: %s, детали: %s)",
+                error_message, error_code, details
             )
             return False
             
     except Exception as e:
-        logger.error(f"Тест подключения к Tinkoff API не прошел: {e}")
+        logger.error("Тест подключения к Tinkoff API не прошел: %s", e)
         return False
     
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from log_config import setup_logging
+
+    load_dotenv()
+    TINKOFF_TERMINAL_KEY = os.getenv("TINKOFF_TERMINAL_KEY")
+    TINKOFF_SECRET_KEY = os.getenv("TINKOFF_SECRET_KEY")
+    setup_logging()
+
     if test_connection():
         logger.info("Тестовое подключение прошло успешно")
     else:
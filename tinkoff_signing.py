@@ -0,0 +1,114 @@
+"""
+Подпись запросов к API Tinkoff и проверка подписи уведомлений
+
+Токен: значения параметров верхнего уровня (без Token, Receipt, DATA и вложенных объектов),
+отсортированные по имени параметра, плюс секретный ключ; sha256 в hex.
+Булевы значения передаются как "true"/"false", числа - целыми.
+Порядок ключей для известных форм запросов вычисляется один раз и переиспользуется.
+"""
+import hashlib
+import hmac
+from typing import Dict, Iterable, Tuple
+
+# Параметры, которые не участвуют в подписи
+EXCLUDED_KEYS = frozenset(("Token", "Receipt", "DATA"))
+
+# Известные формы: запросы бота и уведомления Tinkoff
+KNOWN_SHAPES = (
+    ("TerminalKey", "Amount", "OrderId", "Description"),
+    ("TerminalKey", "Amount", "OrderId", "Description", "DATA"),
+    ("TerminalKey", "PaymentId"),
+    ("TerminalKey", "OrderId", "Success", "Status", "PaymentId", "ErrorCode", "Amount",
+     "CardId", "Pan", "ExpDate", "Token"),
+    ("TerminalKey", "OrderId", "Success", "Status", "PaymentId", "ErrorCode", "Amount",
+     "CardId", "Pan", "ExpDate", "RebillId", "Token"),
+)
+
+# Предел кэша форм: уведомления приходят извне, их набор ключей не должен раздувать память
+MAX_SHAPES = 64
+
+
+def sign_order(keys: Iterable[str]) -> Tuple[str, ...]:
+    """Отсортированные ключи, участвующие в подписи"""
+    return tuple(sorted(key for key in keys if key not in EXCLUDED_KEYS))
+
+
+def token_value(value) -> str:
+    """Значение параметра в строке подписи"""
+    if value.__class__ is str:
+        return value
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, (int, float)):
+        return str(int(value))
+    return str(value)
+
+
+class TinkoffSigner:
+    def __init__(self, secret_key: str):
+        """Подпись и проверка токенов Tinkoff с одним секретным ключом"""
+        self.secret_key = str(secret_key)
+        self.orders: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        for shape in KNOWN_SHAPES:
+            self.orders[shape] = sign_order(shape)
+
+    def order(self, data: Dict) -> Tuple[str, ...]:
+        """Порядок ключей для формы данных (кэшируется по исходному порядку ключей)"""
+        shape = tuple(data)
+        order = self.orders.get(shape)
+        if order is None:
+            order = sign_order(shape)
+            if len(self.orders) < MAX_SHAPES:
+                self.orders[shape] = order
+        return order
+
+    def sign(self, data: Dict) -> str:
+        """Токен для данных; сами данные не изменяются"""
+        parts = []
+        append = parts.append
+        for key in self.order(data):
+            value = data[key]
+            cls = value.__class__
+            # Строки и целые - почти все значения; остальное через token_value
+            if cls is str:
+                append(value)
+            elif cls is int:
+                append(str(value))
+            elif value is not None and not isinstance(value, (dict, list)):
+                append(token_value(value))
+        append(self.secret_key)
+        return hashlib.sha256("".join(parts).encode("utf-8")).hexdigest()
+
+    def verify(self, data: Dict) -> bool:
+        """Проверка поля Token за постоянное время; данные не изменяются"""
+        received = data.get("Token")
+        if not isinstance(received, str):
+            return False
+        if not received.isascii():
+            return False
+        return hmac.compare_digest(self.sign(data), received)
+
+
+# Подписчики по секретному ключу: ключ в процессе один, но функции принимают его явно
+_signers: Dict[str, TinkoffSigner] = {}
+
+
+def signer_for(secret_key: str) -> TinkoffSigner:
+    signer = _signers.get(secret_key)
+    if signer is None:
+        signer = _signers[secret_key] = TinkoffSigner(secret_key)
+    return signer
+
+
+def sign(data: Dict, secret_key: str) -> str:
+    """Токен для запроса к API Tinkoff"""
+    return signer_for(secret_key).sign(data)
+
+
+def verify(data: Dict, secret_key: str) -> bool:
+    """Проверка подписи уведомления Tinkoff"""
+    if not secret_key:
+        return False
+    return signer_for(secret_key).verify(data)
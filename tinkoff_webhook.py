@@ -1,17 +1,20 @@
 from flask import Flask, request, jsonify
-import hashlib
 import logging
 import os
 from typing import Dict, Any
 import asyncio
-from aiogram import Bot
-from datetime import datetime
-from tinkoff_payment import get_payment_info
+import threading
 from dotenv import load_dotenv
 
-# Загружаем переменные окружения
+# Загружаем переменные окружения до импорта модулей, читающих настройки при импорте
 load_dotenv()
 
+from payment_store import PaymentStore
+from seat_inventory import SeatInventory
+import tinkoff_signing
+from log_config import setup_logging
+from metrics import HANDLER_DURATION, HANDLER_ERRORS, Timer, start_metrics_server
+
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
@@ -20,44 +23,47 @@ TINKOFF_SECRET_KEY = os.getenv("TINKOFF_SECRET_KEY")
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
 WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 5001))
+# Метрики webhook-сервера - отдельным сервером на METRICS_HOST, не рядом с публичным webhook'ом (0 - отключены)
+WEBHOOK_METRICS_PORT = int(os.getenv('WEBHOOK_METRICS_PORT', 0))
 
 app = Flask(__name__)
-bot = Bot(token=TELEGRAM_TOKEN)
-
-# Словарь для хранения информации о платежах
-# В реальном приложении это должно быть в базе данных
-payment_info = {}
-
-def save_payment_info(order_id: str, chat_id: int, amount: int):
-    """Сохранение информации о платеже"""
-    payment_info[order_id] = {
-        'chat_id': chat_id,
-        'amount': amount,
-        'created_at': datetime.now().isoformat()
-    }
-
-def get_payment_info(order_id: str) -> Dict:
-    """Получение информации о платеже"""
-    return payment_info.get(order_id, {})
+# Хранилище платежей общее с ботом (локальная база); клиент API Tinkoff серверу не нужен
+payment_store = PaymentStore()
+seat_inventory = SeatInventory()
+
+# Бот для уведомлений создается при первом обращении: aiogram - самый тяжелый импорт процесса,
+# и серверу не нужно ждать его, чтобы начать принимать запросы
+bot = None
+send_limiter = None
+_bot_lock = threading.Lock()
+
+# Одна фоновая петля событий на весь процесс: сессия бота и очередь отправки привязаны к петле,
+# поэтому asyncio.run на каждый запрос ломал отправку со второго уведомления
+loop = asyncio.new_event_loop()
+threading.Thread(target=loop.run_forever, name="webhook-loop", daemon=True).start()
+
+def get_bot():
+    """Бот для уведомлений (aiogram импортируется при первом вызове)"""
+    global bot, send_limiter
+    with _bot_lock:
+        if bot is None:
+            from aiogram import Bot
+            from send_queue import setup_rate_limit
+
+            bot = Bot(token=TELEGRAM_TOKEN)
+            send_limiter = setup_rate_limit(bot)
+    return bot
+
+async def prewarm():
+    """Импорт aiogram и TLS-соединение с Telegram в фоне, пока сервер уже принимает запросы"""
+    try:
+        await get_bot().get_me()
+    except Exception as e:
+        logger.warning("⚠️ Не удалось заранее подключиться к Telegram: %s", e)
 
 def verify_signature(data: Dict[str, Any], secret_key: str) -> bool:
-    """Проверка подписи webhook'а от Tinkoff"""
-    if 'Token' not in data:
-        return False
-
-    received_token = data.pop('Token')
-
-    # Сортируем данные и создаем строку для хеширования
-    sorted_items = sorted(data.items())
-    token_str = "".join(str(value) for key, value in sorted_items if key != "Token")
-    token_str += secret_key
-
-    calculated_token = hashlib.sha256(token_str.encode('utf-8')).hexdigest()
-
-    # Возвращаем Token обратно в данные
-    data['Token'] = received_token
-
-    return calculated_token == received_token
+    """Проверка подписи webhook'а от Tinkoff (данные не изменяются)"""
+    return tinkoff_signing.verify(data, secret_key)
 
 async def handle_payment_notification(payment_data: Dict[str, Any]):
     """Обработка уведомления о платеже"""
@@ -67,128 +73,29 @@ async def handle_payment_notification(payment_data: Dict[str, Any]):
         order_id = payment_data.get('OrderId')
         amount = payment_data.get('Amount', 0) // 100  # Конвертируем в рубли
 
-        logger.info(f"Получено уведомление о платеже {payment_id}, статус: {status}")
-        
+        logger.info("Получено уведомление о платеже %s, статус: %s", payment_id, status)
+
+        # Повторы и запоздавшие статусы отбрасываем до отправки сообщений
+        if not payment_store.apply_status(order_id, payment_id, status):
+            return
+
+        # Подтверждаем или освобождаем зарезервированное место
+        seat_inventory.apply_payment_status(order_id, status)
+
         # Получаем информацию о платеже
-        payment_info = get_payment_info(order_id)
+        payment_info = payment_store.get_payment(order_id)
         chat_id = payment_info.get('chat_id')
         
         if not chat_id:
-            logger.error(f"Не найден chat_id для заказа {order_id}")
+            logger.error("Не найден chat_id для заказа %s", order_id)
             return
 
-        if status == 'CONFIRMED':
-            # Платеж подтвержден
-            await send_payment_success_notification(payment_data, chat_id)
-            
-        elif status == 'REJECTED':
-            # Платеж отклонен
-            await send_payment_failed_notification(payment_data, chat_id)
-            
-        elif status == 'AUTHORIZED':
-            # Платеж авторизован, но еще не подтвержден
-            await send_payment_authorized_notification(payment_data, chat_id)
-            
-        elif status == 'REFUNDED':
-            # Платеж возвращен
-            await send_payment_refunded_notification(payment_data, chat_id)
-            
-        elif status == 'REVERSED':
-            # Платеж отменен
-            await send_payment_reversed_notification(payment_data, chat_id)
-
-    except Exception as e:
-        logger.error(f"Ошибка обработки уведомления о платеже: {e}")
-
-async def send_payment_success_notification(payment_data: Dict[str, Any], chat_id: int):
-    """Отправка уведомления об успешной оплате"""
-    try:
-        order_id = payment_data.get('OrderId')
-        amount = payment_data.get('Amount', 0) // 100
-
-        message = f"""
-🎉 *ОПЛАТА ПРОШЛА УСПЕШНО!*
-
-✅ Ваше бронирование подтверждено
-💰 Сумма: {amount:,} ₽
-📋 Номер заказа: {order_id}
-
-📞 *Что дальше:*
-• Мы отправим вам подробную программу мероприятия
-• За день до начала мы напомним вам о встрече
-• Если у вас есть вопросы, просто ответьте на это сообщение
-        """
-        await bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
-    except Exception as e:
-        logger.error(f"Ошибка отправки уведомления об успешной оплате: {e}")
-
-async def send_payment_failed_notification(payment_data: Dict[str, Any], chat_id: int):
-    """Отправка уведомления об отклоненной оплате"""
-    try:
-        order_id = payment_data.get('OrderId')
-        amount = payment_data.get('Amount', 0) // 100
-
-        message = f"""
-❌ *ОПЛАТА ОТКЛОНЕНА!*
-💰 Сумма: {amount:,} ₽
-📋 Номер заказа: {order_id}
-
-Пожалуйста, попробуйте еще раз или свяжитесь с поддержкой.
-        """
-        await bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
-    except Exception as e:
-        logger.error(f"Ошибка отправки уведомления об отклоненной оплате: {e}")
-
-async def send_payment_authorized_notification(payment_data: Dict[str, Any], chat_id: int):
-    """Отправка уведомления об авторизации платежа"""
-    try:
-        order_id = payment_data.get('OrderId')
-        amount = payment_data.get('Amount', 0) // 100
-
-        message = f"""
-⏳ *Платеж обрабатывается*
-💰 Сумма: {amount:,} ₽
-📋 Номер заказа: {order_id}
-
-Мы уведомим вас, когда платеж будет подтвержден.
-        """
-        await bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
-    except Exception as e:
-        logger.error(f"Ошибка отправки уведомления об авторизации платежа: {e}")
-
-async def send_payment_refunded_notification(payment_data: Dict[str, Any], chat_id: int):
-    """Отправка уведомления о возврате платежа"""
-    try:
-        order_id = payment_data.get('OrderId')
-        amount = payment_data.get('Amount', 0) // 100
-
-        message = f"""
-💫 *Возврат платежа выполнен*
-💰 Сумма: {amount:,} ₽
-📋 Номер заказа: {order_id}
-
-Средства скоро вернутся на ваш счет.
-        """
-        await bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
-    except Exception as e:
-        logger.error(f"Ошибка отправки уведомления о возврате платежа: {e}")
-
-async def send_payment_reversed_notification(payment_data: Dict[str, Any], chat_id: int):
-    """Отправка уведомления об отмене платежа"""
-    try:
-        order_id = payment_data.get('OrderId')
-        amount = payment_data.get('Amount', 0) // 100
+        from payment_notifications import notify_payment_status
 
-        message = f"""
-🔄 *Платеж отменен*
-💰 Сумма: {amount:,} ₽
-📋 Номер заказа: {order_id}
+        await notify_payment_status(get_bot(), payment_data, chat_id)
 
-Если у вас есть вопросы, пожалуйста, свяжитесь с поддержкой.
-        """
-        await bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
     except Exception as e:
-        logger.error(f"Ошибка отправки уведомления об отмене платежа: {e}")
+        logger.error("Ошибка обработки уведомления о платеже: %s", e)
 
 @app.route('/tinkoff_webhook', methods=['POST'])
 def tinkoff_webhook():
@@ -204,7 +111,8 @@ def tinkoff_webhook():
         return jsonify({"error": "Invalid signature"}), 400
 
     # Обрабатываем уведомление о платеже
-    asyncio.run(handle_payment_notification(data))
+    with Timer(HANDLER_DURATION, HANDLER_ERRORS, ("tinkoff_webhook",)):
+        asyncio.run_coroutine_threadsafe(handle_payment_notification(data), loop).result()
 
     return jsonify({"status": "success"}), 200
 
@@ -214,7 +122,11 @@ def index():
     return "Tinkoff Webhook Server is running!"
 
 if __name__ == '__main__':
-    logging.basicConfig(level=logging.INFO)
+    setup_logging()
+    if os.getenv("STARTUP_PREWARM", "1") != "0":
+        asyncio.run_coroutine_threadsafe(prewarm(), loop)
+    if WEBHOOK_METRICS_PORT:
+        asyncio.run_coroutine_threadsafe(start_metrics_server(port=WEBHOOK_METRICS_PORT), loop).result()
     app.run(host=WEBHOOK_HOST, port=WEBHOOK_PORT)
 
 
@@ -0,0 +1,160 @@
+import logging
+import math
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from local_store import connect
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+WORD_PATTERN = re.compile(r"\w+")
+SPACES_PATTERN = re.compile(r"[ \t]+")
+BLANK_LINES_PATTERN = re.compile(r"\n\s*\n+")
+
+# Средняя длина токена YandexGPT в символах слова (уточняется по фактическому расходу)
+CHARS_PER_TOKEN = 4.5
+
+# Поправочный коэффициент локальной оценки, обновляется по полю usage ответов
+calibration = 1.0
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Локальная оценка числа токенов без обращения к API
+    Слова дробятся по средней длине токена, знаки препинания - отдельные токены.
+    """
+    count = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        count += math.ceil(len(match.group()) / CHARS_PER_TOKEN)
+    return int(count * calibration) + 1
+
+
+def calibrate(estimated: int, actual: int):
+    """Уточнение коэффициента оценки по фактическому числу токенов (скользящее среднее)"""
+    global calibration
+    if estimated > 0 and actual > 0:
+        ratio = actual / (estimated / calibration)
+        calibration = 0.9 * calibration + 0.1 * ratio
+
+
+def compact_whitespace(text: str) -> str:
+    """Удаление повторных пробелов, хвостовых пробелов и пустых строк"""
+    text = SPACES_PATTERN.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return BLANK_LINES_PATTERN.sub("\n", text).strip()
+
+
+def word_stems(text: str) -> set:
+    """Основы слов (первые 5 букв) для грубого сопоставления вопроса и разделов"""
+    return {word[:5] for word in WORD_PATTERN.findall(text.lower()) if len(word) > 2}
+
+
+def select_sections(sections: List[Tuple[str, str]], question: str, budget: int,
+                    always: Tuple[str, ...] = (), costs: List[int] = None) -> List[Tuple[str, str]]:
+    """
+    Выбор разделов базы знаний под бюджет токенов
+    sections: список (заголовок, текст) в исходном порядке
+    always: заголовки, которые включаются всегда (например, контакты)
+    costs: заранее посчитанные оценки токенов разделов
+    Если все разделы помещаются в бюджет, возвращаются все; иначе - самые релевантные вопросу.
+    """
+    if costs is None:
+        costs = [estimate_tokens(text) for title, text in sections]
+    if sum(costs) <= budget:
+        return sections
+
+    # Основы слов ищем подстрокой, чтобы "самокат" находил "ЭЛЕКТРОСАМОКАТОВ"
+    question_stems = word_stems(question)
+    scored = []
+    for i, (title, text) in enumerate(sections):
+        title_lower, text_lower = title.lower(), text.lower()
+        relevance = sum(3 * (stem in title_lower) + (stem in text_lower) for stem in question_stems)
+        scored.append((title not in always, -relevance, i))
+
+    selected = set()
+    used = 0
+    for _, relevance, i in sorted(scored):
+        if used + costs[i] > budget:
+            continue
+        selected.add(i)
+        used += costs[i]
+
+    return [section for i, section in enumerate(sections) if i in selected]
+
+
+USAGE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    user_id INTEGER,
+    estimated_tokens INTEGER,
+    input_tokens INTEGER,
+    completion_tokens INTEGER,
+    total_tokens INTEGER
+);
+CREATE TABLE IF NOT EXISTS llm_usage_daily (
+    day TEXT PRIMARY KEY,
+    requests INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class TokenUsage:
+    def __init__(self, db_path: Optional[str] = None, retention_days: int = 30):
+        """
+        Учет расхода токенов YandexGPT: по каждому запросу и суммарно по дням
+        retention_days: сколько дней хранить записи по отдельным запросам
+        """
+        self.conn = connect(db_path)
+        self.lock = threading.Lock()
+        self.conn.executescript(USAGE_SCHEMA)
+
+        cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+        self.conn.execute("DELETE FROM llm_requests WHERE created_at < ?", (cutoff,))
+
+    def record(self, usage: Dict, estimated_tokens: int = 0, user_id: int = None):
+        """
+        Запись поля usage ответа YandexGPT
+        usage: {"inputTextTokens": "...", "completionTokens": "...", "totalTokens": "..."}
+        """
+        input_tokens = int(usage.get("inputTextTokens", 0))
+        completion_tokens = int(usage.get("completionTokens", 0))
+        total_tokens = int(usage.get("totalTokens", input_tokens + completion_tokens))
+        now = datetime.now()
+
+        calibrate(estimated_tokens, input_tokens)
+
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO llm_requests (created_at, user_id, estimated_tokens, input_tokens, "
+                "completion_tokens, total_tokens) VALUES (?, ?, ?, ?, ?, ?)",
+                (now.isoformat(), user_id, estimated_tokens, input_tokens, completion_tokens, total_tokens)
+            )
+            self.conn.execute(
+                "INSERT INTO llm_usage_daily (day, requests, input_tokens, completion_tokens, total_tokens) "
+                "VALUES (?, 1, ?, ?, ?) ON CONFLICT(day) DO UPDATE SET "
+                "requests = requests + 1, input_tokens = input_tokens + excluded.input_tokens, "
+                "completion_tokens = completion_tokens + excluded.completion_tokens, "
+                "total_tokens = total_tokens + excluded.total_tokens",
+                (now.date().isoformat(), input_tokens, completion_tokens, total_tokens)
+            )
+
+        logger.info(
+            "Токены YandexGPT: вход %s (оценка %s), ответ %s, всего %s",
+            input_tokens, estimated_tokens, completion_tokens, total_tokens
+        )
+
+    def daily(self, days: int = 7) -> List[Dict]:
+        """Суммарный расход по дням (последние days дней)"""
+        since = (datetime.now().date() - timedelta(days=days - 1)).isoformat()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM llm_usage_daily WHERE day >= ? ORDER BY day", (since,)
+            ).fetchall()
+        return [dict(row) for row in rows]
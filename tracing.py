@@ -0,0 +1,321 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Coroutine, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Текущий span задачи; asyncio.create_task и asyncio.to_thread копируют контекст,
+# поэтому вложенные вызовы (в том числе в потоках) становятся дочерними span'ами
+current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def detached_task(coro: Coroutine) -> asyncio.Task:
+    """
+    Задача вне текущей трассы
+    Для циклов, которые запускаются из обработчика, но живут дольше него: иначе все их span'ы
+    попадали бы в трассу запроса, запустившего цикл.
+    """
+    context = contextvars.copy_context()
+    context.run(current_span.set, None)
+    return context.run(asyncio.create_task, coro)
+
+
+class Trace:
+    __slots__ = ("trace_id", "spans", "open", "finished", "lock", "root", "user_id", "sampled")
+
+    def __init__(self, sampled: bool):
+        """
+        Все span'ы одного запроса; трасса завершается, когда закрыт последний span
+        Span'ы открываются и закрываются и из потоков (asyncio.to_thread), поэтому
+        счетчик открытых меняется под блокировкой. Завершенная трасса новых span'ов не принимает.
+        """
+        self.trace_id = new_id(128)
+        self.spans: List[Span] = []
+        self.open = 0
+        self.finished = False
+        self.lock = threading.Lock()
+        self.root: Optional[Span] = None
+        self.user_id = None
+        self.sampled = sampled
+
+    @property
+    def duration(self) -> float:
+        """Длительность от начала корневого span'а до конца последнего, секунды"""
+        end = max(span.end_ns or span.start_ns for span in self.spans)
+        return (end - self.root.start_ns) / 1e9
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent", "name", "start_ns", "end_ns", "attributes", "error", "token")
+
+    def __init__(self, name: str, parent: "Span" = None, attributes: Dict = None):
+        """
+        Участок обработки запроса
+        Без родителя начинается новая трасса, как и при завершенной трассе родителя
+        (span из задачи, пережившей запрос) - тогда родитель записывается ссылкой в атрибуты.
+        Вход в контекст делает span текущим, выход - закрывает его.
+        """
+        self.span_id = new_id(64)
+        self.parent = parent
+        self.name = name
+        self.attributes = attributes or {}
+        self.error = None
+        self.token = None
+        self.end_ns = None
+        self.start_ns = time.time_ns()
+
+        if parent is not None:
+            with parent.trace.lock:
+                if not parent.trace.finished:
+                    self.trace = parent.trace
+                    self.trace.spans.append(self)
+                    self.trace.open += 1
+                    return
+            self.parent = None
+            self.attributes["link.trace_id"] = parent.trace.trace_id
+            self.attributes["link.span_id"] = parent.span_id
+
+        self.trace = Trace(random.random() < tracer.sample_rate)
+        self.trace.root = self
+        self.trace.spans.append(self)
+        self.trace.open = 1
+
+    def set(self, key: str, value):
+        """Атрибут span'а (id пользователя, номер заказа, статус ответа...)"""
+        self.attributes[key] = value
+        if key == "user_id":
+            self.trace.user_id = value
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        with self.trace.lock:
+            self.trace.open -= 1
+            finished = self.trace.finished = self.trace.open == 0
+        if finished:
+            tracer.completed(self.trace)
+
+    def __enter__(self):
+        self.token = current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        current_span.reset(self.token)
+        self.end()
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def span(name: str, **attributes) -> Span:
+    """Дочерний span текущего (или корневой новой трассы): with span("sheets.append_row"): ..."""
+    return Span(name, current_span.get(), attributes)
+
+
+class Tracer:
+    def __init__(self):
+        """
+        Сбор завершенных трасс
+        Экспортируются выбранные с вероятностью TRACE_SAMPLE_RATE и все медленные (дольше TRACE_SLOW_MS);
+        последняя медленная трасса каждого пользователя хранится для /trace_last.
+        """
+        self.sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", 0.05))
+        self.slow_threshold = int(os.getenv("TRACE_SLOW_MS", 2000)) / 1000
+        self.last_slow: "OrderedDict[int, Trace]" = OrderedDict()
+        self.max_users = 1000
+        self.pending: deque = deque(maxlen=10000)
+
+    def completed(self, trace: Trace):
+        """Трасса завершена: сохранение медленной и постановка в очередь экспорта"""
+        slow = trace.duration >= self.slow_threshold
+        if slow and trace.user_id is not None:
+            self.last_slow[trace.user_id] = trace
+            self.last_slow.move_to_end(trace.user_id)
+            if len(self.last_slow) > self.max_users:
+                self.last_slow.popitem(last=False)
+
+        if trace.sampled or slow:
+            self.pending.append(trace)
+
+
+tracer = Tracer()
+
+
+def format_tree(trace: Trace) -> str:
+    """Дерево span'ов трассы с длительностями для вывода в чат"""
+    children: Dict[Optional[str], List[Span]] = {}
+    for item in trace.spans:
+        children.setdefault(item.parent.span_id if item.parent else None, []).append(item)
+
+    lines = [f"Трасса {trace.trace_id}: {trace.duration * 1000:.0f} мс"]
+
+    def walk(parent_id: Optional[str], depth: int):
+        for item in sorted(children.get(parent_id, []), key=lambda s: s.start_ns):
+            offset = (item.start_ns - trace.root.start_ns) / 1e6
+            duration = ((item.end_ns or time.time_ns()) - item.start_ns) / 1e6
+            line = f"{'  ' * depth}• {item.name} +{offset:.0f} мс, {duration:.0f} мс"
+            if item.error:
+                line += f" ❌ {item.error}"
+            lines.append(line)
+            walk(item.span_id, depth + 1)
+
+    walk(None, 0)
+    return "\n".join(lines)
+
+
+def attribute_value(value) -> Dict:
+    """Значение атрибута в формате OTLP"""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(traces: List[Trace], service_name: str = "chebextreme_bot") -> Dict:
+    """Пакет трасс в формате OTLP/JSON (ExportTraceServiceRequest)"""
+    spans = []
+    for trace in traces:
+        for item in trace.spans:
+            record = {
+                "traceId": trace.trace_id,
+                "spanId": item.span_id,
+                "name": item.name,
+                "kind": 1,
+                "startTimeUnixNano": str(item.start_ns),
+                "endTimeUnixNano": str(item.end_ns or item.start_ns),
+                "attributes": [{"key": key, "value": attribute_value(value)} for key, value in item.attributes.items()],
+                "status": {"code": 2, "message": item.error} if item.error else {"code": 1},
+            }
+            if item.parent:
+                record["parentSpanId"] = item.parent.span_id
+            spans.append(record)
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": "chebextreme_bot.tracing"}, "spans": spans}]
+        }]
+    }
+
+
+class TraceExporter:
+    def __init__(self, tracer: Tracer = tracer):
+        """
+        Фоновая выгрузка трасс
+        TRACE_EXPORT_URL: OTLP/HTTP коллектор (например, http://localhost:4318/v1/traces)
+        TRACE_EXPORT_FILE: файл, куда пакеты пишутся построчно в формате OTLP/JSON
+        Без обоих параметров трассы доступны только через /trace_last.
+        """
+        self.tracer = tracer
+        self.url = os.getenv("TRACE_EXPORT_URL")
+        self.file = os.getenv("TRACE_EXPORT_FILE")
+        self.interval = int(os.getenv("TRACE_EXPORT_INTERVAL", 5))
+        self.batch_size = 200
+        self.session = None
+        self.task = None
+
+    def write_file(self, payload: Dict):
+        with open(self.file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+
+    async def flush(self) -> int:
+        """Выгрузка накопленных трасс; возвращает количество выгруженных"""
+        exported = 0
+        while self.tracer.pending:
+            batch = []
+            while self.tracer.pending and len(batch) < self.batch_size:
+                batch.append(self.tracer.pending.popleft())
+            payload = to_otlp(batch)
+
+            if self.url:
+                async with self.session.post(self.url, json=payload, timeout=10) as response:
+                    if response.status >= 300:
+                        logger.warning("Коллектор трасс ответил %s", response.status)
+            elif self.file:
+                await asyncio.to_thread(self.write_file, payload)
+            exported += len(batch)
+        return exported
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка выгрузки трасс: %s", e)
+
+    def start(self):
+        """Запуск фоновой выгрузки (если задан коллектор или файл)"""
+        if not (self.url or self.file):
+            # Выгружать некуда - очередь не копится
+            self.tracer.pending = deque(maxlen=0)
+            return
+        if self.url:
+            # aiohttp импортируется только для выгрузки: tracing используется и webhook-сервером
+            import aiohttp
+
+            self.session = aiohttp.ClientSession()
+        if not self.task:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Остановка с выгрузкой оставшихся трасс"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Ошибка выгрузки трасс: %s", e)
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+
+class TracingMiddleware:
+    """
+    Span'ы обработки обновлений
+    Внешний middleware на dp.update открывает корневой span обновления,
+    внутренний на типах событий - span обработчика.
+    """
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        if handler_object:
+            name = f"handler.{handler_object.callback.__name__}"
+        else:
+            name = f"update.{getattr(event, 'event_type', type(event).__name__)}"
+
+        with span(name) as current:
+            user = data.get("event_from_user")
+            if user:
+                current.set("user_id", user.id)
+            return await handler(event, data)
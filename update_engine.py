@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+import signal
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import GetUpdates
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+
+def update_key(update: Update) -> Hashable:
+    """Ключ упорядочивания: обновления одного чата обрабатываются строго по очереди"""
+    if update.message:
+        return update.message.chat.id
+    if update.callback_query:
+        if update.callback_query.message:
+            return update.callback_query.message.chat.id
+        return update.callback_query.from_user.id
+    if update.edited_message:
+        return update.edited_message.chat.id
+    return ("update", update.update_id)
+
+
+class UpdateEngine:
+    def __init__(self, dp: Dispatcher, bot: Bot):
+        """
+        Обработка обновлений пулом воркеров
+        Обновления одного чата выполняются последовательно (шаги FSM не гоняются),
+        разные чаты - параллельно, не больше UPDATE_WORKERS одновременно.
+        Когда в очереди больше UPDATE_QUEUE_LIMIT обновлений, опрос Telegram приостанавливается.
+        """
+        self.dp = dp
+        self.bot = bot
+
+        self.workers = int(os.getenv("UPDATE_WORKERS", 16))
+        self.queue_limit = int(os.getenv("UPDATE_QUEUE_LIMIT", 1000))
+        self.polling_timeout = int(os.getenv("POLLING_TIMEOUT", 30))
+        # Сколько секунд при остановке дорабатывать уже полученные обновления
+        self.drain_timeout = float(os.getenv("UPDATE_DRAIN_TIMEOUT", 30))
+
+        self.pending: Dict[Hashable, Deque[Update]] = {}
+        self.ready: asyncio.Queue = asyncio.Queue()
+        self.depth = 0
+        self.in_flight = 0
+        self.below_limit = asyncio.Event()
+        self.below_limit.set()
+        # Следующий update_id для GetUpdates: Telegram считает полученными все обновления до него
+        self.offset = None
+        self.poll_task = None
+        self.stopping = False
+
+        # Статистика для мониторинга
+        self.processed = 0
+        self.failed = 0
+        self.latencies: Deque[float] = deque(maxlen=1000)
+
+    def submit(self, update: Update):
+        """Постановка обновления в очередь его чата"""
+        key = update_key(update)
+        queue = self.pending.get(key)
+        if queue is None:
+            # Чат не обрабатывается - сразу отдаем воркерам
+            self.pending[key] = deque([update])
+            self.ready.put_nowait(key)
+        else:
+            queue.append(update)
+
+        self.depth += 1
+        if self.depth >= self.queue_limit:
+            self.below_limit.clear()
+
+    async def worker(self):
+        """Воркер: берет чат и обрабатывает его следующее обновление"""
+        while True:
+            key = await self.ready.get()
+            queue = self.pending[key]
+            update = queue[0]
+
+            self.in_flight += 1
+            started = time.perf_counter()
+            try:
+                await self.dp.feed_update(self.bot, update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error("Ошибка обработки обновления %s: %s", update.update_id, e)
+            finally:
+                self.latencies.append(time.perf_counter() - started)
+                self.in_flight -= 1
+
+                queue.popleft()
+                self.depth -= 1
+                if queue:
+                    self.ready.put_nowait(key)  # Следующее обновление этого чата
+                else:
+                    del self.pending[key]
+
+                if self.depth < self.queue_limit // 2:
+                    self.below_limit.set()
+
+    async def poll(self):
+        """Получение обновлений из Telegram с учетом заполненности очереди"""
+        allowed_updates = self.dp.resolve_used_update_types()
+        backoff = 1
+
+        while True:
+            # Обратное давление: ждем, пока воркеры разберут очередь
+            await self.below_limit.wait()
+
+            try:
+                updates = await self.bot(GetUpdates(
+                    offset=self.offset,
+                    timeout=self.polling_timeout,
+                    allowed_updates=allowed_updates
+                ))
+                backoff = 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка получения обновлений: %s", e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+
+            for update in updates:
+                self.submit(update)
+                self.offset = update.update_id + 1
+
+    def stop(self):
+        """Остановка приема обновлений (SIGTERM/SIGINT); полученные обновления дорабатываются"""
+        if self.stopping:
+            return
+        logger.info("🛑 Остановка: прием обновлений прекращен, дорабатываем очередь")
+        self.stopping = True
+        if self.poll_task:
+            self.poll_task.cancel()
+
+    async def drain(self):
+        """
+        Ожидание обработки уже полученных обновлений (не дольше drain_timeout)
+        offset уже сдвинут за них, и Telegram не пришлет их повторно - брошенные в очереди пропали бы.
+        """
+        deadline = time.monotonic() + self.drain_timeout
+        while self.depth and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self.depth:
+            logger.warning("⚠️ Остановка: не обработано обновлений: %d", self.depth)
+
+    async def confirm_offset(self):
+        """Подтверждение обработанных обновлений, чтобы после перезапуска они не пришли снова"""
+        if self.offset is None:
+            return
+        try:
+            await self.bot(GetUpdates(offset=self.offset, timeout=0, limit=1))
+        except Exception as e:
+            logger.warning("⚠️ Не удалось подтвердить обновления: %s", e)
+
+    def stats(self) -> Dict:
+        """Глубина очереди, число выполняющихся обработчиков и задержки обработки"""
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+        return {
+            "queue_depth": self.depth,
+            "in_flight": self.in_flight,
+            "active_chats": len(self.pending),
+            "processed": self.processed,
+            "failed": self.failed,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "latency_p99": percentile(0.99),
+        }
+
+    async def report(self, interval: int = 60):
+        """Периодический вывод статистики в лог"""
+        while True:
+            await asyncio.sleep(interval)
+            stats = self.stats()
+            logger.info(
+                "📊 Обновления: очередь %d, в работе %d, обработано %d, ошибок %d, p50 %.0f мс, p95 %.0f мс",
+                stats["queue_depth"], stats["in_flight"], stats["processed"], stats["failed"],
+                stats["latency_p50"] * 1000, stats["latency_p95"] * 1000
+            )
+
+    def install_signal_handlers(self) -> list:
+        """SIGTERM/SIGINT останавливают прием обновлений, как в Dispatcher.start_polling"""
+        loop = asyncio.get_running_loop()
+        installed = []
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+                installed.append(sig)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows или не главный поток
+        return installed
+
+    async def run(self):
+        """Запуск воркеров и опроса; завершается по stop() (сигналу) после доработки очереди или при отмене"""
+        logger.info("Запуск обработки обновлений: воркеров %d, лимит очереди %d", self.workers, self.queue_limit)
+        tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+        tasks.append(asyncio.create_task(self.report()))
+        signals = self.install_signal_handlers()
+        self.poll_task = asyncio.create_task(self.poll())
+        try:
+            await self.poll_task
+        except asyncio.CancelledError:
+            if not self.stopping:
+                raise
+        finally:
+            for sig in signals:
+                asyncio.get_running_loop().remove_signal_handler(sig)
+            await self.drain()
+            await self.confirm_offset()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
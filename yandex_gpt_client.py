@@ -2,65 +2,104 @@ import aiohttp
 import asyncio
 import json
 import logging
-from typing import Optional
+import os
+from typing import Dict, List, Optional
+
+from metrics import EXTERNAL_ERRORS, EXTERNAL_RETRIES, track
+from tracing import span
+from token_budget import TokenUsage, estimate_tokens
 
 
 class YandexGPTClient:
-    def __init__(self, api_key: str, folder_id: str):
+    def __init__(self, api_key: str, folder_id: str, usage: TokenUsage = None):
         """
         Инициализация клиента YandexGPT
         api_key: API ключ Yandex Cloud
         folder_id: ID папки в Yandex Cloud
+        usage: учет расхода токенов (поле usage ответов), если передан
         """
         self.api_key = api_key
         self.folder_id = folder_id
+        self.usage = usage
         self.session = None
-        self.base_url = "https://llm.api.cloud.yandex.net/foundationModels/v1"
+        self.base_url = os.getenv("YANDEX_GPT_API_URL", "https://llm.api.cloud.yandex.net/foundationModels/v1")
+        self.model_uri = f"gpt://{folder_id}/yandexgpt-lite"
+        self.max_tokens = int(os.getenv("YANDEX_GPT_MAX_TOKENS", 1000))
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Api-Key {self.api_key}"
+        }
 
     async def initialize(self):
         """Инициализация сессии"""
         self.session = aiohttp.ClientSession()
         logging.info("✅ YandexGPT клиент инициализирован")
 
-    async def get_response(self, prompt: str, max_retries: int = 3) -> Optional[str]:
+    async def prewarm(self):
+        """Заранее открыть TLS-соединение с API, чтобы первый вопрос не ждал рукопожатия"""
+        async with self.session.head(self.base_url, timeout=aiohttp.ClientTimeout(total=5)) as response:
+            await response.read()
+
+    async def get_response(self, prompt: str, max_retries: int = 3,
+                           history: List[Dict[str, str]] = None, user_id: int = None,
+                           max_tokens: int = None) -> Optional[str]:
         """
         Получение ответа от YandexGPT
         prompt: текст запроса
         max_retries: количество попыток при ошибке
+        history: предыдущие реплики диалога [{"role": "user"/"assistant", "text": ...}]
+        user_id: пользователь, на которого записывается расход токенов
+        max_tokens: ограничение длины ответа (по умолчанию YANDEX_GPT_MAX_TOKENS)
         """
         if not self.session:
             logging.error("❌ YandexGPT не инициализирован")
             return None
 
         url = f"{self.base_url}/completion"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Api-Key {self.api_key}"
-        }
+        headers = self.headers
+
+        messages = (history or []) + [
+            {
+                "role": "user",
+                "text": prompt
+            }
+        ]
+        estimated_tokens = sum(estimate_tokens(message["text"]) for message in messages)
 
         payload = {
-            "modelUri": f"gpt://{self.folder_id}/yandexgpt-lite",
+            "modelUri": self.model_uri,
             "completionOptions": {
                 "stream": False,
                 "temperature": 0.7,
-                "maxTokens": 1000
+                "maxTokens": max_tokens or self.max_tokens
             },
-            "messages": [
-                {
-                    "role": "user",
-                    "text": prompt
-                }
-            ]
+            "messages": messages
         }
 
         for attempt in range(max_retries):
             try:
-                logging.info(f"🤖 Отправка запроса в YandexGPT (попытка {attempt + 1})")
+                logging.info("🤖 Отправка запроса в YandexGPT (попытка %d)", attempt + 1)
+                if attempt:
+                    EXTERNAL_RETRIES.inc("yandex_gpt", "completion")
+
+                async with track("yandex_gpt", "completion"), span("yandex_gpt.completion", attempt=attempt + 1), \
+                        self.session.post(url, headers=headers, json=payload, timeout=30) as response:
+                    if response.status != 200:
+                        EXTERNAL_ERRORS.inc("yandex_gpt", "completion")
 
-                async with self.session.post(url, headers=headers, json=payload, timeout=30) as response:
                     if response.status == 200:
                         result = await response.json()
 
+                        usage = result.get("result", {}).get("usage")
+                        if usage and self.usage:
+                            try:
+                                self.usage.record(usage, estimated_tokens, user_id)
+                            except Exception as e:
+                                logging.error("❌ Ошибка учета токенов: %s", e)
+
                         if "result" in result and "alternatives" in result["result"]:
                             alternatives = result["result"]["alternatives"]
                             if alternatives and len(alternatives) > 0:
@@ -81,23 +120,23 @@ class YandexGPTClient:
 
                     else:
                         error_text = await response.text()
-                        logging.error(f"❌ Ошибка YandexGPT API: {response.status} - {error_text}")
+                        logging.error("❌ Ошибка YandexGPT API: %s - %s", response.status, error_text)
 
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(2 ** attempt)  # Экспоненциальная задержка
-                            continue
+                        if attempt == max_retries - 1:
+                            return None
 
-                        return None
+                # Пауза перед повтором вне замера: в длительность попадает только сама попытка
+                await asyncio.sleep(2 ** attempt)  # Экспоненциальная задержка
 
             except asyncio.TimeoutError:
-                logging.warning(f"⏰ Таймаут запроса к YandexGPT (попытка {attempt + 1})")
+                logging.warning("⏰ Таймаут запроса к YandexGPT (попытка %d)", attempt + 1)
                 if attempt < max_retries - 1:
                     await asyncio.sleep(2)
                     continue
                 return None
 
             except Exception as e:
-                logging.error(f"❌ Ошибка при запросе к YandexGPT: {e}")
+                logging.error("❌ Ошибка при запросе к YandexGPT: %s", e)
                 if attempt < max_retries - 1:
                     await asyncio.sleep(2)
                     continue